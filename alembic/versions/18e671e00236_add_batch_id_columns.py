@@ -1,7 +1,7 @@
 """add batch_id columns
 
 Revision ID: 18e671e00236
-Revises: 
+Revises: 5b0c8e2f1a47
 Create Date: 2025-05-10 14:02:22.240172
 
 """
@@ -13,7 +13,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision: str = '18e671e00236'
-down_revision: Union[str, None] = None
+down_revision: Union[str, None] = '5b0c8e2f1a47'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
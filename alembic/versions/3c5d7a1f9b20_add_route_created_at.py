@@ -0,0 +1,47 @@
+"""add route created_at and history indexes
+
+Revision ID: 3c5d7a1f9b20
+Revises: e9655146e6ef
+Create Date: 2026-10-16 09:41:37.205118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5d7a1f9b20'
+down_revision: Union[str, None] = 'e9655146e6ef'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+routes = sa.table(
+    'routes',
+    sa.column('created_at', sa.DateTime(timezone=True)),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('routes') as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+
+    # When older routes were planned was never recorded; they all get the migration
+    # time, and the id tie-breaker of the history order keeps them in sequence
+    op.execute(routes.update().values(created_at=sa.func.now()))
+
+    with op.batch_alter_table('routes') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+        batch_op.create_index('ix_routes_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_routes_network_id_created_at_id', ['network_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('routes') as batch_op:
+        batch_op.drop_index('ix_routes_network_id_created_at_id')
+        batch_op.drop_index('ix_routes_created_at_id')
+        batch_op.drop_column('created_at')
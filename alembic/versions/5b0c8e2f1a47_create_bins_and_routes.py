@@ -0,0 +1,46 @@
+"""create bins and routes
+
+Revision ID: 5b0c8e2f1a47
+Revises: 
+Create Date: 2025-05-10 13:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0c8e2f1a47'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The tables as they were before the next revision altered them, so an
+    # empty database can be brought to head. Databases already under Alembic
+    # are past this revision, so it never runs on them.
+    op.create_table(
+        'bins',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('position', sa.JSON(), nullable=True),
+        sa.Column('fill_level', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'routes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('optimized_route', sa.JSON(), nullable=True),
+        sa.Column('total_distance', sa.Float(), nullable=True),
+        sa.Column('bins_covered', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('routes')
+    op.drop_table('bins')
@@ -0,0 +1,41 @@
+"""add bin_readings for sensor fill levels
+
+Revision ID: 7d2e4b9c6a13
+Revises: 3c5d7a1f9b20
+Create Date: 2026-10-17 10:12:48.530417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e4b9c6a13'
+down_revision: Union[str, None] = '3c5d7a1f9b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'bin_readings',
+        sa.Column('bin_id', sa.String(), nullable=False),
+        sa.Column('fill_level', sa.Float(), nullable=False),
+        sa.Column('read_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('bin_id'),
+    )
+    # Telemetry added bins it had not seen without a batch; their fill levels are
+    # readings. Levels of bins in a batch may be synthetic and are left behind.
+    op.execute(
+        "INSERT INTO bin_readings (bin_id, fill_level, read_at) "
+        "SELECT id, fill_level, CURRENT_TIMESTAMP FROM bins "
+        "WHERE batch_id IS NULL AND fill_level IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('bin_readings')
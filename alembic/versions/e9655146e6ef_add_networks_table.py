@@ -0,0 +1,170 @@
+"""add networks table
+
+Revision ID: e9655146e6ef
+Revises: 20499846497d
+Create Date: 2026-10-16 23:05:12.481920
+
+"""
+import hashlib
+import json
+import struct
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9655146e6ef'
+down_revision: Union[str, None] = '20499846497d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+routes = sa.table(
+    'routes',
+    sa.column('id', sa.Integer),
+    sa.column('batch_id', sa.String),
+    sa.column('edges', sa.JSON),
+    sa.column('network_id', sa.Integer),
+)
+bins = sa.table(
+    'bins',
+    sa.column('id', sa.String),
+    sa.column('batch_id', sa.String),
+)
+networks = sa.table(
+    'networks',
+    sa.column('id', sa.Integer),
+    sa.column('fingerprint', sa.String),
+    sa.column('node_names', sa.JSON),
+    sa.column('num_edges', sa.Integer),
+    sa.column('edge_sources', sa.LargeBinary),
+    sa.column('edge_targets', sa.LargeBinary),
+    sa.column('edge_weights', sa.LargeBinary),
+)
+
+
+# The encoding below is a frozen copy of what the application stored when this
+# revision was written (CompactGraph.fingerprint and persistence.encode_network),
+# so later changes to either cannot change what this migration does.
+
+def encode_network(names, edges):
+    """
+    Column values of a networks row for `names` and an edge list of
+    {"from", "to", "weight"} dicts. Edges are stored once, as (u, v) with u < v,
+    ordered by u and then as CompactGraph lists each node's neighbours.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    keyed = []
+    for position, edge in enumerate(edges):
+        a, b = index[edge['from']], index[edge['to']]
+        if a != b:
+            # Within one source, edges listed from it come before edges listed to it
+            keyed.append((min(a, b), a > b, position, max(a, b), float(edge['weight'])))
+    keyed.sort()
+
+    sources = b''.join(struct.pack('<i', k[0]) for k in keyed)
+    targets = b''.join(struct.pack('<i', k[3]) for k in keyed)
+    weights = b''.join(struct.pack('<d', k[4]) for k in keyed)
+    digest = hashlib.sha256(json.dumps(names).encode())
+    for part in (sources, targets, weights):
+        digest.update(part)
+    return {
+        'fingerprint': digest.hexdigest(),
+        'node_names': names,
+        'num_edges': len(keyed),
+        'edge_sources': sources,
+        'edge_targets': targets,
+        'edge_weights': weights,
+    }
+
+
+def network_edge_records(row):
+    """Edges of a networks row back as {"from", "to", "weight"} dicts."""
+    names = row.node_names
+    return [
+        {'from': names[u], 'to': names[v], 'weight': w}
+        for (u,), (v,), (w,) in zip(struct.iter_unpack('<i', row.edge_sources),
+                                    struct.iter_unpack('<i', row.edge_targets),
+                                    struct.iter_unpack('<d', row.edge_weights))
+    ]
+
+
+def network_names(conn, batch_id, edges):
+    """
+    Node names of a route's network: bins in the order its edges first mention
+    them, then the bins of its batch that have no edges, which the edge list
+    alone would lose.
+    """
+    names = list(dict.fromkeys(name for edge in edges for name in (edge['from'], edge['to'])))
+    if batch_id is not None:
+        known = set(names)
+        batch = conn.execute(sa.select(bins.c.id).where(bins.c.batch_id == batch_id).order_by(bins.c.id))
+        names += [name for name in batch.scalars() if name not in known]
+    return names
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'networks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('fingerprint', sa.String(), nullable=True),
+        sa.Column('node_names', sa.JSON(), nullable=True),
+        sa.Column('num_edges', sa.Integer(), nullable=True),
+        sa.Column('edge_sources', sa.LargeBinary(), nullable=True),
+        sa.Column('edge_targets', sa.LargeBinary(), nullable=True),
+        sa.Column('edge_weights', sa.LargeBinary(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_networks_id'), 'networks', ['id'], unique=False)
+    op.create_index(op.f('ix_networks_fingerprint'), 'networks', ['fingerprint'], unique=True)
+
+    with op.batch_alter_table('routes') as batch_op:
+        batch_op.add_column(sa.Column('network_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_routes_network_id'), ['network_id'], unique=False)
+        batch_op.create_foreign_key('fk_routes_network_id_networks', 'networks', ['network_id'], ['id'])
+
+    # Move every distinct edge list into networks, one route at a time to keep memory flat
+    conn = op.get_bind()
+    network_ids = {}
+    route_ids = conn.execute(sa.select(routes.c.id).where(routes.c.edges.isnot(None))).scalars().all()
+    for route_id in route_ids:
+        batch_id, edges = conn.execute(
+            sa.select(routes.c.batch_id, routes.c.edges).where(routes.c.id == route_id)
+        ).one()
+        if not edges:
+            continue
+
+        values = encode_network(network_names(conn, batch_id, edges), edges)
+        fingerprint = values['fingerprint']
+        if fingerprint not in network_ids:
+            network_ids[fingerprint] = conn.execute(
+                sa.insert(networks).values(**values).returning(networks.c.id)
+            ).scalar_one()
+        conn.execute(sa.update(routes).where(routes.c.id == route_id).values(network_id=network_ids[fingerprint]))
+
+    with op.batch_alter_table('routes') as batch_op:
+        batch_op.drop_column('edges')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('routes') as batch_op:
+        batch_op.add_column(sa.Column('edges', sa.JSON(), nullable=True))
+
+    conn = op.get_bind()
+    for row in conn.execute(sa.select(networks)).all():
+        conn.execute(
+            sa.update(routes).where(routes.c.network_id == row.id).values(edges=network_edge_records(row))
+        )
+
+    with op.batch_alter_table('routes') as batch_op:
+        batch_op.drop_constraint('fk_routes_network_id_networks', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_routes_network_id'))
+        batch_op.drop_column('network_id')
+
+    op.drop_index(op.f('ix_networks_fingerprint'), table_name='networks')
+    op.drop_index(op.f('ix_networks_id'), table_name='networks')
+    op.drop_table('networks')
@@ -0,0 +1,225 @@
+"""
+Cluster-first, route-second solving for instances with many full bins.
+
+The full bins are split into spatial clusters of about CLUSTER_SIZE bins, each
+cluster is routed on its own, and the cluster tours are chained in the order of
+a tour over the cluster centres. Each junction is then re-optimised over a
+window of bins on both sides, which removes most of the detours the cut leaves.
+
+Distances inside a cluster come from searches that stop once the cluster's bins
+are settled, so no search ever covers the whole network, and the work per
+cluster does not grow with the size of the instance. The three steps
+(plan_clusters, solve_cluster, stitch_clusters) take and return plain values,
+so the clusters can be solved in parallel worker processes.
+"""
+import math
+
+import numpy as np
+
+from src import metrics
+from src.algorithm.compact_graph import NoPathError
+from src.algorithm.local_search import improve_tour
+
+# Full bins per cluster that the partition aims for
+CLUSTER_SIZE = 200
+# Bins on each side of a junction re-optimised after stitching
+BOUNDARY_WINDOW = 8
+KMEANS_ITERATIONS = 25
+# Seeds the k-means initial centres, so a given instance always splits the same way
+CLUSTER_SEED = 0
+# Points whose distances to the centres are computed at once
+KMEANS_CHUNK = 4096
+
+PARTITION_METHODS = ("kmeans", "grid")
+
+
+def _kmeans_labels(points, k, rng):
+    centres = points[rng.choice(len(points), size=k, replace=False)]
+    labels = np.full(len(points), -1)
+    for _ in range(KMEANS_ITERATIONS):
+        previous = labels
+        labels = np.empty(len(points), dtype=np.int64)
+        squared = (centres ** 2).sum(axis=1)
+        for start in range(0, len(points), KMEANS_CHUNK):
+            chunk = points[start:start + KMEANS_CHUNK]
+            labels[start:start + KMEANS_CHUNK] = np.argmin(squared - 2 * chunk @ centres.T, axis=1)
+        if (labels == previous).all():
+            break
+
+        counts = np.bincount(labels, minlength=k)
+        used = counts > 0
+        # A centre that lost all its points stays where it was
+        for axis in range(points.shape[1]):
+            sums = np.bincount(labels, weights=points[:, axis], minlength=k)
+            centres[used, axis] = sums[used] / counts[used]
+    return labels
+
+
+def _grid_labels(points, k):
+    """Strips of equal count along x, each cut into cells of equal count along y."""
+    columns = math.ceil(math.sqrt(k))
+    rows = math.ceil(k / columns)
+    labels = np.empty(len(points), dtype=np.int64)
+    for column, members in enumerate(np.array_split(np.argsort(points[:, 0], kind="stable"), columns)):
+        cells = np.array_split(members[np.argsort(points[members, 1], kind="stable")], rows)
+        for row, cell in enumerate(cells):
+            labels[cell] = column * rows + row
+    return labels
+
+
+def partition(points, cluster_size=CLUSTER_SIZE, method="kmeans", seed=CLUSTER_SEED):
+    """
+    Splits `points` (an (m, 2) array of positions) into spatial clusters of about
+    `cluster_size` points, by k-means or a grid of equal-count cells. Returns one
+    array of indices into `points` per non-empty cluster.
+    """
+    if method not in PARTITION_METHODS:
+        raise ValueError(f"Unknown partition method '{method}'; expected one of {PARTITION_METHODS}")
+    points = np.asarray(points, dtype=np.float64)
+    k = max(1, math.ceil(len(points) / cluster_size))
+    if k == 1:
+        return [np.arange(len(points))]
+
+    if method == "grid":
+        labels = _grid_labels(points, k)
+    else:
+        labels = _kmeans_labels(points, k, np.random.default_rng(seed))
+
+    order = np.argsort(labels, kind="stable")
+    return np.split(order, np.flatnonzero(np.diff(labels[order])) + 1)
+
+
+def _nearest_neighbour_order(dist):
+    """Greedy order of the rows of a square matrix starting from row 0; unreachable rows are left out."""
+    visited = np.zeros(len(dist), dtype=bool)
+    visited[0] = True
+    order = [0]
+    while not visited.all():
+        candidates = np.where(visited, np.inf, dist[order[-1]])
+        nearest = int(np.argmin(candidates))
+        if not np.isfinite(candidates[nearest]):
+            break
+        visited[nearest] = True
+        order.append(nearest)
+    return np.array(order)
+
+
+def _pairwise_distances(graph, nodes):
+    """
+    Road distances between `nodes` (indices). The graph is undirected, so each
+    search only needs to reach the nodes after its source, and the last is skipped.
+    """
+    m = len(nodes)
+    dist = np.zeros((m, m))
+    targets = nodes.tolist()
+    for i in range(m - 1):
+        dist[i, i + 1:] = graph.distances_to(targets[i], targets[i + 1:])
+    return np.triu(dist) + np.triu(dist, 1).T
+
+
+@metrics.span("cluster.plan")
+def plan_clusters(graph, threshold=0.7, cluster_size=CLUSTER_SIZE, method="kmeans"):
+    """
+    Splits the full bins of `graph` into clusters, in the order they will be
+    visited. Returns a list of node index arrays, each starting with the bin
+    its tour should start from.
+    """
+    full = graph.full_bins(threshold)
+    if len(full) == 0:
+        return []
+    clusters = [full[members] for members in partition(graph.positions[full], cluster_size, method)]
+    if len(clusters) <= 2:
+        return clusters
+
+    centres = np.array([graph.positions[nodes].mean(axis=0) for nodes in clusters])
+    gaps = np.linalg.norm(centres[:, None] - centres[None, :], axis=2)
+    order, _ = improve_tour(_nearest_neighbour_order(gaps), gaps)
+    clusters, centres = [clusters[i] for i in order.tolist()], centres[order]
+
+    # Each cluster's tour starts from its first bin: the one nearest the cluster
+    # before it, or for the first cluster, the one farthest from the next
+    for i, nodes in enumerate(clusters):
+        if i == 0:
+            first = np.argmax(np.linalg.norm(graph.positions[nodes] - centres[1], axis=1))
+        else:
+            first = np.argmin(np.linalg.norm(graph.positions[nodes] - centres[i - 1], axis=1))
+        nodes[[0, first]] = nodes[[first, 0]]
+    return clusters
+
+
+@metrics.span("cluster.solve")
+def solve_cluster(graph, nodes):
+    """Order in which to visit one cluster's bins (node indices), as an index array."""
+    nodes = np.asarray(nodes, dtype=np.int64)
+    if len(nodes) < 3:
+        return nodes
+    dist = _pairwise_distances(graph, nodes)
+    order, _ = improve_tour(_nearest_neighbour_order(dist), dist)
+    return nodes[order]
+
+
+def _improve_junction(graph, tour, start, end):
+    """
+    Re-optimises tour[start:end] in place, keeping tour[start] and, unless the
+    window reaches the end of the tour, the stop right after it where they are.
+    """
+    window = tour[start:end + 1] if end < len(tour) else tour[start:end]
+    dist = _pairwise_distances(graph, window)
+    if not np.isfinite(dist).all():
+        return
+    if end < len(tour):
+        # improve_tour leaves the last stop free; a penalty on every edge of the
+        # stop after the window, longer than any tour, makes it cheapest last
+        penalty = dist.sum()
+        dist[-1, :-1] += penalty
+        dist[:-1, -1] += penalty
+    order, _ = improve_tour(np.arange(len(window)), dist)
+    if end < len(tour) and order[-1] != len(window) - 1:
+        return
+    tour[start:start + len(order)] = window[order]
+
+
+@metrics.span("cluster.stitch")
+def stitch_clusters(graph, tours, window=BOUNDARY_WINDOW):
+    """
+    Chains cluster tours (node index arrays, in visiting order) into one route,
+    turning each tour to start at the end closer to where the previous one
+    finished, then re-optimises `window` stops on either side of every junction.
+    Returns (route as bin names, total distance, bins covered) like the other
+    algorithms.
+    """
+    tours = [np.asarray(t, dtype=np.int64) for t in tours if len(t)]
+    if sum(len(t) for t in tours) < 2:
+        return [], 0, 0
+
+    positions = graph.positions
+    if len(tours) > 1 and len(tours[0]) > 1:
+        # The first tour ends on whichever end is nearer the next cluster
+        following = positions[tours[1]].mean(axis=0)
+        if np.linalg.norm(positions[tours[0][0]] - following) < np.linalg.norm(positions[tours[0][-1]] - following):
+            tours[0] = tours[0][::-1]
+    for i in range(1, len(tours)):
+        exit_point = positions[tours[i - 1][-1]]
+        if np.linalg.norm(positions[tours[i][-1]] - exit_point) < np.linalg.norm(positions[tours[i][0]] - exit_point):
+            tours[i] = tours[i][::-1]
+
+    tour = np.concatenate(tours)
+    junctions = np.cumsum([len(t) for t in tours[:-1]])
+    for junction in junctions.tolist():
+        _improve_junction(graph, tour, max(0, junction - window - 1), min(len(tour), junction + window))
+
+    # Walk the shortest path of every leg; legs stay short, so A* only searches near them
+    route = [graph.name_of(int(tour[0]))]
+    seen = {int(tour[0])}
+    total_distance = 0.0
+    for a, b in zip(tour[:-1].tolist(), tour[1:].tolist()):
+        try:
+            length, path = graph.astar(a, b)
+        except NoPathError:
+            continue
+        total_distance += length
+        for node in path[1:]:
+            if node not in seen:
+                route.append(graph.name_of(node))
+                seen.add(node)
+    return route, total_distance, len(route)
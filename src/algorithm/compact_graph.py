@@ -0,0 +1,339 @@
+import hashlib
+import heapq
+import json
+import math
+
+import numpy as np
+
+from src import metrics
+from src.algorithm import landmarks
+
+
+class NoPathError(Exception):
+    pass
+
+
+class CompactGraph:
+    """
+    Undirected weighted graph in CSR form.
+
+    Nodes are the integers 0..n-1; the neighbours of node i are
+    targets[offsets[i]:offsets[i + 1]] with matching weights. Every edge is
+    stored once per direction. `names` maps indices back to bin ids.
+    """
+
+    def __init__(self, names, offsets, targets, weights, positions=None, fill_levels=None):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.positions = None if positions is None else np.asarray(positions, dtype=np.float64)
+        self.fill_levels = None if fill_levels is None else np.asarray(fill_levels, dtype=np.float64)
+        # Fill levels expected by the time the bins are visited (NaN where unknown)
+        self.forecast_levels = None
+        self._adjacency = None
+        self._coordinates = None
+        # (positions, whether no edge is shorter than the straight line between its ends)
+        self._straight_line = None
+        self._fingerprint = None
+        # The topology's landmark index once looked up, False if it has none
+        self._landmarks = None
+        # Whether the lookup was allowed to build one
+        self._landmarks_built = False
+
+    def __getstate__(self):
+        # The memoryviews are rebuilt on demand, and worker processes look up the
+        # landmark index themselves; don't ship either
+        state = self.__dict__.copy()
+        state["_adjacency"] = None
+        state["_coordinates"] = None
+        state["_landmarks"] = None
+        state["_landmarks_built"] = False
+        return state
+
+    @classmethod
+    def from_arrays(cls, names, u, v, w, positions=None, fill_levels=None):
+        """Builds the CSR arrays from an undirected edge list given as index arrays."""
+        n = len(names)
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        w = np.asarray(w, dtype=np.float64)
+
+        src = np.concatenate((u, v))
+        dst = np.concatenate((v, u))
+        order = np.argsort(src, kind="stable")
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+        return cls(names, offsets, dst[order], np.concatenate((w, w))[order], positions, fill_levels)
+
+    @classmethod
+    def from_networkx(cls, graph, weight="weight"):
+        names = list(graph.nodes())
+        index = {name: i for i, name in enumerate(names)}
+
+        edges = list(graph.edges(data=weight, default=1.0))
+        u = [index[a] for a, _, _ in edges]
+        v = [index[b] for _, b, _ in edges]
+        w = [d for _, _, d in edges]
+
+        nodes = graph.nodes
+        positions = None
+        if names and all("pos" in nodes[n] for n in names):
+            positions = [nodes[n]["pos"] for n in names]
+        fill_levels = None
+        if names and all("fill_level" in nodes[n] for n in names):
+            fill_levels = [nodes[n]["fill_level"] for n in names]
+
+        return cls.from_arrays(names, u, v, w, positions, fill_levels)
+
+    @classmethod
+    def from_edges(cls, edges, positions=None, fill_levels=None):
+        """
+        Builds the graph from an edge list in the JSON form routes used to store
+        ([{"from": ..., "to": ..., "weight": ...}, ...]).
+        `positions` and `fill_levels` are dicts keyed by bin id.
+        """
+        names = list(positions) if positions else []
+        index = {name: i for i, name in enumerate(names)}
+        for edge in edges:
+            for name in (edge["from"], edge["to"]):
+                if name not in index:
+                    index[name] = len(names)
+                    names.append(name)
+
+        u = [index[e["from"]] for e in edges]
+        v = [index[e["to"]] for e in edges]
+        w = [e["weight"] for e in edges]
+
+        pos = None
+        if positions and len(positions) == len(names):
+            pos = [positions[n] for n in names]
+        fills = None
+        if fill_levels is not None:
+            fills = [fill_levels.get(n, 0.0) for n in names]
+
+        return cls.from_arrays(names, u, v, w, pos, fills)
+
+    @property
+    def num_nodes(self):
+        return len(self.names)
+
+    @property
+    def num_edges(self):
+        return len(self.targets) // 2
+
+    def edge_arrays(self):
+        """The undirected edge list as (u, v, w) index arrays with u < v, sorted by u."""
+        sources = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.offsets))
+        keep = sources < self.targets
+        return sources[keep], self.targets[keep], self.weights[keep]
+
+    @property
+    def fingerprint(self):
+        """
+        Digest of the network: node names and edge_arrays(). Positions and fill
+        levels do not count. Stored networks are keyed on it (see persistence).
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256(json.dumps(self.names).encode())
+            for array, dtype in zip(self.edge_arrays(), ("<i4", "<i4", "<f8")):
+                digest.update(array.astype(dtype).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def landmark_index(self, build=False):
+        """
+        The landmark index of this topology, if one has been built or saved (see
+        landmarks.py). With `build`, a large enough topology without one gets one now.
+        """
+        if self._landmarks is None or (build and self._landmarks is False and not self._landmarks_built):
+            self._landmarks = landmarks.index_for(self, build=build) or False
+            self._landmarks_built = build
+        return self._landmarks or None
+
+    @property
+    def straight_line_admissible(self):
+        """
+        Whether no edge weighs less than the straight line between its ends, so
+        that line is a lower bound on the distance between any two nodes. Road
+        networks imported with their own weights need not be.
+        """
+        if self.positions is None:
+            return False
+        # Keyed on the positions array, like the coordinate views
+        if self._straight_line is None or self._straight_line[0] is not self.positions:
+            sources = np.repeat(np.arange(self.num_nodes), np.diff(self.offsets))
+            lengths = np.linalg.norm(self.positions[sources] - self.positions[self.targets], axis=1)
+            # Weights computed as the length itself may differ from it by rounding
+            admissible = bool(np.all(self.weights >= lengths * (1 - 1e-9)))
+            self._straight_line = (self.positions, admissible)
+        return self._straight_line[1]
+
+    def index_of(self, name):
+        return self.index[name]
+
+    def name_of(self, i):
+        return self.names[i]
+
+    def neighbors(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.targets[start:end], self.weights[start:end]
+
+    def with_fill_levels(self, fill_levels, forecast_levels=None):
+        """Copy sharing this graph's topology arrays, with its own fill levels (and forecast)."""
+        clone = object.__new__(CompactGraph)
+        clone.__dict__.update(self.__dict__)
+        clone.fill_levels = None if fill_levels is None else np.asarray(fill_levels, dtype=np.float64)
+        clone.forecast_levels = None if forecast_levels is None else np.asarray(forecast_levels, dtype=np.float64)
+        return clone
+
+    def full_bins(self, threshold):
+        """Indices of the nodes whose fill level, now or as forecast, is at or above threshold."""
+        levels = self.fill_levels
+        if self.forecast_levels is not None:
+            levels = np.fmax(levels, self.forecast_levels)
+        return np.flatnonzero(levels >= threshold)
+
+    def _views(self):
+        # Memoryviews index to plain Python numbers as fast as lists do inside the
+        # heap loop, where NumPy scalars are slow, and copy nothing: a road network's
+        # mapped arrays stay shared between processes
+        if self._adjacency is None:
+            arrays = (self.offsets, self.targets, self.weights)
+            self._adjacency = tuple(memoryview(np.ascontiguousarray(a)) for a in arrays)
+        return self._adjacency
+
+    def _coordinate_views(self):
+        # Keyed on the positions array, which callers may swap on a copy sharing this cache
+        if self._coordinates is None or self._coordinates[0] is not self.positions:
+            self._coordinates = (self.positions, memoryview(self.positions[:, 0]), memoryview(self.positions[:, 1]))
+        return self._coordinates[1:]
+
+    def dijkstra(self, source):
+        """Distances and predecessors from `source` (an index) to every node."""
+        metrics.increment("shortest_path_queries_total", kind="dijkstra")
+        offsets, targets, weights = self._views()
+        n = self.num_nodes
+        dist = [math.inf] * n
+        pred = [-1] * n
+        done = [False] * n
+
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if done[u]:
+                continue
+            done[u] = True
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                nd = d + weights[k]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+        return np.array(dist), np.array(pred, dtype=np.int32)
+
+    def distances_to(self, source, targets):
+        """
+        Shortest distances from `source` to each of `targets` (indices), inf for
+        unreachable ones. The search stops once every target is settled, so
+        targets close to the source only cost a search of their neighbourhood.
+        """
+        metrics.increment("shortest_path_queries_total", kind="bounded")
+        offsets, targets_of, weights = self._views()
+        remaining = set(targets)
+        dist = {source: 0.0}
+        done = set()
+        heap = [(0.0, source)]
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            remaining.discard(u)
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets_of[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+
+        return np.array([dist[t] if t in done else math.inf for t in targets])
+
+    def lower_bounds(self, nodes, target):
+        """
+        Lower bounds on the distances from each of `nodes` (indices) to `target`,
+        the same A* is guided by. Raises ValueError without positions or landmarks.
+        """
+        index = self.landmark_index(build=True)
+        if self.positions is None and index is None:
+            raise ValueError("Lower bounds need node positions or a landmark index.")
+        nodes = np.asarray(nodes, dtype=np.int64)
+        bounds = np.zeros(len(nodes))
+        if self.straight_line_admissible:
+            bounds = np.linalg.norm(self.positions[nodes] - self.positions[target], axis=1)
+        if index is not None:
+            bounds = np.maximum(bounds, index.lower_bounds(nodes, target))
+        return bounds
+
+    def astar(self, source, target):
+        """
+        Shortest path between two indices. Returns (length, [node indices]).
+
+        The search is guided by a lower bound on the distance left: the
+        straight-line distance between positions, the landmark bound when the
+        topology has a landmark index, or the larger of the two when it has both.
+        The straight line is only used when no edge is shorter than it (see
+        straight_line_admissible); with positions but neither bound, the search
+        is a plain Dijkstra search. The first query on a large topology builds
+        its index (see landmarks.py).
+        """
+        index = self.landmark_index(build=True)
+        if self.positions is None and index is None:
+            raise ValueError("A* needs node positions or a landmark index.")
+
+        metrics.increment("shortest_path_queries_total", kind="astar")
+        offsets, targets, weights = self._views()
+        xs = ys = None
+        if self.straight_line_admissible:
+            tx, ty = self.positions[target]
+            xs, ys = self._coordinate_views()
+
+        dist = {source: 0.0}
+        pred = {source: -1}
+        done = set()
+        heap = [(0.0, source)]
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u == target:
+                path = [u]
+                while pred[path[-1]] >= 0:
+                    path.append(pred[path[-1]])
+                return dist[u], path[::-1]
+            if u in done:
+                continue
+            done.add(u)
+            d = dist[u]
+            start, end = offsets[u], offsets[u + 1]
+            if index is not None:
+                # One vectorised lookup for all the neighbours
+                near = index.lower_bounds(self.targets[start:end], target).tolist()
+            for k in range(start, end):
+                v = targets[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    pred[v] = u
+                    if index is None:
+                        h = 0.0 if xs is None else math.hypot(xs[v] - tx, ys[v] - ty)
+                    elif xs is None:
+                        h = near[k - start]
+                    else:
+                        h = max(near[k - start], math.hypot(xs[v] - tx, ys[v] - ty))
+                    heapq.heappush(heap, (nd + h, v))
+
+        raise NoPathError(f"No path between {self.names[source]} and {self.names[target]}.")
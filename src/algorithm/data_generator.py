@@ -1,50 +1,195 @@
-import random
-import networkx as nx
-import matplotlib.pyplot as plt
+import math
 
-# Constants
-DEFAULT_NUM_BINS = 20
+import numpy as np
 
-# Generate fixed positions for bins once
-FIXED_POSITIONS = {
-    f"bin_{i}": (random.uniform(0, 100), random.uniform(0, 100))
-    for i in range(DEFAULT_NUM_BINS)
-}
+from src.algorithm.compact_graph import CompactGraph
 
-# Generate fixed edges once
-FIXED_EDGES = []
-for i in range(DEFAULT_NUM_BINS):
-    for j in range(i + 1, DEFAULT_NUM_BINS):
-        if random.random() < 0.3:  # 30% chance of connection
-            FIXED_EDGES.append((f"bin_{i}", f"bin_{j}"))
+# Constants
+DEFAULT_NUM_BINS = 20
+AREA_SIZE = 100
+TOPOLOGY_SEED = 42
+# Expected number of neighbours per bin away from the edges of the area.
+# Large networks get log(n) + CONNECTIVITY_MARGIN instead, which keeps
+# isolated bins vanishingly rare.
+DEFAULT_DEGREE = 8
+CONNECTIVITY_MARGIN = 4
+EDGE_CHUNK_SIZE = 50_000
 
 def distance(p1, p2):
     return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
 
 
+def bin_names(num_bins):
+    return [f"bin_{i}" for i in range(num_bins)]
+
+
+def generate_positions(num_bins, seed=TOPOLOGY_SEED):
+    """Bin coordinates, deterministic for a given seed."""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, AREA_SIZE, size=(num_bins, 2))
+
+
+def generate_fill_levels(num_bins, rng=None):
+    """Fresh fill levels; unseeded by default so they change on every call."""
+    rng = rng if rng is not None else np.random.default_rng()
+    return rng.uniform(0, 1, size=num_bins)
+
+
+def connection_radius(num_bins, degree=None):
+    """Radius that gives each bin `degree` neighbours on average."""
+    num_bins = max(num_bins, 1)
+    if degree is None:
+        degree = max(DEFAULT_DEGREE, math.log(num_bins) + CONNECTIVITY_MARGIN)
+    return AREA_SIZE * math.sqrt(degree / (math.pi * num_bins))
+
+
+def _compress(labels):
+    """Points every bin straight at its component's root (pointer jumping)."""
+    while True:
+        parents = labels[labels]
+        if (parents == labels).all():
+            return labels
+        labels[:] = parents
+
+
+def _union(labels, u, v):
+    """Merges the components joined by edges (u, v); roots are the smallest member."""
+    while True:
+        _compress(labels)
+        lu, lv = labels[u], labels[v]
+        differ = lu != lv
+        if not differ.any():
+            return
+        np.minimum.at(labels, np.maximum(lu[differ], lv[differ]), np.minimum(lu[differ], lv[differ]))
+
+
+def _bridge_edges(positions, labels, batch=16):
+    """
+    Edges joining every component to its nearest bin outside it, until one component is left.
+    The radius graph strands the odd bin near the border of the area; this
+    keeps every bin reachable.
+    """
+    us, vs = [], []
+    while True:
+        roots, sizes = np.unique(_compress(labels), return_counts=True)
+        if len(roots) <= 1:
+            break
+        # Every component but one largest reaches out; with several of the same
+        # size, excluding all of them would leave nothing to bridge
+        for root in np.delete(roots, np.argmax(sizes)):
+            members = np.flatnonzero(labels == root)
+            if len(members) == 0 or labels[members[0]] != root:
+                continue  # already merged into another component this round
+            best = (np.inf, None, None)
+            for lo in range(0, len(members), batch):
+                chunk = members[lo:lo + batch]
+                d = np.linalg.norm(positions[chunk][:, None, :] - positions[None, :, :], axis=-1)
+                d[:, labels == root] = np.inf
+                i, j = np.unravel_index(np.argmin(d), d.shape)
+                if d[i, j] < best[0]:
+                    best = (d[i, j], chunk[i], j)
+            _, a, b = best
+            us.append(min(a, b))
+            vs.append(max(a, b))
+            _union(labels, np.array([a]), np.array([b]))
+    return np.array(us, dtype=np.int64), np.array(vs, dtype=np.int64)
+
+
+def iter_edge_chunks(positions, radius=None, chunk_size=EDGE_CHUNK_SIZE):
+    """
+    Yields (u, v, weight) arrays for every pair of bins closer than `radius`, with u < v.
+
+    Bins are bucketed into a grid of radius-sized cells so each bin is only
+    compared with the bins of its own and the 8 surrounding cells. Work is done
+    `chunk_size` bins at a time, so memory stays flat however many bins there are.
+    A last chunk of bridging edges joins any bins the radius left disconnected.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    n = len(positions)
+    if n < 2:
+        return
+    radius = radius if radius is not None else connection_radius(n)
+
+    cells_per_side = max(1, int(math.ceil(AREA_SIZE / radius)))
+    cell_xy = np.clip((positions // radius).astype(np.int64), 0, cells_per_side - 1)
+    cell = cell_xy[:, 0] * cells_per_side + cell_xy[:, 1]
+
+    order = np.argsort(cell, kind="stable")
+    counts = np.bincount(cell, minlength=cells_per_side ** 2)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    slots = np.arange(counts.max())
+    radius_sq = radius * radius
+    labels = np.arange(n)
+
+    # Walking the bins cell by cell keeps each chunk's lookups close together in memory
+    for lo in range(0, n, chunk_size):
+        u_idx = order[lo:lo + chunk_size]
+        us, vs = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                nx_ = cell_xy[u_idx, 0] + dx
+                ny_ = cell_xy[u_idx, 1] + dy
+                inside = (nx_ >= 0) & (nx_ < cells_per_side) & (ny_ >= 0) & (ny_ < cells_per_side)
+                neighbour = np.where(inside, nx_ * cells_per_side + ny_, 0)
+
+                valid = inside[:, None] & (slots[None, :] < counts[neighbour][:, None])
+                idx = np.minimum(starts[neighbour][:, None] + slots[None, :], n - 1)
+                v = order[idx]
+
+                delta = positions[v] - positions[u_idx][:, None, :]
+                keep = valid & (v > u_idx[:, None]) & ((delta ** 2).sum(axis=-1) <= radius_sq)
+                rows, cols = np.nonzero(keep)
+                us.append(u_idx[rows])
+                vs.append(v[rows, cols])
+
+        u = np.concatenate(us)
+        v = np.concatenate(vs)
+        _union(labels, u, v)
+        yield u, v, np.linalg.norm(positions[u] - positions[v], axis=1)
+
+    u, v = _bridge_edges(positions, labels)
+    if len(u):
+        yield u, v, np.linalg.norm(positions[u] - positions[v], axis=1)
+
+
+def generate_edges(positions, radius=None, chunk_size=EDGE_CHUNK_SIZE):
+    """All edges of the spatial network as (u, v, weight) arrays."""
+    chunks = list(iter_edge_chunks(positions, radius, chunk_size))
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    return tuple(np.concatenate(parts) for parts in zip(*chunks))
+
+
+def generate_compact_network(num_bins=DEFAULT_NUM_BINS, seed=TOPOLOGY_SEED, degree=None):
+    """Same network as generate_synthetic_data, as a CompactGraph."""
+    positions = generate_positions(num_bins, seed)
+    u, v, w = generate_edges(positions, connection_radius(num_bins, degree))
+    return CompactGraph.from_arrays(bin_names(num_bins), u, v, w, positions, generate_fill_levels(num_bins))
+
+
 def generate_synthetic_data(num_bins=20):
-    fixed_random = random.Random(42)  # for consistent positions and edges
-    dynamic_random = random.Random()  # no seed = random every time
+    import networkx as nx
 
-    G = nx.Graph()
+    # Positions and edges are seeded, so the network is the same on every call;
+    # fill levels are not, so which bins are full changes every time.
+    positions = generate_positions(num_bins)
+    u, v, w = generate_edges(positions)
+    fill_levels = generate_fill_levels(num_bins)
 
-    for i in range(num_bins):
-        x = fixed_random.uniform(0, 100)
-        y = fixed_random.uniform(0, 100)
-        fill_level = dynamic_random.uniform(0, 1)  # this now changes every call
-        G.add_node(f"bin_{i}", pos=(x, y), fill_level=fill_level)
+    G = nx.Graph()
+    names = bin_names(num_bins)
+    for name, (x, y), fill_level in zip(names, positions.tolist(), fill_levels.tolist()):
+        G.add_node(name, pos=(x, y), fill_level=fill_level)
 
-    for i in range(num_bins):
-        for j in range(i + 1, num_bins):
-            if fixed_random.random() < 0.3:  # connection still deterministic
-                pos_i = G.nodes[f"bin_{i}"]["pos"]
-                pos_j = G.nodes[f"bin_{j}"]["pos"]
-                dist = ((pos_i[0] - pos_j[0])**2 + (pos_i[1] - pos_j[1])**2)**0.5
-                G.add_edge(f"bin_{i}", f"bin_{j}", weight=dist)
+    G.add_weighted_edges_from(zip((names[i] for i in u), (names[j] for j in v), w.tolist()))
 
     return G
 
 def visualize_graph(G, route=None, threshold = 0.7):
+    # Plotting libraries are slow to import and only needed here
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
     pos = nx.get_node_attributes(G, 'pos')
     edge_labels = nx.get_edge_attributes(G, 'weight')
 
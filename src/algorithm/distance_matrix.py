@@ -0,0 +1,101 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src import metrics
+from src.algorithm.compact_graph import CompactGraph, NoPathError
+
+# Below this many sources the pool start-up costs more than it saves
+PARALLEL_MIN_SOURCES = 64
+
+
+class DistanceMatrix:
+    """
+    Shortest-path distances and predecessors from every source (full bin)
+    to every node of the graph, computed with one single-source search per source.
+
+    dist[i, j] is the distance from sources[i] to node j (inf if unreachable),
+    pred[i, j] is the index of the node before j on that path (-1 for none).
+    """
+
+    def __init__(self, graph: CompactGraph, sources, dist, pred):
+        self.graph = graph
+        self.sources = sources
+        self.source_index = {node: i for i, node in enumerate(sources)}
+        self.dist = dist
+        self.pred = pred
+        self.source_columns = np.array([graph.index_of(s) for s in sources], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def source_distances(self):
+        """Square (k, k) matrix of distances between the sources themselves."""
+        return self.dist[:, self.source_columns]
+
+    def distance(self, source, target):
+        return float(self.dist[self.source_index[source], self.graph.index_of(target)])
+
+    def path(self, source, target):
+        """Node names on the shortest path from source to target, both included."""
+        row = self.pred[self.source_index[source]]
+        start = self.graph.index_of(source)
+        current = self.graph.index_of(target)
+        if current != start and row[current] < 0:
+            raise NoPathError(f"No path between {source} and {target}.")
+
+        path = [current]
+        while current != start:
+            current = row[current]
+            path.append(current)
+        return [self.graph.name_of(i) for i in reversed(path)]
+
+
+def _single_source_batch(graph, sources):
+    return [graph.dijkstra(s) for s in sources]
+
+
+@metrics.span("distance_matrix")
+def build_distance_matrix(graph: CompactGraph, sources, processes=None, row_cache=None):
+    """
+    Runs one Dijkstra search per source and packs the results into a DistanceMatrix.
+
+    processes > 1 spreads the searches over a process pool; None uses a pool
+    sized to the CPU count once there are enough sources to make it worthwhile.
+    `row_cache` (an LRUCache keyed by node index) lets rows computed for an
+    earlier set of sources on the same topology be reused.
+    """
+    sources = list(sources)
+    source_ids = [graph.index_of(s) for s in sources]
+
+    rows = {}
+    if row_cache is not None:
+        for s in source_ids:
+            cached = row_cache.get(s)
+            if cached is not None:
+                rows[s] = cached
+    missing = [s for s in dict.fromkeys(source_ids) if s not in rows]
+
+    if processes is None:
+        processes = (os.cpu_count() or 1) if len(missing) >= PARALLEL_MIN_SOURCES else 1
+
+    if processes > 1 and len(missing) > 1:
+        chunks = [missing[i::processes] for i in range(processes)]
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for chunk, chunk_rows in zip(chunks, pool.map(_single_source_batch, [graph] * processes, chunks)):
+                rows.update(zip(chunk, chunk_rows))
+    else:
+        rows.update(zip(missing, _single_source_batch(graph, missing)))
+
+    if row_cache is not None:
+        for s in missing:
+            row_cache.put(s, rows[s])
+
+    n = graph.num_nodes
+    dist = np.empty((len(sources), n))
+    pred = np.empty((len(sources), n), dtype=np.int32)
+    for i, s in enumerate(source_ids):
+        dist[i], pred[i] = rows[s]
+
+    return DistanceMatrix(graph, sources, dist, pred)
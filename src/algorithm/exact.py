@@ -0,0 +1,91 @@
+"""
+Exact open tours by Held-Karp dynamic programming over subsets of stops.
+
+cost[mask, j] is the length of the shortest path that starts at stop 0, visits
+exactly the stops in `mask` (bit j - 1 standing for stop j) and ends at stop j.
+Masks are filled in order of size, each size with one vectorised minimum per
+end stop, so the work is O(2^m m^2) array operations rather than Python loops.
+The tables take O(2^m m) memory, which is what bounds the stops solvable.
+"""
+import os
+
+import numpy as np
+
+from src import metrics
+
+# Memory the cost and predecessor tables may take, in bytes
+MAX_TABLE_BYTES = int(os.environ.get("ROUTING_EXACT_MAX_BYTES", 64 * 2 ** 20))
+# find_best_route solves exactly up to this many full bins
+EXACT_MAX_BINS = int(os.environ.get("ROUTING_EXACT_MAX_BINS", 13))
+
+
+class TooManyStops(ValueError):
+    pass
+
+
+def table_bytes(m):
+    """Memory of the tables for `m` stops: one float64 cost and one int8 predecessor per entry."""
+    if m < 2:
+        return 0
+    return (2 ** (m - 1)) * (m - 1) * (8 + 1)
+
+
+def max_stops(max_bytes=MAX_TABLE_BYTES):
+    """The most stops whose tables fit in `max_bytes`."""
+    m = 2
+    while table_bytes(m + 1) <= max_bytes:
+        m += 1
+    return m
+
+
+@metrics.span("held_karp")
+def held_karp(dist, max_bytes=MAX_TABLE_BYTES):
+    """
+    Shortest open tour over the rows of the square matrix `dist`, starting at
+    row 0 and ending anywhere. Returns the tour as an index array and its length
+    (inf if some stop cannot be reached). Raises TooManyStops if the tables would
+    take more than `max_bytes`.
+    """
+    dist = np.asarray(dist, dtype=np.float64)
+    m = len(dist)
+    if m < 3:
+        tour = np.arange(m)
+        return tour, float(dist[tour[:-1], tour[1:]].sum())
+    if table_bytes(m) > max_bytes:
+        raise TooManyStops(f"{m} stops need {table_bytes(m) / 2 ** 20:.0f} MiB of tables, "
+                           f"over the {max_bytes / 2 ** 20:.0f} MiB allowed")
+
+    n = m - 1  # stops other than the start, as bits 0..n-1
+    legs = dist[1:, 1:]
+    cost = np.full((2 ** n, n), np.inf)
+    # The stop visited just before the last one, for walking the tour back
+    previous = np.full((2 ** n, n), -1, dtype=np.int8)
+    singles = 1 << np.arange(n)
+    cost[singles, np.arange(n)] = dist[0, 1:]
+
+    masks = np.arange(2 ** n)
+    sizes = np.zeros(2 ** n, dtype=np.int64)
+    for bit in range(n):
+        sizes += (masks >> bit) & 1
+
+    for size in range(2, n + 1):
+        layer = masks[sizes == size]
+        for j in range(n):
+            ending = layer[(layer >> j) & 1 == 1]
+            before = ending ^ (1 << j)
+            # Costs of every way to reach j last: via each k of the smaller set
+            candidates = cost[before] + legs[:, j]
+            best = np.argmin(candidates, axis=1)
+            cost[ending, j] = candidates[np.arange(len(ending)), best]
+            previous[ending, j] = best
+
+    full = 2 ** n - 1
+    last = int(np.argmin(cost[full]))
+    length = float(cost[full, last])
+
+    tour, mask = [], full
+    while last >= 0:
+        tour.append(last + 1)
+        last, mask = int(previous[mask, last]), mask ^ (1 << last)
+    tour.append(0)
+    return np.array(tour[::-1]), length
@@ -0,0 +1,191 @@
+"""
+Recent fill-level readings of every bin, kept as columns, and forecasts of when
+each bin will cross a fill threshold.
+
+Readings live in two (depth x bins) float32 arrays, seconds since the store's
+epoch and fill levels: each bin owns one column, used as a ring buffer of its
+last `depth` readings, and each row is one ring slot across all bins. Forecasts
+reduce over the `depth` rows with whole-array operations, so a million bins
+take a fraction of a second.
+"""
+import threading
+
+import numpy as np
+
+# Readings kept per bin
+DEFAULT_DEPTH = 12
+# A fall in fill level larger than this means the bin was emptied; the fill
+# rate is only estimated from the readings since
+EMPTIED_DROP = 0.2
+
+
+class FillHistory:
+    def __init__(self, depth=DEFAULT_DEPTH, capacity=1024):
+        self.depth = depth
+        self.bin_ids = []
+        self.index = {}
+        # Timestamps are stored relative to the first one seen, so float32 keeps second resolution
+        self.epoch = None
+        self.times = np.full((depth, capacity), np.nan, dtype=np.float32)
+        self.levels = np.full((depth, capacity), np.nan, dtype=np.float32)
+        # Readings ever written to each column; head % depth is the next slot
+        self.head = np.zeros(capacity, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.bin_ids)
+
+    def save(self, path):
+        """Writes the store to an .npz file."""
+        with self._lock, open(path, "wb") as f:
+            n = len(self.bin_ids)
+            np.savez(
+                f, bin_ids=np.array(self.bin_ids, dtype=str), epoch=np.nan if self.epoch is None else self.epoch,
+                times=self.times[:, :n], levels=self.levels[:, :n], head=self.head[:n]
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            history = cls(depth=data["times"].shape[0], capacity=0)
+            history.bin_ids = data["bin_ids"].tolist()
+            history.index = {bin_id: i for i, bin_id in enumerate(history.bin_ids)}
+            history.epoch = None if np.isnan(data["epoch"]) else float(data["epoch"])
+            history.times, history.levels, history.head = data["times"], data["levels"], data["head"]
+        return history
+
+    def _columns(self, bin_ids):
+        """Column of every bin id, adding columns (and growing the arrays) for new ones."""
+        columns = np.empty(len(bin_ids), dtype=np.int64)
+        index = self.index
+        for i, bin_id in enumerate(bin_ids):
+            column = index.get(bin_id)
+            if column is None:
+                column = index[bin_id] = len(self.bin_ids)
+                self.bin_ids.append(bin_id)
+            columns[i] = column
+
+        if len(self.bin_ids) > len(self.head):
+            capacity = max(len(self.bin_ids), 2 * len(self.head))
+            extra = np.full((self.depth, capacity - len(self.head)), np.nan, dtype=np.float32)
+            self.times = np.hstack((self.times, extra))
+            self.levels = np.hstack((self.levels, extra))
+            self.head = np.concatenate((self.head, np.zeros(extra.shape[1], dtype=np.int64)))
+        return columns
+
+    def clear(self):
+        with self._lock:
+            self.bin_ids, self.index, self.epoch = [], {}, None
+            self.times[:] = np.nan
+            self.levels[:] = np.nan
+            self.head[:] = 0
+
+    def record(self, bin_ids, levels, timestamps):
+        """
+        Adds readings given as parallel sequences (timestamps in Unix seconds).
+        Readings older than the latest one kept for their bin are dropped, so
+        each ring buffer stays in time order. Returns the number dropped.
+        """
+        if len(bin_ids) == 0:
+            return 0
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        levels = np.asarray(levels, dtype=np.float32)
+
+        with self._lock:
+            columns = self._columns(bin_ids)
+            if self.epoch is None:
+                self.epoch = float(timestamps.min())
+            times = (timestamps - self.epoch).astype(np.float32)
+
+            head = self.head[columns]
+            latest = self.times[(head - 1) % self.depth, columns]
+            fresh = (head == 0) | (times >= latest)
+            dropped = len(columns) - int(fresh.sum())
+
+            # Oldest first, so a bin with several readings in the batch ends on its latest
+            order = np.flatnonzero(fresh)[np.argsort(times[fresh], kind="stable")]
+            columns, times, levels = columns[order], times[order], levels[order]
+
+            # Written in rounds of one reading per bin, since fancy assignment keeps only one per column
+            while len(columns):
+                if np.bincount(columns).max() == 1:
+                    self._write(columns, times, levels)
+                    break
+                _, first = np.unique(columns, return_index=True)
+                self._write(columns[first], times[first], levels[first])
+                rest = np.ones(len(columns), dtype=bool)
+                rest[first] = False
+                columns, times, levels = columns[rest], times[rest], levels[rest]
+        return dropped
+
+    def _write(self, columns, times, levels):
+        """Writes one reading to each of `columns`, which must not repeat."""
+        slot = self.head[columns] % self.depth
+        self.times[slot, columns] = times
+        self.levels[slot, columns] = levels
+        self.head[columns] += 1
+
+    def fill_rates(self, columns=None):
+        """
+        Per bin (or per column in `columns`): the latest reading's time (Unix
+        seconds) and level, and the fill rate in level per second, fitted by least
+        squares to the readings since the bin was last emptied (0 with fewer than two).
+        """
+        with self._lock:
+            columns = slice(0, len(self.bin_ids)) if columns is None else columns
+            times, levels = self.times[:, columns].copy(), self.levels[:, columns].copy()
+            head = self.head[columns] % self.depth
+            epoch = self.epoch
+
+        # The fit does not care about order, so slots are read in ring order. A slot's
+        # age rank is its distance from the oldest slot (head); the unused slots of a
+        # bin that is not full yet rank oldest, and hold NaN.
+        rank = (np.arange(self.depth, dtype=np.int16)[:, None] - head.astype(np.int16)) % self.depth
+        valid = ~np.isnan(levels)
+
+        # Ignore everything up to the last emptying: a drop from the slot before,
+        # except across the wrap from newest to oldest
+        emptied = np.empty_like(valid)
+        emptied[0] = levels[0] - levels[-1] < -EMPTIED_DROP
+        emptied[1:] = levels[1:] - levels[:-1] < -EMPTIED_DROP
+        emptied &= rank > 0
+        since = np.where(emptied, rank, 0).max(axis=0)
+        valid &= rank >= since
+
+        count = valid.sum(axis=0)
+        safe = np.maximum(count, 1)
+        t = np.where(valid, times, 0)
+        level = np.where(valid, levels, 0)
+        # Centred per bin, which keeps the float32 sums accurate
+        dt = np.where(valid, t - t.sum(axis=0) / safe, 0)
+        dl = np.where(valid, level - level.sum(axis=0) / safe, 0)
+        var = (dt * dt).sum(axis=0)
+        rate = np.where((count >= 2) & (var > 0), (dt * dl).sum(axis=0) / np.where(var > 0, var, 1), 0)
+
+        latest = (head - 1) % self.depth
+        bins = np.arange(len(head))
+        latest_time = times[latest, bins].astype(np.float64) + (epoch or 0.0)
+        return latest_time, levels[latest, bins].astype(np.float64), rate.astype(np.float64)
+
+    def seconds_until(self, threshold, now):
+        """
+        Seconds from `now` until each bin (in bin_ids order) reaches `threshold`:
+        0 if it already has, inf if it is not filling up.
+        """
+        latest_time, latest_level, rate = self.fill_rates()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing = latest_time + (threshold - latest_level) / rate
+        seconds = np.where(rate > 0, crossing - now, np.inf)
+        return np.where(latest_level >= threshold, 0.0, np.maximum(seconds, 0.0))
+
+    def predict(self, bin_ids, at):
+        """
+        Forecast fill levels of `bin_ids` at Unix time `at`, extrapolated from each
+        bin's latest reading at its fill rate. NaN for bins without readings.
+        """
+        columns = np.array([self.index.get(bin_id, -1) for bin_id in bin_ids], dtype=np.int64)
+        known = columns >= 0
+        latest_time, latest_level, rate = self.fill_rates(columns[known])
+        projected = np.full(len(columns), np.nan)
+        projected[known] = np.clip(latest_level + np.maximum(rate, 0) * np.maximum(at - latest_time, 0), 0, 1)
+        return projected
@@ -0,0 +1,137 @@
+"""
+Landmark (ALT) index for point-to-point shortest-path queries.
+
+A handful of landmark nodes is chosen far apart, and the distance from every
+landmark to every node is stored. For any nodes v and t and landmark l, the
+triangle inequality gives |d(l, t) - d(l, v)| <= d(v, t), so the largest of these
+over all landmarks is a lower bound on the distance left, which A* uses as its
+heuristic. Unlike the straight-line distance it needs no positions and stays
+tight when edge weights are not lengths (e.g. travel times).
+
+Building an index costs one full search per landmark, so an index is only built
+by the first A* query on a large topology that finds none, in the job worker
+running it, and kept per topology (by fingerprint): in memory, and as .npz files
+in INDEX_DIR, which every process loads from instead of building its own and
+the API preloads at startup. A road network keeps its index in its own
+directory instead (see road_network.py).
+"""
+import glob
+import os
+import tempfile
+
+import numpy as np
+
+from src import metrics
+from src.algorithm.lru import LRUCache
+
+LANDMARK_COUNT = 16
+# Networks smaller than this are searched quickly enough without an index
+MIN_INDEX_NODES = int(os.environ.get("ROUTING_LANDMARK_MIN_NODES", 5000))
+# Where indexes are saved and loaded from: beside the default routing.db unless
+# ROUTING_INDEX_DIR says otherwise
+INDEX_DIR = os.environ.get("ROUTING_INDEX_DIR") or "landmark_indexes"
+INDEX_SUFFIX = ".landmarks.npz"
+# Stands in for the distance to nodes a landmark cannot reach: two such nodes
+# are 0 apart, and any reachable node is further away than any route
+UNREACHABLE = np.finfo(np.float64).max / 4
+
+_indexes = LRUCache(maxsize=8, name="landmark_indexes")
+# Off in the API process (see disable_builds), which must not spend seconds on a build
+_builds_enabled = True
+
+
+class LandmarkIndex:
+    def __init__(self, fingerprint, landmarks, distances):
+        self.fingerprint = fingerprint
+        self.landmarks = np.asarray(landmarks, dtype=np.int64)
+        # (nodes x landmarks), node-major so the bounds of a few nodes read contiguous rows
+        distances = np.asarray(distances, dtype=np.float64)
+        self.distances = np.ascontiguousarray(np.where(np.isfinite(distances), distances, UNREACHABLE))
+
+    @classmethod
+    @metrics.span("landmarks.build")
+    def build(cls, graph, count=LANDMARK_COUNT):
+        """
+        Picks landmarks by farthest-point selection: each new landmark is the node
+        farthest from all landmarks chosen so far, starting from node 0.
+        """
+        count = min(count, graph.num_nodes)
+        distances = np.empty((graph.num_nodes, count))
+        nearest = np.full(graph.num_nodes, np.inf)
+        landmarks = []
+        node = 0
+        for i in range(count):
+            landmarks.append(node)
+            distances[:, i], _ = graph.dijkstra(node)
+            nearest = np.minimum(nearest, distances[:, i])
+            # Nodes no landmark reaches yet are left out, or they would always be picked
+            node = int(np.argmax(np.where(np.isfinite(nearest), nearest, -1.0)))
+        return cls(graph.fingerprint, landmarks, distances)
+
+    def lower_bounds(self, nodes, target):
+        """Lower bounds on the distance from each of `nodes` (indices) to `target`."""
+        return np.abs(self.distances[nodes] - self.distances[target]).max(axis=1)
+
+    def save(self, path):
+        # Written aside and renamed, so processes loading it never read half a file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, fingerprint=self.fingerprint, landmarks=self.landmarks, distances=self.distances)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(str(data["fingerprint"]), data["landmarks"], data["distances"])
+
+
+def index_path(fingerprint, directory=None):
+    return os.path.join(directory or INDEX_DIR, fingerprint + INDEX_SUFFIX)
+
+
+def index_for(graph, build=True, directory=None):
+    """
+    The landmark index of `graph`'s topology: from memory, from `directory`
+    (default INDEX_DIR), or (with `build`, for networks of at least
+    MIN_INDEX_NODES) built now and saved there. None if there is none.
+    """
+    fingerprint = graph.fingerprint
+    index = _indexes.get(fingerprint)
+    if index is not None:
+        return index
+
+    directory = directory or INDEX_DIR
+    path = index_path(fingerprint, directory)
+    if os.path.exists(path):
+        index = LandmarkIndex.load(path)
+        metrics.increment("landmark_indexes_total", source="loaded")
+    elif build and _builds_enabled and graph.num_nodes >= MIN_INDEX_NODES:
+        index = LandmarkIndex.build(graph)
+        metrics.increment("landmark_indexes_total", source="built")
+        os.makedirs(directory, exist_ok=True)
+        index.save(path)
+    else:
+        return None
+
+    _indexes.put(fingerprint, index)
+    return index
+
+
+def preload(directory=None):
+    """Loads every index saved in `directory` (default INDEX_DIR). Returns how many were loaded."""
+    paths = sorted(glob.glob(os.path.join(directory or INDEX_DIR, "*" + INDEX_SUFFIX)))
+    for path in paths:
+        index = LandmarkIndex.load(path)
+        _indexes.put(index.fingerprint, index)
+    metrics.increment("landmark_indexes_total", len(paths), source="loaded")
+    return len(paths)
+
+
+def disable_builds():
+    """Makes index_for only look indexes up in this process, never build them."""
+    global _builds_enabled
+    _builds_enabled = False
+
+
+def clear():
+    _indexes.clear()
@@ -0,0 +1,262 @@
+import time
+from collections import deque
+
+import numpy as np
+
+from src import metrics
+
+DEFAULT_NEIGHBOURS = 10
+MAX_SEGMENT = 3
+EPSILON = 1e-6
+# With a deadline, at most one improvement is reported per this many seconds
+REPORT_INTERVAL_S = 0.1
+# Seeds the random restarts of the anytime search, so a given budget is reproducible
+KICK_SEED = 0
+
+
+def tour_length(tour, dist):
+    tour = np.asarray(tour)
+    return float(dist[tour[:-1], tour[1:]].sum())
+
+
+def candidate_neighbours(dist, k=DEFAULT_NEIGHBOURS):
+    """The k nearest other nodes of every node, closest first."""
+    n = len(dist)
+    k = min(k, n - 1)
+    d = dist.astype(float, copy=True)
+    np.fill_diagonal(d, np.inf)
+
+    cand = np.argpartition(d, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(d, cand, axis=1), axis=1)
+    return np.take_along_axis(cand, order, axis=1)
+
+
+class _OpenTour:
+    """
+    Open path over nodes 0..m-1 whose first node stays fixed.
+    Keeps the node order and each node's position in sync.
+
+    Node m is a sentinel standing for "off the end of the path": it sits on both
+    sides of the order and is zero distance from everything, so moves at the ends
+    of the path need no special cases.
+    """
+
+    def __init__(self, dist, neighbours, max_segment):
+        self.m = m = len(dist)
+        self.d = np.zeros((m + 1, m + 1))
+        self.d[:m, :m] = dist
+        self.ext = np.concatenate(([m], np.arange(m), [m]))
+        self.t = self.ext[1:-1]
+        self.pos = np.arange(m + 1)
+        self.cand = candidate_neighbours(dist, neighbours)
+        self.max_segment = max_segment
+
+    def _at(self, q):
+        """Nodes at positions q; positions -1 and m give the sentinel."""
+        return self.ext[q + 1]
+
+    def _reverse(self, i, j):
+        self.t[i:j + 1] = self.t[i:j + 1][::-1].copy()
+        self.pos[self.t[i:j + 1]] = np.arange(i, j + 1)
+
+    def two_opt(self, a):
+        """Best 2-opt move that makes `a` adjacent to one of its candidates."""
+        d = self.d
+        p = self.pos[a]
+        c = self.cand[a]
+        q = self.pos[c]
+        best = (0.0, None)
+
+        # Replace a's outgoing edge: new edges (a, c) and (b, cn)
+        b = self._at(p + 1)
+        cn = self._at(q + 1)
+        delta = d[a, c] - d[a, b] - d[c, cn] + d[b, cn]
+        delta[(q == p + 1) | (q == p - 1)] = np.inf
+        k = int(np.argmin(delta))
+        if delta[k] < best[0] - EPSILON:
+            best = (delta[k], ("succ", k))
+
+        # Replace a's incoming edge: new edges (c, a) and (cp, ap)
+        if p >= 1:
+            ap = self.t[p - 1]
+            cp = self._at(q - 1)
+            delta = d[a, c] + d[ap, cp] - d[ap, a] - d[cp, c]
+            delta[(q == 0) | (q == p - 1) | (q == p + 1)] = np.inf
+            k = int(np.argmin(delta))
+            if delta[k] < best[0] - EPSILON:
+                best = (delta[k], ("pred", k))
+
+        if best[1] is None:
+            return None
+
+        side, k = best[1]
+        qk = int(q[k])
+        if side == "succ":
+            touched = [a, c[k], b, cn[k]]
+            if qk > p:
+                self._reverse(p + 1, qk)
+            else:
+                self._reverse(qk + 1, p)
+        else:
+            touched = [a, c[k], self.t[p - 1], self.t[qk - 1]]
+            if qk < p:
+                self._reverse(qk, p - 1)
+            else:
+                self._reverse(p, qk - 1)
+        return best[0], touched
+
+    def or_opt(self, a):
+        """Best relocation of the segment starting at `a`, in either orientation."""
+        d = self.d
+        p = self.pos[a]
+        if p < 1:
+            return None
+
+        best = (0.0, None)
+        for length in range(1, self.max_segment + 1):
+            end = p + length - 1
+            if end >= self.m:
+                break
+            prev, s0, sl, nxt = self._at(p - 1), self.t[p], self.t[end], self._at(end + 1)
+            gain = d[prev, s0] + d[sl, nxt] - d[prev, nxt]
+
+            c = np.unique(np.concatenate((self.cand[s0], self.cand[sl])))
+            q = self.pos[c]
+            cn = self._at(q + 1)
+            invalid = ((q >= p) & (q <= end)) | (c == prev)
+
+            for reverse, x, y in ((False, s0, sl), (True, sl, s0)):
+                delta = d[c, x] + d[y, cn] - d[c, cn] - gain
+                delta[invalid] = np.inf
+                k = int(np.argmin(delta))
+                if delta[k] < best[0] - EPSILON:
+                    best = (delta[k], (p, end, int(c[k]), reverse))
+
+        if best[1] is None:
+            return None
+
+        start, end, after, reverse = best[1]
+        segment = self.t[start:end + 1]
+        if reverse:
+            segment = segment[::-1]
+        touched = [self._at(start - 1), self._at(end + 1), segment[0], segment[-1],
+                   after, self._at(self.pos[after] + 1)]
+
+        rest = np.concatenate((self.t[:start], self.t[end + 1:]))
+        insert_at = int(np.flatnonzero(rest == after)[0]) + 1
+        self.t[:] = np.concatenate((rest[:insert_at], segment, rest[insert_at:]))
+        self.pos[self.t] = np.arange(self.m)
+        return best[0], touched
+
+    def double_bridge(self, rng):
+        """
+        Swaps two random adjacent segments after the fixed first node, a kick
+        that 2-opt and Or-opt cannot undo in one move. Returns the nodes at the cuts.
+        """
+        i, j, k = np.sort(rng.choice(np.arange(1, self.m), size=3, replace=False))
+        self.t[:] = np.concatenate((self.t[:i], self.t[j:k], self.t[i:j], self.t[k:]))
+        self.pos[self.t] = np.arange(self.m)
+        return [int(self.t[q]) for q in {i - 1, i, j - 1, j, k - 1, k}]
+
+    def restore(self, order):
+        self.t[:] = order
+        self.pos[self.t] = np.arange(self.m)
+
+
+def _descend(state, nodes, deadline=None):
+    """
+    Applies improving moves around `nodes` until none is left, or the deadline
+    (a time.perf_counter() value) passes. Returns the 2-opt and Or-opt move counts.
+    """
+    queue = deque(nodes)
+    active = np.zeros(state.m, dtype=bool)
+    active[list(queue)] = True
+    two_opt_moves = or_opt_moves = 0
+
+    while queue:
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        a = queue.popleft()
+        active[a] = False
+
+        move = state.two_opt(a)
+        if move is not None:
+            two_opt_moves += 1
+        else:
+            move = state.or_opt(a)
+            if move is None:
+                continue
+            or_opt_moves += 1
+
+        for node in move[1]:
+            if node < state.m and not active[node]:
+                active[node] = True
+                queue.append(node)
+
+    return two_opt_moves, or_opt_moves
+
+
+def improve_tour(tour, dist, neighbours=DEFAULT_NEIGHBOURS, max_segment=MAX_SEGMENT, deadline=None,
+                 on_improvement=None):
+    """
+    Improves an open tour (first stop fixed, last stop free) with 2-opt and Or-opt moves.
+
+    `tour` holds indices into the symmetric matrix `dist`. Moves are only tried
+    towards each stop's nearest candidate neighbours, and stops whose surroundings
+    have not changed since they last failed to improve are skipped (don't-look bits).
+    Returns the improved tour as an index array and its length.
+
+    With a `deadline` (a time.perf_counter() value) the search is anytime: it stops
+    when the deadline passes, and time left after the tour stops improving goes to
+    random double-bridge kicks, each followed by another descent and kept only if
+    the tour got shorter. `on_improvement(tour, length, iteration)` is called
+    with the best tour after the first descent, when a kick improves on it (at
+    most every REPORT_INTERVAL_S) and, if not reported yet, with the final tour.
+    """
+    tour = np.asarray(tour, dtype=np.int64)
+    if len(tour) < 3:
+        return tour, tour_length(tour, dist)
+
+    sub = np.asarray(dist, dtype=float)[np.ix_(tour, tour)]
+    if not np.isfinite(sub).all():
+        # Keep the delta arithmetic finite; such edges are never worth adding anyway
+        finite = sub[np.isfinite(sub)]
+        sub = np.where(np.isfinite(sub), sub, (finite.max() + 1) * len(sub))
+
+    state = _OpenTour(sub, neighbours, max_segment)
+    two_opt_moves, or_opt_moves = _descend(state, range(state.m), deadline)
+
+    best, best_length = state.t.copy(), tour_length(state.t, sub)
+    if on_improvement is not None:
+        on_improvement(tour[best], tour_length(tour[best], dist), 1)
+
+    iteration = 1
+    kicks = 0
+    reported_at, unreported = time.perf_counter(), False
+    rng = np.random.default_rng(KICK_SEED)
+    while deadline is not None and state.m >= 4 and time.perf_counter() < deadline:
+        iteration += 1
+        kicks += 1
+        moves = _descend(state, state.double_bridge(rng), deadline)
+        two_opt_moves += moves[0]
+        or_opt_moves += moves[1]
+
+        length = tour_length(state.t, sub)
+        if length < best_length - EPSILON:
+            best, best_length, unreported = state.t.copy(), length, True
+        else:
+            state.restore(best)
+
+        if unreported and on_improvement is not None and time.perf_counter() - reported_at >= REPORT_INTERVAL_S:
+            on_improvement(tour[best], tour_length(tour[best], dist), iteration)
+            reported_at, unreported = time.perf_counter(), False
+    if unreported and on_improvement is not None:
+        on_improvement(tour[best], tour_length(tour[best], dist), iteration)
+
+    metrics.increment("local_search_moves_total", two_opt_moves, move="2-opt")
+    metrics.increment("local_search_moves_total", or_opt_moves, move="or-opt")
+    if kicks:
+        metrics.increment("local_search_moves_total", kicks, move="double-bridge")
+
+    improved = tour[best]
+    return improved, tour_length(improved, dist)
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+from src import metrics
+
+
+class LRUCache:
+    """
+    Thread-safe mapping that evicts the least recently used entries past `maxsize`.
+    maxsize counts entries, or the summed sizeof(value) when `sizeof` is given.
+    With `ttl`, entries also expire that many seconds after they were put.
+    A `name` reports hits and misses to the cache_requests_total metric.
+    """
+
+    def __init__(self, maxsize, sizeof=None, name=None, ttl=None):
+        self.maxsize = maxsize
+        self.name = name
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        # key -> time.monotonic() past which it is stale, when there is a ttl
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if self.ttl is not None and key in self._data and self._expires[key] <= time.monotonic():
+                self._remove(key)
+            hit = key in self._data
+            if hit:
+                self.hits += 1
+                self._data.move_to_end(key)
+                value = self._data[key]
+            else:
+                self.misses += 1
+                value = default
+        if self.name:
+            metrics.increment("cache_requests_total", cache=self.name, result="hit" if hit else "miss")
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.size -= self.sizeof(self._data[key])
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self.size += self.sizeof(value)
+            if self.ttl is not None:
+                self._expires[key] = time.monotonic() + self.ttl
+            while self.size > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        self.size -= self.sizeof(self._data.pop(key))
+        self._expires.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            self.size = 0
@@ -0,0 +1,254 @@
+"""
+Road networks imported from CSV into a directory of .npy arrays, which are
+memory-mapped when loaded.
+
+    python -m src.algorithm.road_network edges.csv nodes.csv networks/city --bins bins.csv
+
+    nodes.csv   node_id,x,y
+    edges.csv   source,target[,weight]     (weight defaults to the straight-line length)
+    bins.csv    bin_id,x,y                 (optional; each bin goes to its nearest node)
+
+The directory holds the CompactGraph arrays as they are laid out in memory:
+
+    meta.json       counts, the topology fingerprint, and whether every weight is
+                    at least the straight-line length of its edge
+    names.npy       node ids
+    positions.npy   (nodes, 2) float64 coordinates
+    offsets.npy     (nodes + 1) int64 CSR offsets
+    targets.npy     (2 * edges) int32 neighbours
+    weights.npy     (2 * edges) float64 edge weights
+    bin_ids.npy     bin ids, and bin_nodes.npy the node each bin sits at
+
+Loading maps the numeric arrays read-only instead of reading them, so every
+process that loads the same directory (uvicorn workers, job pool workers) shares
+one copy of them in the page cache, and searches read them in place through
+memoryviews. Each process only holds its own node names and name-to-index dict
+(roughly 75 bytes per node). The landmark index of a large network is saved in
+the same directory at import.
+
+A* only uses the straight-line distance as its bound when no edge weighs less
+than its straight-line length; with shorter weights given, it relies on the
+landmark index, or runs as a plain Dijkstra search on a network too small for one.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from array import array
+
+import numpy as np
+
+from src import metrics
+from src.algorithm import landmarks
+from src.algorithm.compact_graph import CompactGraph
+from src.algorithm.lru import LRUCache
+
+# Directory of the road network the API serves; unset, it only routes on synthetic networks
+ROAD_NETWORK_DIR = os.environ.get("ROUTING_ROAD_NETWORK")
+# Nodes per cell of the grid used to find the nearest node of a bin
+NODES_PER_CELL = 4
+ARRAYS = ("names", "positions", "offsets", "targets", "weights")
+
+_networks = LRUCache(maxsize=4, name="road_networks")
+
+
+def _rows(path):
+    """Data rows of a CSV file, with their line numbers, and its header."""
+    f = open(path, newline="")
+    rows = csv.reader(f)
+    header = [column.strip() for column in next(rows, [])]
+    return f, header, ((number, row) for number, row in enumerate(rows, 2) if row)
+
+
+def _columns(header, path, required, optional=()):
+    missing = [c for c in required if c not in header]
+    if missing:
+        raise ValueError(f"{path}: header needs the columns {', '.join(required)}")
+    return [header.index(c) for c in required] + [header.index(c) if c in header else None for c in optional]
+
+
+def read_points(path, id_column="node_id"):
+    """Ids and an (n, 2) array of coordinates from a CSV with `id_column`, x and y columns."""
+    f, header, rows = _rows(path)
+    with f:
+        id_col, x_col, y_col = _columns(header, path, (id_column, "x", "y"))
+        ids, xs, ys = [], array("d"), array("d")
+        for number, row in rows:
+            try:
+                xs.append(float(row[x_col]))
+                ys.append(float(row[y_col]))
+            except (IndexError, ValueError):
+                raise ValueError(f"{path}, line {number}: x and y must be numbers") from None
+            ids.append(row[id_col].strip())
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"{path}: {id_column} values must be unique")
+    return ids, np.column_stack((np.frombuffer(xs), np.frombuffer(ys)))
+
+
+def read_edges(path, index, positions):
+    """
+    Edges as (u, v, w) index arrays from a source,target[,weight] CSV. Missing
+    weights are the straight-line length; self-loops are dropped, and of parallel
+    edges only the shortest is kept.
+    """
+    f, header, rows = _rows(path)
+    with f:
+        source_col, target_col, weight_col = _columns(header, path, ("source", "target"), ("weight",))
+        u, v, w = array("i"), array("i"), array("d")
+        for number, row in rows:
+            try:
+                a, b = index[row[source_col].strip()], index[row[target_col].strip()]
+            except (IndexError, KeyError):
+                raise ValueError(f"{path}, line {number}: unknown node") from None
+            weight = row[weight_col].strip() if weight_col is not None and weight_col < len(row) else ""
+            try:
+                w.append(float(weight) if weight else math.dist(positions[a], positions[b]))
+            except ValueError:
+                raise ValueError(f"{path}, line {number}: weight must be a number") from None
+            u.append(a)
+            v.append(b)
+
+    u, v, w = np.frombuffer(u, dtype=np.int32), np.frombuffer(v, dtype=np.int32), np.frombuffer(w)
+    keep = u != v
+    u, v, w = u[keep], v[keep], w[keep]
+    lo, hi = np.minimum(u, v), np.maximum(u, v)
+    # Sorted by pair, shortest first, the first of each pair is the one to keep
+    order = np.lexsort((w, hi, lo))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (lo[order][1:] != lo[order][:-1]) | (hi[order][1:] != hi[order][:-1])
+    # Kept in file order, so a network without parallel edges imports as it was exported
+    keep = np.sort(order[first])
+    return u[keep], v[keep], w[keep]
+
+
+def nearest_nodes(positions, points):
+    """
+    Index of the node nearest each of `points`, found by bucketing the nodes
+    into a uniform grid and searching outwards from each point's cell.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lo = positions.min(axis=0)
+    side = max(1, int(math.sqrt(len(positions) / NODES_PER_CELL)))
+    size = max(float((positions.max(axis=0) - lo).max()), 1e-9) / side
+
+    def cell_of(xy):
+        return np.clip(((xy - lo) // size).astype(np.int64), 0, side - 1)
+
+    cells = cell_of(positions)
+    keys = cells[:, 0] * side + cells[:, 1]
+    order = np.argsort(keys, kind="stable")
+    bounds = np.searchsorted(keys[order], np.arange(side * side + 1))
+
+    nearest = np.empty(len(points), dtype=np.int64)
+    for i, (point, (cx, cy)) in enumerate(zip(points, cell_of(points))):
+        best, best_dist, ring = -1, math.inf, 0
+        # Nodes in ring r are at least (r - 1) cells away, so stop once that passes the best
+        while ring <= side and (ring - 1) * size <= best_dist:
+            x0, x1 = max(cx - ring, 0), min(cx + ring, side - 1)
+            y0, y1 = max(cy - ring, 0), min(cy + ring, side - 1)
+            candidates = [
+                order[bounds[x * side + y]:bounds[x * side + y + 1]]
+                for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)
+                if max(abs(x - cx), abs(y - cy)) == ring
+            ]
+            candidates = np.concatenate(candidates) if candidates else np.empty(0, dtype=np.int64)
+            if len(candidates):
+                dist = np.hypot(*(positions[candidates] - point).T)
+                k = int(np.argmin(dist))
+                if dist[k] < best_dist:
+                    best, best_dist = int(candidates[k]), float(dist[k])
+            ring += 1
+        nearest[i] = best
+    return nearest
+
+
+@metrics.span("road_network.import")
+def import_road_network(edges_csv, nodes_csv, directory, bins_csv=None):
+    """Converts CSV files (see the module docstring) into a network directory. Returns its meta data."""
+    names, positions = read_points(nodes_csv)
+    index = {name: i for i, name in enumerate(names)}
+    u, v, w = read_edges(edges_csv, index, positions)
+    graph = CompactGraph.from_arrays(names, u, v, w, positions)
+
+    os.makedirs(directory, exist_ok=True)
+    for name in ARRAYS:
+        value = np.array(names) if name == "names" else getattr(graph, name)
+        np.save(os.path.join(directory, f"{name}.npy"), value)
+
+    meta = {"nodes": graph.num_nodes, "edges": graph.num_edges, "fingerprint": graph.fingerprint,
+            "straight_line_admissible": graph.straight_line_admissible, "bins": 0}
+    if bins_csv is not None:
+        bin_ids, bin_positions = read_points(bins_csv, "bin_id")
+        np.save(os.path.join(directory, "bin_ids.npy"), np.array(bin_ids))
+        np.save(os.path.join(directory, "bin_nodes.npy"), nearest_nodes(positions, bin_positions))
+        meta["bins"] = len(bin_ids)
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    landmarks.index_for(graph, directory=directory)
+    return meta
+
+
+class RoadNetwork:
+    """An imported network, its arrays memory-mapped read-only, and the node each bin sits at."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        self.graph = CompactGraph(arrays["names"].tolist(), arrays["offsets"], arrays["targets"],
+                                  arrays["weights"], arrays["positions"])
+        # Saved at import; hashing the mapped arrays would read them all in
+        self.graph._fingerprint = self.meta["fingerprint"]
+        if "straight_line_admissible" in self.meta:
+            self.graph._straight_line = (self.graph.positions, self.meta["straight_line_admissible"])
+        landmarks.index_for(self.graph, build=False, directory=directory)
+
+        self.bin_ids, self.bin_nodes = [], np.empty(0, dtype=np.int64)
+        if self.meta.get("bins"):
+            self.bin_ids = np.load(os.path.join(directory, "bin_ids.npy")).tolist()
+            self.bin_nodes = np.load(os.path.join(directory, "bin_nodes.npy"), mmap_mode="r")
+
+    def with_bin_fill_levels(self, bin_levels):
+        """
+        The network with fill levels given per bin (in bin_ids order) moved onto
+        their nodes; a node with several bins takes the fullest.
+        """
+        levels = np.zeros(self.graph.num_nodes)
+        np.maximum.at(levels, self.bin_nodes, np.asarray(bin_levels, dtype=np.float64))
+        return self.graph.with_fill_levels(levels)
+
+
+def load_road_network(directory=None):
+    """The network in `directory` (default ROUTING_ROAD_NETWORK), mapped once per process; None if unset."""
+    directory = directory or ROAD_NETWORK_DIR
+    if not directory:
+        return None
+    directory = os.path.abspath(directory)
+    network = _networks.get(directory)
+    if network is None:
+        network = RoadNetwork(directory)
+        _networks.put(directory, network)
+    return network
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("edges", help="CSV of source,target[,weight]")
+    parser.add_argument("nodes", help="CSV of node_id,x,y")
+    parser.add_argument("directory", help="where to write the network")
+    parser.add_argument("--bins", help="CSV of bin_id,x,y to map onto the network")
+    args = parser.parse_args(argv)
+
+    meta = import_road_network(args.edges, args.nodes, args.directory, args.bins)
+    print(json.dumps(meta, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,213 +1,299 @@
-import functools
+import time
 
-import networkx as nx
-from networkx import NetworkXNoPath
+import numpy as np
 
-def find_best_route(graph: nx.Graph, threshold: float = 0.7):
+from src import metrics
+from src.algorithm import clustering
+from src.algorithm.compact_graph import CompactGraph, NoPathError
+from src.algorithm.distance_matrix import DistanceMatrix, build_distance_matrix
+from src.algorithm.exact import EXACT_MAX_BINS, held_karp
+from src.algorithm.local_search import improve_tour
+
+
+def as_compact(graph) -> CompactGraph:
+    """Accepts either a CompactGraph or a networkx graph with pos/fill_level attributes."""
+    if isinstance(graph, CompactGraph):
+        return graph
+    return CompactGraph.from_networkx(graph)
+
+
+def full_bins_for(graph, threshold: float = 0.7):
+    graph = as_compact(graph)
+    return [graph.name_of(i) for i in graph.full_bins(threshold)]
+
+
+def _matrix_for(graph, full_bins, matrix):
+    """Reuses a shared matrix when it covers every full bin, otherwise builds one."""
+    if matrix is not None and all(b in matrix.source_index for b in full_bins):
+        return matrix
+    return build_distance_matrix(graph, full_bins)
+
+
+def _greedy_tour(matrix: DistanceMatrix, full_bins):
     """
-    Builds an initial greedy route covering all full bins,
-    then improves the route using 2-opt while ensuring all full bins remain in the route.
+    Nearest-neighbour order of the full bins starting from full_bins[0].
+    Returns the order as bin names and the summed leg distances.
     """
-    full_bins = [n for n, d in graph.nodes(data=True) if d["fill_level"] >= threshold]
-    if len(full_bins) < 2:
-        return [], 0, 0
+    rows = np.array([matrix.source_index[b] for b in full_bins])
+    dist = matrix.source_distances()[np.ix_(rows, rows)]
 
-    # 1. Start with greedy route (Dijkstra-based)
-    route = [full_bins[0]]
-    visited = {route[0]}
-    total_dist = 0
-    current = route[0]
+    tour = [0]
+    visited = np.zeros(len(rows), dtype=bool)
+    visited[0] = True
+    total_dist = 0.0
+    current = 0
 
-    while len(visited) < len(full_bins):
-        nearest = None
-        min_dist = float('inf')
-        for target in full_bins:
-            if target not in visited:
-                try:
-                    dist = nx.dijkstra_path_length(graph, current, target, weight="weight")
-                    if dist < min_dist:
-                        nearest = target
-                        min_dist = dist
-                except nx.NetworkXNoPath:
-                    continue
-
-        if not nearest:
-            break
-
-        path = nx.dijkstra_path(graph, current, nearest, weight="weight")
-        for node in path[1:]:
-            if node not in route:
-                route.append(node)
-                visited.add(node)
-        total_dist += min_dist
+    while not visited.all():
+        candidates = np.where(visited, np.inf, dist[current])
+        nearest = int(np.argmin(candidates))
+        if not np.isfinite(candidates[nearest]):
+            break  # remaining full bins are unreachable from here
+
+        total_dist += candidates[nearest]
+        visited[nearest] = True
+        tour.append(nearest)
         current = nearest
 
-    # 2. 2-opt optimization
-    @functools.lru_cache(None)
-    def dist(i, j):
-        return nx.dijkstra_path_length(graph, route[i], route[j], weight="weight")
-
-    improved = True
-    MAX_ITERATIONS = 100000
-    iteration = 0
-    while improved and iteration < MAX_ITERATIONS:
-        improved = False
-        iteration += 1
-        for i in range(1, len(route) - 2):
-            for j in range(i + 1, len(route) - 1):
-                before = dist(i - 1, i) + dist(j, j + 1)
-                after = dist(i - 1, j) + dist(i, j + 1)
-                if after + 1e-6 < before:
-                    route[i:j + 1] = list(reversed(route[i:j + 1]))
-                    improved = True
-        if improved:
-            total_dist = sum(dist(k, k + 1) for k in range(len(route) - 1))
-
-    # 3. Ensure all full bins are still present in route
-    for full_bin in full_bins:
-        if full_bin not in route:
-            try:
-                nearest_node = min(
-                    route,
-                    key=lambda n: nx.dijkstra_path_length(graph, full_bin, n, weight="weight")
-                )
-                path = nx.dijkstra_path(graph, full_bin, nearest_node, weight="weight")
-                insert_idx = route.index(nearest_node)
-                for node in reversed(path[:-1]):
-                    if node not in route:
-                        route.insert(insert_idx, node)
-            except NetworkXNoPath:
-                print(f"No path from {full_bin} to any node in route. Skipping.")
-                continue
+    return [full_bins[i] for i in tour], float(total_dist)
 
-    return route, total_dist, len(route)
 
-def find_best_route_using_djikstra(graph: nx.Graph, threshold=0.7):
-    full_bins = [node for node, attr in graph.nodes(data=True) if attr['fill_level'] >= threshold]
+def _exact_tour(matrix: DistanceMatrix, full_bins):
+    """Shortest order of the full bins starting from full_bins[0], and its length (inf if not all reachable)."""
+    rows = np.array([matrix.source_index[b] for b in full_bins])
+    order, total_dist = held_karp(matrix.source_distances()[np.ix_(rows, rows)])
+    return [full_bins[i] for i in order], total_dist
+
+
+def _expand_tour(matrix: DistanceMatrix, tour):
+    """Turns an order of full bins into the node route, following shortest paths."""
+    route = [tour[0]]
+    seen = {tour[0]}
+    for current, nearest in zip(tour, tour[1:]):
+        for node in matrix.path(current, nearest)[1:]:
+            if node not in seen:
+                route.append(node)
+                seen.add(node)
+    return route
+
+
+@metrics.span("find_best_route")
+def find_best_route(graph, threshold: float = 0.7, matrix: DistanceMatrix = None, time_budget_ms=None,
+                    on_progress=None, exact_max_bins=EXACT_MAX_BINS):
+    """
+    Builds an initial greedy route covering all full bins,
+    then improves the order of the full bins with 2-opt and Or-opt moves.
+    Up to `exact_max_bins` full bins, the optimal order is computed instead,
+    which is then both faster and shorter.
+
+    With `time_budget_ms` the improvement stops once the budget (counted from the
+    call) is spent, and any time left is used to keep searching for a shorter
+    route; the best route found is returned either way. `on_progress(update)`
+    receives the greedy route and every improvement reported by the local search,
+    as dicts with the route, its distance, the iteration and the elapsed time.
+    """
+    start = time.perf_counter()
+    deadline = None if time_budget_ms is None else start + time_budget_ms / 1000
+
+    graph = as_compact(graph)
+    full_bins = full_bins_for(graph, threshold)
     if len(full_bins) < 2:
         return [], 0, 0
 
-    route = [full_bins[0]]
-    visited = {full_bins[0]}
-    current = full_bins[0]
-    total_distance = 0
- 
-    while len(visited) < len(full_bins):
-        nearest = None
-        min_dist = float('inf')
-        for target in full_bins:
-            if target not in visited:
-                try:
-                    dist = nx.dijkstra_path_length(graph, current, target, weight='weight')
-                    if dist < min_dist:
-                        nearest = target
-                        min_dist = dist
-                except nx.NetworkXNoPath:
-                    continue
+    matrix = _matrix_for(graph, full_bins, matrix)
 
-        if nearest is None:
-            break
+    def report(rows, total_dist, iteration):
+        route = _expand_tour(matrix, [matrix.sources[r] for r in rows])
+        on_progress({
+            "optimized_route": route,
+            "total_distance": float(total_dist),
+            "bins_covered": len(route),
+            "iteration": iteration,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        })
 
-        path = nx.dijkstra_path(graph, current, nearest, weight='weight')
-        route += [node for node in path[1:] if node not in route]
-        total_distance += min_dist
-        visited.add(nearest)
-        current = nearest
+    if len(full_bins) <= exact_max_bins:
+        with metrics.span("find_best_route.exact"):
+            tour, total_dist = _exact_tour(matrix, full_bins)
+        if np.isfinite(total_dist):
+            if on_progress is not None:
+                report([matrix.source_index[b] for b in tour], total_dist, 1)
+            route = _expand_tour(matrix, tour)
+            return route, total_dist, len(route)
 
-    # Ensure all full bins are in the route
-    for full_bin in full_bins:
-        if full_bin not in route:
-            try:
-                # Connect missing bin to nearest in route
-                nearest = min(route, key=lambda n: nx.dijkstra_path_length(graph, full_bin, n, weight='weight'))
-                path = nx.dijkstra_path(graph, full_bin, nearest, weight='weight')
-                insert_idx = route.index(nearest)
-                for node in reversed(path[:-1]):
-                    if node not in route:
-                        route.insert(insert_idx, node)
-                # Update distance
-                total_distance = sum(
-                    nx.dijkstra_path_length(graph, route[i], route[i + 1], weight='weight')
-                    for i in range(len(route) - 1)
-                )
-            except nx.NetworkXNoPath:
-                continue
+    # 1. Start with greedy route over the full bins
+    with metrics.span("find_best_route.greedy"):
+        tour, greedy_dist = _greedy_tour(matrix, full_bins)
+    if on_progress is not None:
+        report([matrix.source_index[b] for b in tour], greedy_dist, 0)
+
+    # 2. 2-opt / Or-opt improvement on the order of full bins
+    with metrics.span("find_best_route.local_search"):
+        rows, total_dist = improve_tour(
+            [matrix.source_index[b] for b in tour],
+            matrix.source_distances(),
+            deadline=deadline,
+            on_improvement=report if on_progress is not None else None
+        )
+
+    # 3. Walk the shortest paths between consecutive full bins
+    with metrics.span("find_best_route.expand"):
+        route = _expand_tour(matrix, [matrix.sources[r] for r in rows])
+
+    return route, total_dist, len(route)
 
-    return route, total_distance, len(route)
 
-def find_best_route_using_astar(graph: nx.Graph, threshold=0.7):
-    full_bins = [node for node, attr in graph.nodes(data=True) if attr['fill_level'] >= threshold]
+def _greedy_route(graph, threshold, matrix):
+    graph = as_compact(graph)
+    full_bins = full_bins_for(graph, threshold)
     if len(full_bins) < 2:
         return [], 0, 0
 
-    def heuristic(u, v):
-        x1, y1 = graph.nodes[u]["pos"]
-        x2, y2 = graph.nodes[v]["pos"]
-        return ((x1 - x2)**2 + (y1 - y2)**2) ** 0.5
+    matrix = _matrix_for(graph, full_bins, matrix)
+    tour, total_distance = _greedy_tour(matrix, full_bins)
+    route = _expand_tour(matrix, tour)
 
-    route = [full_bins[0]]
-    visited = {full_bins[0]}
-    current = full_bins[0]
-    total_distance = 0
+    return route, total_distance, len(route)
 
-    while len(visited) < len(full_bins):
-        nearest = None
-        min_dist = float('inf')
-        for target in full_bins:
-            if target not in visited:
-                try:
-                    dist = nx.astar_path_length(graph, current, target, heuristic=heuristic, weight='weight')
-                    if dist < min_dist:
-                        nearest = target
-                        min_dist = dist
-                except nx.NetworkXNoPath:
-                    continue
 
-        if nearest is None:
-            break
+@metrics.span("find_best_route_using_djikstra")
+def find_best_route_using_djikstra(graph, threshold=0.7, matrix: DistanceMatrix = None):
+    return _greedy_route(graph, threshold, matrix)
 
-        path = nx.astar_path(graph, current, nearest, heuristic=heuristic, weight='weight')
-        route += [node for node in path[1:] if node not in route]
-        total_distance += min_dist
-        visited.add(nearest)
-        current = nearest
 
-    # Ensure all full bins are in the route
-    for full_bin in full_bins:
-        if full_bin not in route:
+@metrics.span("find_best_route_using_astar")
+def find_best_route_using_astar(graph, threshold=0.7, matrix: DistanceMatrix = None):
+    """
+    The same nearest-neighbour walk as find_best_route_using_djikstra, but each
+    next bin is found with A* searches instead of read from a distance matrix:
+    candidates are tried in order of their lower bound (see CompactGraph.lower_bounds)
+    until the next bound is no shorter than the nearest bin found. `matrix` is only
+    used when the graph has neither positions nor a landmark index.
+    """
+    graph = as_compact(graph)
+    full = graph.full_bins(threshold).tolist()
+    if len(full) < 2:
+        return [], 0, 0
+    if graph.positions is None and graph.landmark_index(build=True) is None:
+        return _greedy_route(graph, threshold, matrix)
+
+    current, unvisited = full[0], full[1:]
+    route = [graph.name_of(current)]
+    seen = {current}
+    total_distance = 0.0
+    while unvisited:
+        bounds = graph.lower_bounds(unvisited, current)
+        nearest = None
+        for i in np.argsort(bounds, kind="stable").tolist():
+            if nearest is not None and bounds[i] >= nearest[0]:
+                break
             try:
-                nearest = min(route, key=lambda n: nx.astar_path_length(graph, full_bin, n, heuristic=heuristic, weight='weight'))
-                path = nx.astar_path(graph, full_bin, nearest, heuristic=heuristic, weight='weight')
-                insert_idx = route.index(nearest)
-                for node in reversed(path[:-1]):
-                    if node not in route:
-                        route.insert(insert_idx, node)
-                total_distance = sum(
-                    nx.astar_path_length(graph, route[i], route[i + 1], heuristic=heuristic, weight='weight')
-                    for i in range(len(route) - 1)
-                )
-            except nx.NetworkXNoPath:
+                length, path = graph.astar(current, unvisited[i])
+            except NoPathError:
                 continue
+            if nearest is None or length < nearest[0]:
+                nearest = (length, i, path)
+        if nearest is None:
+            break  # remaining full bins are unreachable from here
+
+        length, i, path = nearest
+        total_distance += length
+        for node in path[1:]:
+            if node not in seen:
+                route.append(graph.name_of(node))
+                seen.add(node)
+        current = unvisited.pop(i)
 
     return route, total_distance, len(route)
 
 
-def find_naive_route(graph: nx.Graph, threshold=0.7):
-    full_bins = [node for node, attr in graph.nodes(data=True) if attr['fill_level'] >= threshold]
+@metrics.span("find_naive_route")
+def find_naive_route(graph, threshold=0.7, matrix: DistanceMatrix = None):
+    graph = as_compact(graph)
+    full_bins = full_bins_for(graph, threshold)
 
     if len(full_bins) < 2:
         return [], 0, 0
 
+    # Only consecutive pairs are needed, so without a shared matrix
+    # k - 1 A* queries beat k full single-source searches.
+    if matrix is not None and not all(b in matrix.source_index for b in full_bins):
+        matrix = None
+    if matrix is None and graph.positions is None and graph.landmark_index(build=True) is None:
+        matrix = build_distance_matrix(graph, full_bins)
+
     total_distance = 0
     route = [full_bins[0]]
+    seen = {full_bins[0]}
 
     for i in range(len(full_bins) - 1):
         try:
-            path = nx.shortest_path(graph, full_bins[i], full_bins[i + 1], weight='weight')
-            route += [node for node in path[1:] if node not in route]
-            total_distance += sum(graph[u][v]["weight"] for u, v in zip(path[:-1], path[1:]))
-        except nx.NetworkXNoPath:
+            if matrix is not None:
+                path = matrix.path(full_bins[i], full_bins[i + 1])
+                total_distance += matrix.distance(full_bins[i], full_bins[i + 1])
+            else:
+                length, ids = graph.astar(graph.index_of(full_bins[i]), graph.index_of(full_bins[i + 1]))
+                path = [graph.name_of(n) for n in ids]
+                total_distance += length
+            for node in path[1:]:
+                if node not in seen:
+                    route.append(node)
+                    seen.add(node)
+        except NoPathError:
             continue
 
     return route, total_distance, len(full_bins)
 
+
+@metrics.span("find_exact_route")
+def find_exact_route(graph, threshold=0.7, matrix: DistanceMatrix = None):
+    """
+    The shortest route over the full bins starting from the first, by Held-Karp.
+    Raises exact.TooManyStops when there are too many full bins to solve exactly.
+    """
+    graph = as_compact(graph)
+    full_bins = full_bins_for(graph, threshold)
+    if len(full_bins) < 2:
+        return [], 0, 0
+
+    matrix = _matrix_for(graph, full_bins, matrix)
+    tour, total_dist = _exact_tour(matrix, full_bins)
+    if not np.isfinite(total_dist):
+        raise NoPathError("Not every full bin can be reached from the first.")
+    route = _expand_tour(matrix, tour)
+    return route, total_dist, len(route)
+
+
+@metrics.span("find_clustered_route")
+def find_clustered_route(graph, threshold=0.7, matrix: DistanceMatrix = None, method="kmeans",
+                         cluster_size=clustering.CLUSTER_SIZE):
+    """
+    Splits the full bins into spatial clusters, routes each cluster on its own
+    and stitches the cluster tours together (see src/algorithm/clustering.py).
+    Needs no distance matrix, so `matrix` is ignored; without positions to
+    cluster on, falls back to find_best_route.
+    """
+    graph = as_compact(graph)
+    if graph.positions is None:
+        return find_best_route(graph, threshold, matrix)
+    if len(graph.full_bins(threshold)) < 2:
+        return [], 0, 0
+
+    clusters = clustering.plan_clusters(graph, threshold, cluster_size, method)
+    tours = [clustering.solve_cluster(graph, nodes) for nodes in clusters]
+    return clustering.stitch_clusters(graph, tours)
+
+
+# Algorithms selectable through the API, by name
+ALGORITHMS = {
+    "main": find_best_route,
+    "dijkstra": find_best_route_using_djikstra,
+    "astar": find_best_route_using_astar,
+    "naive": find_naive_route,
+    "cluster": find_clustered_route,
+    "exact": find_exact_route,
+}
+
+# Algorithms that accept time_budget_ms and on_progress
+ANYTIME_ALGORITHMS = {"main"}
+# Algorithms that solve clusters of full bins separately, and need no distance matrix over all of them
+CLUSTERED_ALGORITHMS = {"cluster"}
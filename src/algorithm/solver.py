@@ -0,0 +1,141 @@
+"""
+Entry points run inside job worker processes.
+
+They take and return plain, picklable values so they can be shipped to a
+ProcessPoolExecutor; each worker keeps its own topology cache warm between jobs.
+"""
+import time
+import tracemalloc
+
+from src import metrics
+from src.algorithm import clustering
+from src.algorithm.data_generator import TOPOLOGY_SEED
+from src.algorithm.distance_matrix import build_distance_matrix
+from src.algorithm.road_network import load_road_network
+from src.algorithm.routing import ALGORITHMS, ANYTIME_ALGORITHMS, CLUSTERED_ALGORITHMS, full_bins_for
+from src.algorithm.topology_cache import get_topology
+
+
+def solve_optimization(num_bins, fill_levels, threshold=0.7, algorithm="main", network_seed=TOPOLOGY_SEED,
+                       time_budget_ms=None, progress=None, forecast_levels=None):
+    """
+    Solves one request. For anytime algorithms, `time_budget_ms` bounds the whole
+    solve, shortest paths included, and `progress` (a queue) receives each
+    improvement as it is found, then None once solving is over. Bins whose
+    `forecast_levels` reach the threshold are collected along with the full ones.
+    """
+    start = time.perf_counter()
+    try:
+        topology = get_topology(num_bins, network_seed)
+        graph = topology.with_fill_levels(fill_levels, forecast_levels)
+        matrix = None
+        if algorithm not in CLUSTERED_ALGORITHMS:
+            # Already inside a pool worker, so the searches run serially
+            matrix = topology.distance_matrix(full_bins_for(graph, threshold), processes=1)
+
+        options = {}
+        if algorithm in ANYTIME_ALGORITHMS:
+            if time_budget_ms is not None:
+                spent_ms = (time.perf_counter() - start) * 1000
+                options["time_budget_ms"] = max(0.0, time_budget_ms - spent_ms)
+            if progress is not None:
+                options["on_progress"] = progress.put
+        route, total_dist, bins_covered = ALGORITHMS[algorithm](graph, threshold, matrix=matrix, **options)
+    finally:
+        if progress is not None:
+            progress.put(None)
+
+    return {
+        "optimized_route": route,
+        "total_distance": float(total_dist),
+        "bins_covered": int(bins_covered),
+    }
+
+
+def plan_clusters(num_bins, fill_levels, threshold=0.7, network_seed=TOPOLOGY_SEED, forecast_levels=None):
+    """The clusters of full bins of one request, as lists of node indices (see clustering.plan_clusters)."""
+    graph = get_topology(num_bins, network_seed).with_fill_levels(fill_levels, forecast_levels)
+    return [nodes.tolist() for nodes in clustering.plan_clusters(graph, threshold)]
+
+
+def solve_cluster(num_bins, nodes, network_seed=TOPOLOGY_SEED):
+    """Visiting order of one cluster's bins; the tour only depends on the topology and the cluster."""
+    return clustering.solve_cluster(get_topology(num_bins, network_seed).graph, nodes).tolist()
+
+
+def stitch_clusters(num_bins, tours, network_seed=TOPOLOGY_SEED):
+    route, total_dist, bins_covered = clustering.stitch_clusters(get_topology(num_bins, network_seed).graph, tours)
+    return {
+        "optimized_route": route,
+        "total_distance": float(total_dist),
+        "bins_covered": int(bins_covered),
+    }
+
+
+def solve_road_route(directory, bin_levels, threshold=0.7, algorithm="cluster"):
+    """
+    Solves on the imported road network in `directory`, with fill levels given
+    per bin in the network's bin order. The network is mapped once per worker.
+    """
+    graph = load_road_network(directory).with_bin_fill_levels(bin_levels)
+    matrix = None
+    if algorithm not in CLUSTERED_ALGORITHMS:
+        matrix = build_distance_matrix(graph, full_bins_for(graph, threshold), processes=1)
+    route, total_dist, bins_covered = ALGORITHMS[algorithm](graph, threshold, matrix=matrix)
+    return {
+        "optimized_route": route,
+        "total_distance": float(total_dist),
+        "bins_covered": int(bins_covered),
+    }
+
+
+# Response keys of /compare-algorithms, in the order they are reported
+COMPARISON_LABELS = {"dijkstra": "dijkstra", "astar": "astar", "naive": "naive", "main": "Main", "exact": "exact"}
+# Algorithms a comparison may be too large for; they report an error instead of failing it
+OPTIONAL_COMPARISONS = {"exact"}
+
+
+def prepare_comparison(graph, threshold=0.7):
+    """
+    Shortest paths between full bins, computed once and shared by all the
+    algorithms of a comparison. Returns (matrix, report).
+    """
+    before = metrics.registry.total("shortest_path_queries_total")
+    start = time.perf_counter()
+    matrix = build_distance_matrix(graph, full_bins_for(graph, threshold), processes=1)
+    return matrix, {
+        "wall_time_ms": round((time.perf_counter() - start) * 1000, 2),
+        "shortest_path_queries": metrics.registry.total("shortest_path_queries_total") - before,
+    }
+
+
+def run_algorithm(name, graph, matrix, threshold=0.7, measure_memory=True):
+    """
+    Runs one algorithm with a shared distance matrix and reports its result with
+    wall time, shortest-path searches and (optionally) peak traced memory.
+
+    Memory is traced in a second run, since tracemalloc slows the code it watches.
+    """
+    before = metrics.registry.total("shortest_path_queries_total")
+    start = time.perf_counter()
+    route, dist, covered = ALGORITHMS[name](graph, threshold, matrix=matrix)
+    wall_time = time.perf_counter() - start
+    queries = metrics.registry.total("shortest_path_queries_total") - before
+
+    peak_memory_mb = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            ALGORITHMS[name](graph, threshold, matrix=matrix)
+            peak_memory_mb = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "distance": round(float(dist), 2),
+        "bins": int(covered),
+        "route": route,
+        "wall_time_ms": round(wall_time * 1000, 2),
+        "shortest_path_queries": queries,
+        "peak_memory_mb": peak_memory_mb,
+    }
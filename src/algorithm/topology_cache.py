@@ -0,0 +1,67 @@
+import threading
+
+from src import metrics
+from src.algorithm.compact_graph import CompactGraph
+from src.algorithm.data_generator import TOPOLOGY_SEED, bin_names, generate_edges, generate_fill_levels, \
+    generate_positions
+from src.algorithm.distance_matrix import build_distance_matrix
+from src.algorithm.lru import LRUCache
+
+# How many distinct networks to keep built at once
+MAX_TOPOLOGIES = 8
+# Memory budget per topology for cached single-source search results
+ROW_CACHE_BYTES = 128 * 1024 * 1024
+
+
+class Topology:
+    """
+    Everything about a synthetic network that does not depend on fill levels:
+    bin positions, the edge list, the CompactGraph and cached shortest-path rows.
+    The landmark index of a large network is left to the first A* query on it.
+    """
+
+    def __init__(self, num_bins, seed=TOPOLOGY_SEED):
+        self.key = (num_bins, seed)
+        self.num_bins = num_bins
+        with metrics.span("generate_network"):
+            self.positions = generate_positions(num_bins, seed)
+            self.edges = generate_edges(self.positions)
+            self.graph = CompactGraph.from_arrays(bin_names(num_bins), *self.edges, self.positions)
+            # Hashed once here, so every copy with other fill levels shares it
+            self.graph.fingerprint
+
+        # Each row is one float64 distance and one int32 predecessor per node
+        row_bytes = max(num_bins, 1) * 12
+        self.rows = LRUCache(maxsize=max(16, ROW_CACHE_BYTES // row_bytes), name="distance_rows")
+
+    def with_fill_levels(self, fill_levels, forecast_levels=None):
+        return self.graph.with_fill_levels(fill_levels, forecast_levels)
+
+    def sample(self, rng=None):
+        """The network with a fresh random draw of fill levels."""
+        return self.with_fill_levels(generate_fill_levels(self.num_bins, rng))
+
+    def distance_matrix(self, sources, processes=None):
+        """Distance matrix for `sources`, reusing rows computed by earlier requests."""
+        return build_distance_matrix(self.graph, sources, processes=processes, row_cache=self.rows)
+
+
+_topologies = LRUCache(maxsize=MAX_TOPOLOGIES, name="topologies")
+_build_lock = threading.Lock()
+
+
+def get_topology(num_bins, seed=TOPOLOGY_SEED) -> Topology:
+    key = (num_bins, seed)
+    topology = _topologies.get(key)
+    if topology is None:
+        with _build_lock:
+            # Another request may have built it while we waited
+            topology = _topologies.get(key)
+            if topology is None:
+                topology = Topology(num_bins, seed)
+                _topologies.put(key, topology)
+    return topology
+
+
+def clear_topologies():
+    _topologies.clear()
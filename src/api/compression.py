@@ -0,0 +1,144 @@
+"""
+Response compression: Brotli when the client accepts it, gzip otherwise. The
+`brotli` package is in requirements.txt; an install without it answers in gzip.
+
+Streams (NDJSON and Server-Sent Events) and responses that already carry a
+Content-Encoding are passed through untouched, so every line of a stream
+reaches the client as soon as it is written. This is pure ASGI, so it behaves
+the same whichever Starlette version is installed.
+"""
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+DEFAULT_MINIMUM_SIZE = 1024
+# zlib level 6 compresses route JSON nearly as well as 9, at a fraction of the time
+DEFAULT_LEVEL = 6
+# Brotli quality 4 compresses better than gzip level 6 in about the same time
+BROTLI_QUALITY = 4
+# Content types that are streamed and so never compressed
+UNCOMPRESSED_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+class _Gzip:
+    def __init__(self, level):
+        # wbits 31 writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def accepted_encoding(headers):
+    """The encoding to answer a request with `headers` in: "br", "gzip" or None."""
+    accept = headers.get("accept-encoding", "")
+    if brotli is not None and "br" in accept:
+        return "br"
+    if "gzip" in accept:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=DEFAULT_MINIMUM_SIZE, compresslevel=DEFAULT_LEVEL,
+                 exclude_content_types=UNCOMPRESSED_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.exclude_content_types = tuple(exclude_content_types)
+
+    async def __call__(self, scope, receive, send):
+        encoding = accepted_encoding(Headers(scope=scope)) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _Responder(self, encoding, send).run(scope, receive)
+
+
+class _Responder:
+    """Compresses one response, deciding from its headers and first body chunk."""
+
+    def __init__(self, middleware, encoding, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start = None
+        # None until the first body chunk decides; then whether the body is compressed
+        self.compressing = None
+        self.compressor = None
+
+    async def run(self, scope, receive):
+        await self.middleware.app(scope, receive, self.send_compressed)
+
+    def _compressor(self):
+        if self.encoding == "br":
+            return _Brotli()
+        return _Gzip(self.middleware.compresslevel)
+
+    def _passes_through(self, headers):
+        content_type = headers.get("content-type", "")
+        return "content-encoding" in headers or content_type.startswith(self.middleware.exclude_content_types)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            if self._passes_through(Headers(raw=message["headers"])):
+                self.compressing = False
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        if self.compressing is False:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressing is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.compressing = False
+                await self.send(self.start)
+                await self.send(message)
+                return
+
+            self.compressing = True
+            self.compressor = self._compressor()
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                # The compressed length is only known once the stream ends
+                del headers["Content-Length"]
+            else:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self.send(self.start)
+
+        body = self.compressor.compress(body)
+        if not more_body:
+            body += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
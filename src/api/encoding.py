@@ -0,0 +1,93 @@
+"""
+Response encodings for large routes, picked from the Accept header.
+
+    application/json                         routes as lists of bin ids (the default)
+    application/vnd.routing.compact+json     routes as lists of node indices
+    application/octet-stream                 one route as little-endian int32 node indices,
+                                             with its totals in X-Route-* headers
+
+Node indices follow the network's node order: node i of a synthetic network is
+bin_i, and node i of a road network is row i of its nodes CSV. Responses whose
+network order a client cannot know (/compare-algorithms, on the stored network
+of the latest route) carry it as a `nodes` table instead.
+
+Default JSON is rendered with orjson, which is in requirements.txt; an install
+without it falls back to the standard encoder. Compression is left to the
+middleware set up in main.
+"""
+import numpy as np
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class DefaultResponse(JSONResponse):
+    """JSON rendered by orjson, which also takes NumPy arrays and scalars, when it is installed."""
+
+    def render(self, content):
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+COMPACT_JSON = "application/vnd.routing.compact+json"
+BINARY = "application/octet-stream"
+
+
+def negotiate(request: Request):
+    """The encoding a request accepts: "binary", "compact" or "json"."""
+    accept = request.headers.get("accept", "")
+    if BINARY in accept:
+        return "binary"
+    if COMPACT_JSON in accept:
+        return "compact"
+    return "json"
+
+
+def route_indices(index, route):
+    """`route` (node names) as an int32 array of node indices, `index` mapping names to indices."""
+    return np.fromiter((index[name] for name in route), dtype=np.int32, count=len(route))
+
+
+def route_response(request: Request, index, result, threshold):
+    """
+    The response to an optimization in the encoding `request` accepts, or None
+    for the default JSON, which the endpoint's response model renders.
+    """
+    encoding = negotiate(request)
+    if encoding == "json":
+        return None
+
+    indices = route_indices(index, result["optimized_route"])
+    totals = {
+        "total_distance": round(result["total_distance"], 2),
+        "bins_covered": result["bins_covered"],
+        "threshold": threshold,
+        "cached": result.get("cached", False),
+    }
+    if encoding == "binary":
+        headers = {f"X-Route-{key.replace('_', '-').title()}": str(value).lower() if isinstance(value, bool)
+                   else str(value) for key, value in totals.items()}
+        return Response(indices.astype("<i4").tobytes(), media_type=BINARY, headers=headers)
+    return DefaultResponse({"optimized_route": indices.tolist(), **totals}, media_type=COMPACT_JSON)
+
+
+def comparison_response(request: Request, names, report):
+    """
+    A /compare-algorithms report with every route as indices into a shared
+    `nodes` table (`names`, the compared network's node order) when compact JSON
+    is accepted; the report unchanged otherwise.
+    """
+    if negotiate(request) != "compact":
+        return report
+    index = {name: i for i, name in enumerate(names)}
+    encoded = {
+        label: {**entry, "route": route_indices(index, entry["route"]).tolist()}
+        if isinstance(entry, dict) and "route" in entry else entry
+        for label, entry in report.items()
+    }
+    return DefaultResponse({**encoded, "nodes": list(names)}, media_type=COMPACT_JSON)
@@ -0,0 +1,314 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from src import metrics
+import numpy as np
+
+from src.algorithm.compact_graph import NoPathError
+from src.algorithm.data_generator import TOPOLOGY_SEED, generate_fill_levels
+from src.algorithm.exact import TooManyStops, max_stops
+from src.algorithm.routing import CLUSTERED_ALGORITHMS, as_compact
+from src.algorithm.solver import COMPARISON_LABELS, OPTIONAL_COMPARISONS, plan_clusters, prepare_comparison, run_algorithm, \
+    solve_cluster, solve_optimization, stitch_clusters
+from src.algorithm.topology_cache import get_topology
+from src.api.result_cache import result_key, results
+from src.database.connection import SessionLocal
+from src.database.persistence import save_optimization, save_optimizations
+
+# Number of solver processes; defaults to one per CPU
+JOB_WORKERS = int(os.environ.get("ROUTING_JOB_WORKERS", os.cpu_count() or 1))
+# Finished jobs kept around for polling before the oldest are dropped
+MAX_FINISHED_JOBS = 1000
+# Threads driving jobs made of several pool tasks; they only wait on the pool
+COORDINATOR_THREADS = 8
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        # Resolves once the result has been post-processed (e.g. persisted)
+        self.done = Future()
+        self._solver = None
+
+    @property
+    def status(self):
+        if self.done.done():
+            return "failed" if self.error is not None else "done"
+        if self._solver is not None and self._solver.running():
+            return "running"
+        return "queued"
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs solver functions in a process pool and keeps their status for polling.
+
+    An optional `on_done(result)` callback runs in this process once the solver
+    finishes (e.g. to write results to the database); its return value becomes
+    the job's result. Callbacks run one at a time, since they all write the same
+    bins rows.
+
+    Jobs made of several pool tasks use `coordinate`, which runs a function in a
+    thread here that fans work out to the pool with `run` and combines the results.
+    Metrics recorded in workers are merged into this process as tasks finish.
+    """
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._manager = None
+        self._finisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-finisher")
+        self._coordinator = ThreadPoolExecutor(max_workers=COORDINATOR_THREADS, thread_name_prefix="job-coordinator")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Created on first use so importing the API does not start workers.
+        # Workers come from a forkserver: forking the server process itself would
+        # copy locks (e.g. the topology build lock) held by request threads.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+                )
+            return self._executor
+
+    def progress_queue(self):
+        """A queue that pool tasks can report progress on, read from this process."""
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("forkserver").Manager()
+            return self._manager.Queue()
+
+    def submit(self, kind, fn, *args, on_done=None) -> Job:
+        solver = self.executor.submit(metrics.call_and_drain, fn, *args)
+        return self._track(Job(kind), solver, on_done, pooled=True)
+
+    def coordinate(self, kind, fn, *args, on_done=None) -> Job:
+        return self._track(Job(kind), self._coordinator.submit(fn, *args), on_done, pooled=False)
+
+    def complete(self, kind, result, on_done=None) -> Job:
+        """A job for a result already at hand (e.g. cached); only `on_done` is left to run."""
+        solver = Future()
+        solver.set_result(result)
+        return self._track(Job(kind), solver, on_done, pooled=False)
+
+    def run(self, fn, *args) -> Future:
+        """Runs one task in the pool, outside of any job; resolves to fn's result."""
+        result = Future()
+
+        def unwrap(task):
+            try:
+                value, recorded = task.result()
+            except BaseException as exc:
+                result.set_exception(exc)
+                return
+            metrics.registry.merge(recorded)
+            result.set_result(value)
+
+        self.executor.submit(metrics.call_and_drain, fn, *args).add_done_callback(unwrap)
+        return result
+
+    def _track(self, job, solver, on_done, pooled):
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+
+        job._solver = solver
+        solver.add_done_callback(lambda f: self._schedule_finish(job, f, on_done, pooled))
+        return job
+
+    def _schedule_finish(self, job, solver, on_done, pooled):
+        try:
+            self._finisher.submit(self._finish, job, solver, on_done, pooled)
+        except RuntimeError:
+            # Shutting down: record the outcome, but skip the callback
+            self._finish(job, solver, None, pooled)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._coordinator.shutdown(wait=False, cancel_futures=True)
+        self._finisher.shutdown(wait=False)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+    def _finish(self, job, solver_future, on_done, pooled):
+        try:
+            result = solver_future.result()
+            if pooled:
+                result, recorded = result
+                metrics.registry.merge(recorded)
+            job.result = on_done(result) if on_done is not None else result
+        except Exception as exc:
+            job.error = f"{type(exc).__name__}: {exc}"
+        job.finished_at = time.time()
+        metrics.increment("jobs_total", kind=job.kind, status="failed" if job.error is not None else "done")
+        metrics.observe("job_duration_seconds", job.finished_at - job.submitted_at, kind=job.kind)
+        if job.error is not None:
+            job.done.set_exception(RuntimeError(job.error))
+        else:
+            job.done.set_result(job.result)
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done.done()]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+
+jobs = JobManager()
+
+
+def submit_optimization(bins, threshold=0.7, algorithm="main", time_budget_ms=None, progress=None,
+                        fill_levels=None, forecast_levels=None) -> Job:
+    """
+    Draws fill levels for the cached topology here (unless given, e.g. from live
+    readings), solves in a worker process, then saves bins and route from this
+    process once the solver is done. `progress` is an optional queue from
+    jobs.progress_queue(); see solve_optimization for `forecast_levels`.
+    Raises TooManyStops up front when "exact" gets more full bins than it can solve.
+    Clustered algorithms spread their clusters over the pool (see solve_clustered).
+
+    A route solved recently for the same full bins is reused (see result_cache),
+    unless progress is streamed; it is saved like a new one, with "cached" set.
+    """
+    if fill_levels is None:
+        fill_levels = generate_fill_levels(bins)
+    topology = get_topology(bins)
+    graph = topology.with_fill_levels(fill_levels)
+    collected = topology.with_fill_levels(fill_levels, forecast_levels)
+    stops = len(collected.full_bins(threshold))
+    if algorithm == "exact" and stops > max_stops():
+        # Known before solving, so it is the request that fails rather than the job
+        raise TooManyStops(f"{stops} full bins are more than the {max_stops()} the exact algorithm can solve; "
+                           f"raise the threshold or use another algorithm.")
+    key = None
+    if progress is None:
+        key = result_key("optimize-route", collected, threshold, algorithm=algorithm, time_budget_ms=time_budget_ms)
+
+    def persist(result, cached=False):
+        if key is not None and not cached:
+            results.put(key, result)
+        db = SessionLocal()
+        try:
+            batch_id = save_optimization(
+                db, graph, result["optimized_route"], result["total_distance"], result["bins_covered"]
+            )
+        finally:
+            db.close()
+        return {**result, "threshold": threshold, "batch_id": batch_id, "cached": cached}
+
+    cached = results.get(key) if key is not None else None
+    if cached is not None:
+        return jobs.complete("optimize-route", cached, on_done=lambda result: persist(result, cached=True))
+    if algorithm in CLUSTERED_ALGORITHMS:
+        return jobs.coordinate("optimize-route", solve_clustered, bins, fill_levels, threshold, TOPOLOGY_SEED,
+                               forecast_levels, on_done=persist)
+    return jobs.submit("optimize-route", solve_optimization, bins, fill_levels, threshold, algorithm,
+                       TOPOLOGY_SEED, time_budget_ms, progress, forecast_levels, on_done=persist)
+
+
+def solve_clustered(bins, fill_levels, threshold=0.7, network_seed=TOPOLOGY_SEED, forecast_levels=None):
+    """
+    Partitions the full bins in one worker, routes every cluster in parallel
+    workers, then stitches the cluster tours together in one more.
+    """
+    clusters = jobs.run(plan_clusters, bins, fill_levels, threshold, network_seed, forecast_levels).result()
+    runs = [jobs.run(solve_cluster, bins, nodes, network_seed) for nodes in clusters]
+    return jobs.run(stitch_clusters, bins, [run.result() for run in runs], network_seed).result()
+
+
+def compare_algorithms(graph, threshold=0.7, measure_memory=True):
+    """
+    Builds the shared distance matrix in one worker, then runs every algorithm on
+    it in parallel workers. Returns each algorithm's report, plus the cost of the
+    shared preprocessing. The exact solver reports an error when there are too
+    many full bins for it, or some cannot be reached.
+    """
+    matrix, preprocessing = jobs.run(prepare_comparison, graph, threshold).result()
+    runs = {
+        name: jobs.run(run_algorithm, name, graph, matrix, threshold, measure_memory)
+        for name in COMPARISON_LABELS
+    }
+    reports = {}
+    for name, run in runs.items():
+        try:
+            reports[COMPARISON_LABELS[name]] = run.result()
+        except (ValueError, NoPathError) as exc:
+            if name not in OPTIONAL_COMPARISONS:
+                raise
+            reports[COMPARISON_LABELS[name]] = {"error": str(exc)}
+    return {**reports, "preprocessing": preprocessing}
+
+
+def submit_comparison(graph, threshold=0.7, measure_memory=True) -> Job:
+    """Compares the algorithms on `graph`, or reuses a comparison of the same full bins (see result_cache)."""
+    graph = as_compact(graph)
+    key = result_key("compare-algorithms", graph, threshold, measure_memory=measure_memory)
+    cached = results.get(key)
+    if cached is not None:
+        return jobs.complete("compare-algorithms", {**cached, "cached": True})
+
+    def remember(report):
+        results.put(key, report)
+        return {**report, "cached": False}
+
+    return jobs.coordinate("compare-algorithms", compare_algorithms, graph, threshold, measure_memory,
+                           on_done=remember)
+
+
+def start_scenarios(scenarios, fill_levels=None, forecasts=None):
+    """
+    Draws the fill levels of each scenario (bins, threshold, algorithm, seed,
+    network_seed) here, unless given in `fill_levels`, and starts solving all of
+    them in the pool at once, with their `forecasts` (see solve_optimization).
+    Returns one (graph, future result) pair per scenario, in order.
+    """
+    runs = []
+    fill_levels = fill_levels or [None] * len(scenarios)
+    forecasts = forecasts or [None] * len(scenarios)
+    for scenario, levels, forecast in zip(scenarios, fill_levels, forecasts):
+        if levels is None:
+            levels = generate_fill_levels(scenario.bins, np.random.default_rng(scenario.seed))
+        graph = get_topology(scenario.bins, scenario.network_seed).with_fill_levels(levels)
+        future = jobs.run(solve_optimization, scenario.bins, levels, scenario.threshold,
+                          scenario.algorithm, scenario.network_seed, scenario.time_budget_ms, None, forecast)
+        runs.append((graph, future))
+    return runs
+
+
+def save_scenarios(solved):
+    """Persists (graph, result) pairs in one transaction; returns their batch ids."""
+    db = SessionLocal()
+    try:
+        return save_optimizations(db, [
+            (graph, result["optimized_route"], result["total_distance"], result["bins_covered"])
+            for graph, result in solved
+        ])
+    finally:
+        db.close()
@@ -1,9 +1,40 @@
-from fastapi import FastAPI
-from src.api.routes import algorithm_routes
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from src import metrics
+from src.algorithm import landmarks
+from src.algorithm.road_network import load_road_network
+from src.api.jobs import jobs
+from src.api.routes import algorithm_routes, history_routes, job_routes, metrics_routes, \
+    road_routes, telemetry_routes
+from src.api.compression import CompressionMiddleware
+from src.api.encoding import DefaultResponse
+from src.api.telemetry import save_history, telemetry
 from fastapi.middleware.cors import CORSMiddleware
 
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("ROUTING_COMPRESS_MIN_BYTES", 1024))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    landmarks.preload()
+    # Indexes are built by the A* queries that need them, in job workers, never here
+    landmarks.disable_builds()
+    # Maps the road network's arrays (and loads its landmark index) before the first request
+    load_road_network()
+    yield
+    telemetry.shutdown()
+    save_history()
+    jobs.shutdown()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=DefaultResponse)
+
+# Brotli when the brotli package is installed, gzip otherwise; streams are left uncompressed
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,6 +45,25 @@ app.add_middleware(
 )
 
 app.include_router(algorithm_routes.router)
+app.include_router(history_routes.router)
+app.include_router(job_routes.router)
+app.include_router(metrics_routes.router)
+app.include_router(road_routes.router)
+app.include_router(telemetry_routes.router)
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/jobs/{job_id}), not the raw path, to keep series bounded
+    route = request.scope.get("route")
+    metrics.observe(
+        metrics.REQUEST_METRIC, time.perf_counter() - start,
+        method=request.method, path=getattr(route, "path", "unmatched"), status=response.status_code
+    )
+    return response
+
 
 @app.get("/")
 def home():
@@ -0,0 +1,86 @@
+"""
+Route images drawn with Matplotlib's object-oriented Figure API.
+
+Nothing here touches pyplot's global state, so images can be drawn concurrently,
+and render_route takes and returns picklable values so it can run in the job pool.
+Matplotlib is imported on the first render rather than with the API.
+"""
+import hashlib
+import io
+import os
+
+import numpy as np
+
+from src import metrics
+from src.algorithm.lru import LRUCache
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+# Bumped whenever the drawing changes, so clients revalidate their cached images
+RENDER_VERSION = 1
+# Past this many bins the bin and weight labels are unreadable, so they are left out
+LABEL_MAX_NODES = 100
+# Rendered images kept in memory, in bytes
+RENDER_CACHE_BYTES = int(os.environ.get("ROUTING_RENDER_CACHE_MB", 64)) * 1024 * 1024
+
+# (route id, batch id, threshold, format) -> image bytes
+images = LRUCache(maxsize=RENDER_CACHE_BYTES, sizeof=len, name="rendered_images")
+
+
+def image_etag(batch_id, threshold, fmt):
+    key = f"{batch_id}:{threshold}:{fmt}:{RENDER_VERSION}"
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+
+@metrics.span("render_route")
+def render_route(graph, route, threshold=0.7, fmt="png") -> bytes:
+    """
+    Draws the network of `graph` (a CompactGraph with positions and fill levels)
+    with full bins in red and `route` (bin ids) in green, and returns the image.
+    """
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Patch
+
+    fig = Figure(figsize=(12, 9), constrained_layout=True)
+    ax = fig.add_subplot()
+    ax.set_axis_off()
+
+    pos = graph.positions
+    u, v, w = graph.edge_arrays()
+    ax.add_collection(LineCollection(np.stack((pos[u], pos[v]), axis=1), colors="gray", alpha=0.4, zorder=1))
+
+    stops = [graph.index_of(node) for node in route if node in graph.index]
+    if len(stops) > 1:
+        ax.add_collection(LineCollection([pos[stops]], colors="green", linewidths=3, zorder=2))
+
+    # Color nodes by fill level
+    full = np.zeros(graph.num_nodes, dtype=bool)
+    if graph.fill_levels is not None:
+        full = graph.fill_levels >= threshold
+    labelled = graph.num_nodes <= LABEL_MAX_NODES
+    ax.scatter(
+        pos[:, 0], pos[:, 1],
+        s=600 if labelled else 20,
+        c=np.where(full, "red", "skyblue"),
+        zorder=3
+    )
+
+    if labelled:
+        for name, (x, y) in zip(graph.names, pos.tolist()):
+            ax.text(x, y, name, ha="center", va="center", fontsize=10, fontweight="bold", zorder=4)
+        mid = (pos[u] + pos[v]) / 2
+        for (x, y), weight in zip(mid.tolist(), w.tolist()):
+            ax.text(x, y, f"{weight:.1f}", ha="center", va="center", fontsize=8, zorder=4,
+                    bbox={"boxstyle": "round", "fc": "white", "ec": "none", "alpha": 0.7})
+
+    ax.autoscale_view()
+    ax.legend(handles=[
+        Patch(facecolor="red", label="Full Bin"),
+        Patch(facecolor="skyblue", label="Not Full Bin"),
+        Patch(edgecolor="green", facecolor="none", label="Optimized Route", linewidth=2)
+    ], loc="upper right")
+    ax.set_title("Optimized Route Visualization")
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt)
+    return buf.getvalue()
@@ -0,0 +1,119 @@
+"""
+Results of recent solves, keyed by what determines them.
+
+A route depends only on the topology, the set of bins at or above the threshold
+and the algorithm with its options, not on the fill levels themselves, so the
+key is a hash of exactly those. Dispatchers refreshing the same batch then get
+the route already computed instead of a new solve.
+
+Results live in memory for RESULT_CACHE_TTL_S seconds, and with
+ROUTING_RESULT_CACHE_DIR set also as JSON files there, which outlive restarts and
+are shared by every API process using the directory. Expired files are deleted
+when read, and each save prunes the directory to RESULT_CACHE_DISK_FILES files,
+expired and oldest first.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src import metrics
+from src.algorithm.lru import LRUCache
+
+# Results kept in memory
+RESULT_CACHE_SIZE = int(os.environ.get("ROUTING_RESULT_CACHE_SIZE", 256))
+# Seconds a result is served for; 0 turns the cache off
+RESULT_CACHE_TTL_S = float(os.environ.get("ROUTING_RESULT_CACHE_TTL_S", 300))
+# Where results are also saved; unset, they only live in memory
+RESULT_CACHE_DIR = os.environ.get("ROUTING_RESULT_CACHE_DIR")
+# Results kept on disk
+RESULT_CACHE_DISK_FILES = int(os.environ.get("ROUTING_RESULT_CACHE_DISK_FILES", 10000))
+
+
+def result_key(kind, graph, threshold, **options):
+    """Hash of the topology of `graph` (a CompactGraph), its full bins at `threshold`, and `options`."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([kind, graph.fingerprint, sorted(options.items())]).encode())
+    digest.update(np.ascontiguousarray(graph.full_bins(threshold), dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL_S, directory=RESULT_CACHE_DIR,
+                 max_files=RESULT_CACHE_DISK_FILES):
+        self.ttl = ttl
+        self.directory = directory
+        self.max_files = max_files
+        self._memory = LRUCache(maxsize=maxsize, name="route_results", ttl=ttl)
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """The result saved under `key` within the last ttl seconds, or None."""
+        if not self.enabled:
+            return None
+        result = self._memory.get(key)
+        if result is not None or not self.directory:
+            return result
+
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) < self.ttl:
+                with open(path) as f:
+                    result = json.load(f)
+            else:
+                os.remove(path)
+        except (OSError, ValueError):
+            result = None
+        metrics.increment("cache_requests_total", cache="route_results_disk",
+                          result="miss" if result is None else "hit")
+        if result is not None:
+            self._memory.put(key, result)
+        return result
+
+    def put(self, key, result):
+        if not self.enabled:
+            return
+        self._memory.put(key, result)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            # Written aside and renamed, so other processes never read half a file
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp, self._path(key))
+            self._prune()
+
+    def _prune(self):
+        """Deletes expired files, then the oldest ones beyond max_files."""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue  # removed by another process meanwhile
+        files.sort(reverse=True)
+        now = time.time()
+        for i, (mtime, path) in enumerate(files):
+            if i >= self.max_files or now - mtime >= self.ttl:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        self._memory.clear()
+
+
+results = ResultCache()
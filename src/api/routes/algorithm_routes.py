@@ -1,19 +1,25 @@
-import networkx as nx
-import matplotlib
-matplotlib.use('Agg')
-from fastapi import APIRouter, Depends
-from fastapi.responses import HTMLResponse
-import matplotlib.pyplot as plt
-import io
-import base64
-import uuid
-
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, StreamingResponse
+from typing import Literal, Optional
+import asyncio
+import json
+import queue
+
+from src.models.request_models import BatchOptimizeRequest
 from src.models.response_models import RouteOptimizationResponse
-from src.algorithm.data_generator import generate_synthetic_data
-from src.algorithm.routing import find_best_route_using_djikstra, find_best_route, find_best_route_using_astar, \
-    find_naive_route
+from src.api.encoding import comparison_response, route_response
+from src.api.jobs import jobs, save_scenarios, start_scenarios, submit_comparison, submit_optimization
+from src.api.render import FORMATS, image_etag, images, render_route
+from src.api.telemetry import forecast_levels, live_fill_levels
+from src.algorithm.data_generator import bin_names
+from src.algorithm.exact import TooManyStops
+from src.algorithm.routing import ALGORITHMS, as_compact
+from src.algorithm.topology_cache import get_topology
 from sqlalchemy.orm import Session
 from src.database.connection import SessionLocal
+from src.database.persistence import network_graph
+from src.database.route_history import latest_route
 
 from src.database.models import Bin, Route
 
@@ -27,171 +33,228 @@ def get_db():
         db.close()
 
 
-@router.get("/optimize-route", response_model=RouteOptimizationResponse)
-def optimize_route(bins: int = 20, threshold: float = 0.7, db: Session = Depends(get_db)):
-    graph = generate_synthetic_data(num_bins=bins)
-    route, total_dist, bins_covered = find_best_route(graph, threshold=threshold)
-
-    # Convert graph node data to serializable form
-    graph_data = {
-        node: {
-            "pos": list(attr["pos"]),
-            "fill_level": attr["fill_level"]
-        } for node, attr in graph.nodes(data=True)
-    }
-    batch_id = str(uuid.uuid4())
-
-    for bin_id, data in graph_data.items():
-        bin_entry = Bin(id=bin_id, position=data["pos"], fill_level=data["fill_level"], batch_id=batch_id)
-        db.merge(bin_entry)
-
-    db.commit()  # Save Bins to DB
-
-    edges_data = []
-    for u, v, data in graph.edges(data=True):
-        edges_data.append({
-            "from": u,
-            "to": v,
-            "weight": data["weight"]
-        })
-
-    # Save Route with edges
-    route_entry = Route(
-        optimized_route=route,
-        total_distance=total_dist,
-        bins_covered=bins_covered,
-        batch_id=batch_id,
-        edges=edges_data
-    )
+def fill_levels_for(db: Session, bins, fill_source):
+    """Fill levels to route on: None to draw synthetic ones, or the latest sensor readings."""
+    if fill_source == "live":
+        return live_fill_levels(db, bin_names(bins))
+    return None
+
 
-    db.add(route_entry)
-    db.commit()
+def forecast_levels_for(bins, fill_source, horizon_min):
+    """Forecast fill levels `horizon_min` minutes ahead, for routes on live readings only."""
+    if fill_source != "live" or not horizon_min:
+        return None
+    return forecast_levels(bin_names(bins), horizon_min * 60)
 
-    # Return result
+
+@router.get("/optimize-route", response_model=RouteOptimizationResponse)
+async def optimize_route(request: Request, bins: int = Query(20, ge=1), threshold: float = Query(0.7, ge=0, le=1),
+                         algorithm: str = "main",
+                         time_budget_ms: Optional[int] = Query(None, ge=0),
+                         fill_source: Literal["synthetic", "live"] = "synthetic",
+                         forecast_horizon_min: Optional[float] = Query(None, ge=0), db: Session = Depends(get_db)):
+    """The route, as bin ids, or as node indices when compact JSON or binary is accepted (see encoding)."""
+    if algorithm not in ALGORITHMS:
+        raise HTTPException(status_code=422,
+                            detail=f"Unknown algorithm '{algorithm}'; expected one of {sorted(ALGORITHMS)}")
+    fill_levels = await run_in_threadpool(fill_levels_for, db, bins, fill_source)
+    forecast = await run_in_threadpool(forecast_levels_for, bins, fill_source, forecast_horizon_min)
+    # Solving runs in the job pool, so this worker stays free while it waits
+    try:
+        job = await run_in_threadpool(submit_optimization, bins, threshold, algorithm, time_budget_ms, None,
+                                      fill_levels, forecast)
+    except TooManyStops as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    result = await asyncio.wrap_future(job.done)
+
+    encoded = route_response(request, get_topology(bins).graph.index, result, threshold)
+    if encoded is not None:
+        return encoded
     return RouteOptimizationResponse(
-        optimized_route=route,
-        total_distance=round(total_dist, 2),
-        bins_covered=bins_covered,
-        threshold=threshold
+        optimized_route=result["optimized_route"],
+        total_distance=round(result["total_distance"], 2),
+        bins_covered=result["bins_covered"],
+        threshold=threshold,
+        cached=result["cached"]
     )
 
+# Default time budget of /optimize-route/stream
+STREAM_TIME_BUDGET_MS = 2000
+
+
+def _next_update(updates, job):
+    """The next progress update of a job, or None once it has no more."""
+    while True:
+        try:
+            return updates.get(timeout=0.1)
+        except queue.Empty:
+            # The solver always ends with None, unless its worker died
+            if job.done.done():
+                return None
+
+
+@router.get("/optimize-route/stream")
+async def optimize_route_stream(request: Request, bins: int = Query(20, ge=1),
+                                threshold: float = Query(0.7, ge=0, le=1),
+                                time_budget_ms: int = Query(STREAM_TIME_BUDGET_MS, ge=0),
+                                fill_source: Literal["synthetic", "live"] = "synthetic",
+                                forecast_horizon_min: Optional[float] = Query(None, ge=0),
+                                db: Session = Depends(get_db)):
+    """
+    Solves like /optimize-route with a time budget, streaming every improvement
+    (route, distance, iteration, elapsed time) as it is found, then the saved result.
+    Sent as Server-Sent Events when the client accepts text/event-stream, NDJSON otherwise.
+    """
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    fill_levels = await run_in_threadpool(fill_levels_for, db, bins, fill_source)
+    forecast = await run_in_threadpool(forecast_levels_for, bins, fill_source, forecast_horizon_min)
+    updates = await run_in_threadpool(jobs.progress_queue)
+    job = await run_in_threadpool(submit_optimization, bins, threshold, "main", time_budget_ms, updates, fill_levels,
+                                  forecast)
+
+    def encode(event, data):
+        if sse:
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"type": event, **data}) + "\n"
+
+    async def events():
+        while (update := await run_in_threadpool(_next_update, updates, job)) is not None:
+            yield encode("progress", update)
+        try:
+            result = await asyncio.wrap_future(job.done)
+            yield encode("result", {**result, "threshold": threshold})
+        except Exception as exc:
+            yield encode("error", {"error": str(exc)})
+
+    return StreamingResponse(events(), media_type="text/event-stream" if sse else "application/x-ndjson")
+
+
+@router.post("/optimize-route/batch")
+async def optimize_route_batch(request: BatchOptimizeRequest, db: Session = Depends(get_db)):
+    """
+    Solves every scenario in parallel and streams one NDJSON line per scenario as
+    it finishes, in completion order. Once all are solved, the successful ones are
+    saved in one transaction and a last line maps each scenario to its batch id.
+    """
+    fill_levels, forecasts = [], []
+    for scenario in request.scenarios:
+        fill_levels.append(await run_in_threadpool(fill_levels_for, db, scenario.bins, scenario.fill_source))
+        forecasts.append(await run_in_threadpool(
+            forecast_levels_for, scenario.bins, scenario.fill_source, scenario.forecast_horizon_min
+        ))
+    runs = await run_in_threadpool(start_scenarios, request.scenarios, fill_levels, forecasts)
+
+    async def results():
+        pending = {asyncio.wrap_future(future): index for index, (_, future) in enumerate(runs)}
+        solved = {}
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = pending.pop(task)
+                line = {"type": "result", "index": index, "scenario": request.scenarios[index].model_dump()}
+                try:
+                    solved[index] = task.result()
+                    line["result"] = solved[index]
+                except Exception as exc:
+                    line["error"] = f"{type(exc).__name__}: {exc}"
+                yield json.dumps(line) + "\n"
+
+        batch_ids = [None] * len(runs)
+        summary = {"type": "summary", "solved": len(solved), "failed": len(runs) - len(solved)}
+        try:
+            order = sorted(solved)
+            saved = await run_in_threadpool(save_scenarios, [(runs[i][0], solved[i]) for i in order])
+            for index, batch_id in zip(order, saved):
+                batch_ids[index] = batch_id
+        except Exception as exc:
+            summary["error"] = f"{type(exc).__name__}: {exc}"
+        yield json.dumps({**summary, "batch_ids": batch_ids}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @router.get("/view-last-route", response_class=HTMLResponse)
 def view_last_route(threshold: float = 0.7, db: Session = Depends(get_db)):
-    # Get last saved route
-    last_route = db.query(Route).order_by(Route.id.desc()).first()
+    last_route = latest_route(db)
     if not last_route:
         return HTMLResponse("<h2>No route data found.</h2>")
 
-    last_route = db.query(Route).order_by(Route.id.desc()).first()
-    bin_data = db.query(Bin).filter(Bin.batch_id == last_route.batch_id).all()
-
-    bins_positions = {b.id: b.position for b in bin_data}
-    route_nodes = last_route.optimized_route
-
-    img_html = visualize_graph_from_data(
-        bins_positions,
-        route_nodes,
-        edges=last_route.edges,
-        fill_level_data={b.id: b.fill_level for b in bin_data},
-        threshold=threshold
-    )
-
+    # The image itself is served (and cached) by /routes/{id}/image.png
     return HTMLResponse(f"""
     <html>
     <body>
     <h2>Optimized Route Visualization</h2>
-    {img_html}
+    <img src="/routes/{last_route.id}/image.png?threshold={threshold}" />
     </body>
     </html>
     """)
 
-def visualize_graph_from_data(bins_positions, route_nodes, edges, fill_level_data=None, threshold=0.7):
-    G = nx.Graph()
-
-    for bin_id, pos in bins_positions.items():
-        G.add_node(bin_id, pos=tuple(pos))
 
-    for edge in edges:
-        G.add_edge(edge["from"], edge["to"], weight=edge["weight"])
-
-    pos = nx.get_node_attributes(G, 'pos')
-    edge_labels = {(e["from"], e["to"]): f'{e["weight"]:.1f}' for e in edges}
-
-    # Color nodes by fill level
-    node_colors = []
-    for node in G.nodes():
-        fill = fill_level_data.get(node, 0) if fill_level_data else 0
-        node_colors.append("red" if fill >= threshold else "skyblue")
-
-    # Build route edges (optimized route)
-    route_edges = [(route_nodes[i], route_nodes[i + 1]) for i in range(len(route_nodes) - 1)]
-
-    plt.figure(figsize=(12, 9), constrained_layout=True)
-    nx.draw(
-        G, pos,
-        with_labels=True,
-        node_size=600,
-        node_color=node_colors,
-        font_weight='bold',
-        font_size=10
+@router.get("/routes/{route_id}/image.{fmt}")
+async def route_image(route_id: int, fmt: str, request: Request, threshold: float = 0.7,
+                      db: Session = Depends(get_db)):
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=404, detail=f"Unknown image format '{fmt}'.")
+
+    route = await run_in_threadpool(db.get, Route, route_id)
+    if route is None:
+        raise HTTPException(status_code=404, detail="Route not found.")
+
+    headers = {"ETag": image_etag(route.batch_id, threshold, fmt), "Cache-Control": "no-cache"}
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    key = (route.id, route.batch_id, threshold, fmt)
+    image = images.get(key)
+    if image is None:
+        graph, error = await run_in_threadpool(load_route_graph, db, route)
+        if error:
+            raise HTTPException(status_code=404, detail=error)
+        # Drawing is CPU bound, so it runs in the job pool rather than a request thread
+        image = await asyncio.wrap_future(
+            jobs.run(render_route, graph, route.optimized_route, threshold, fmt)
+        )
+        images.put(key, image)
+
+    return Response(image, media_type=FORMATS[fmt], headers=headers)
+
+
+def load_route_graph(db: Session, route: Route):
+    """
+    Rebuilds the graph a route was planned on from its stored network and the
+    saved bins of its batch. Returns (graph, error message).
+    """
+    bin_data = db.query(Bin).filter(Bin.batch_id == route.batch_id).all()
+    if not bin_data:
+        return None, "No bin data found for the route's batch."
+    # Bins are keyed by id alone, so a later batch may have taken some of them over
+    if len(bin_data) < len(route.network.node_names):
+        return None, "Some bins of the route's batch have since been replaced by a later batch."
+
+    graph = network_graph(
+        route.network,
+        positions={b.id: b.position for b in bin_data},
+        fill_levels={b.id: b.fill_level for b in bin_data}
     )
-
-    nx.draw_networkx_edges(G, pos, edge_color='gray', alpha=0.4)
-    nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=8)
-    nx.draw_networkx_edges(G, pos, edgelist=route_edges, edge_color='green', width=3)
-
-    # Add custom legend
-    from matplotlib.patches import Patch
-    legend_elements = [
-        Patch(facecolor='red', label='Full Bin'),
-        Patch(facecolor='skyblue', label='Not Full Bin'),
-        Patch(edgecolor='green', facecolor='none', label='Optimized Route', linewidth=2)
-    ]
-    plt.legend(handles=legend_elements, loc='upper right')
-    plt.title("Optimized Route Visualization")
+    return graph, None
 
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    plt.close()
-    buf.seek(0)
-
-    image_base64 = base64.b64encode(buf.read()).decode("utf-8")
-    buf.close()
-
-    return f'<img src="data:image/png;base64,{image_base64}" />'
+def load_latest_graph(db: Session):
+    """The graph of the most recent batch. Returns (graph, error message)."""
+    last_route = latest_route(db)
+    if not last_route:
+        return None, "No optimized route found yet."
+    return load_route_graph(db, last_route)
 
 
 @router.get("/compare-algorithms")
-def compare_algorithms(threshold: float = 0.7, db: Session = Depends(get_db)):
-    # Get the most recent batch ID from the routes table
-    last_route = db.query(Route).order_by(Route.id.desc()).first()
-    if not last_route:
-        return {"error": "No optimized route found yet."}
-
-    # Get all bins from the same batch
-    bin_data = db.query(Bin).filter(Bin.batch_id == last_route.batch_id).all()
-    if not bin_data:
-        return {"error": "No bin data found for the latest batch."}
-
-    # Rebuild the graph
-    G = nx.Graph()
-    for bin in bin_data:
-        G.add_node(bin.id, pos=tuple(bin.position), fill_level=bin.fill_level)
-
-    # Add the saved edges from the route
-    for edge in last_route.edges:
-        G.add_edge(edge["from"], edge["to"], weight=edge["weight"])
-
-    # Run all four algorithms on the same graph
-    o_route, o_dist, o_cov = find_best_route(G, threshold)
-    d_route, d_dist, d_cov = find_best_route_using_djikstra(G, threshold)
-    a_route, a_dist, a_cov = find_best_route_using_astar(G, threshold)
-    n_route, n_dist, n_cov = find_naive_route(G, threshold)
-
-    return {
-        "dijkstra": {"distance": round(d_dist, 2), "bins": d_cov, "route": d_route},
-        "astar":    {"distance": round(a_dist, 2), "bins": a_cov, "route": a_route},
-        "naive":    {"distance": round(n_dist, 2), "bins": n_cov, "route": n_route},
-        "Main":     {"distance": round(o_dist, 2), "bins": o_cov, "route": o_route},
-    }
+async def compare_algorithms(request: Request, threshold: float = 0.7, measure_memory: bool = True,
+                             db: Session = Depends(get_db)):
+    graph, error = await run_in_threadpool(load_latest_graph, db)
+    if error:
+        return {"error": error}
+    graph = await run_in_threadpool(as_compact, graph)
+
+    # The four algorithms run in parallel in the job pool, sharing one distance matrix
+    job = await run_in_threadpool(submit_comparison, graph, threshold, measure_memory)
+    return comparison_response(request, graph.names, await asyncio.wrap_future(job.done))
@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from src.api.routes.algorithm_routes import get_db
+from src.database.models import Route
+from src.database.route_history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, list_routes, summary
+from src.models.response_models import RouteDetail, RouteHistoryPage
+
+router = APIRouter(prefix="/routes")
+
+
+@router.get("", response_model=RouteHistoryPage)
+def route_history(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None,
+                  since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  network_id: Optional[int] = None, batch_id: Optional[str] = None,
+                  db: Session = Depends(get_db)):
+    """Saved routes, newest first, without their stops; follow `next_cursor` for older ones."""
+    try:
+        routes, next_cursor = list_routes(db, limit, cursor, since, until, network_id, batch_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return RouteHistoryPage(routes=routes, next_cursor=next_cursor)
+
+
+@router.get("/{route_id}", response_model=RouteDetail)
+def route_detail(route_id: int, db: Session = Depends(get_db)):
+    route = db.get(Route, route_id)
+    if route is None:
+        raise HTTPException(status_code=404, detail="Route not found.")
+    return RouteDetail(**summary(route), optimized_route=route.optimized_route)
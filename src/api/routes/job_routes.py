@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from src.algorithm.exact import TooManyStops
+from src.api.jobs import jobs, submit_comparison, submit_optimization
+from src.api.routes.algorithm_routes import fill_levels_for, forecast_levels_for, get_db, load_latest_graph
+from src.models.request_models import CompareAlgorithmsRequest, OptimizeRouteRequest
+from src.models.response_models import JobStatusResponse, JobSubmittedResponse
+
+router = APIRouter(prefix="/jobs")
+
+
+@router.post("/optimize-route", response_model=JobSubmittedResponse, status_code=202)
+def create_optimization_job(request: OptimizeRouteRequest, db: Session = Depends(get_db)):
+    fill_levels = fill_levels_for(db, request.bins, request.fill_source)
+    forecast = forecast_levels_for(request.bins, request.fill_source, request.forecast_horizon_min)
+    try:
+        job = submit_optimization(request.bins, request.threshold, request.algorithm, request.time_budget_ms,
+                                  fill_levels=fill_levels, forecast_levels=forecast)
+    except TooManyStops as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return JobSubmittedResponse(job_id=job.id, status=job.status)
+
+
+@router.post("/compare-algorithms", response_model=JobSubmittedResponse, status_code=202)
+def create_comparison_job(request: CompareAlgorithmsRequest, db: Session = Depends(get_db)):
+    graph, error = load_latest_graph(db)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+
+    job = submit_comparison(graph, request.threshold, request.measure_memory)
+    return JobSubmittedResponse(job_id=job.id, status=job.status)
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JobStatusResponse(**job.to_dict())
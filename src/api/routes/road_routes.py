@@ -0,0 +1,62 @@
+import asyncio
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from src.algorithm.road_network import load_road_network
+from src.algorithm.solver import solve_road_route
+from src.api.encoding import route_response
+from src.api.jobs import jobs
+from src.api.routes.algorithm_routes import get_db
+from src.api.telemetry import live_fill_levels
+from src.models.request_models import RoadRouteRequest
+from src.models.response_models import RoadNetworkInfo, RouteOptimizationResponse
+
+router = APIRouter(prefix="/road-network")
+
+
+def _network():
+    network = load_road_network()
+    if network is None:
+        raise HTTPException(status_code=404, detail="No road network is configured (set ROUTING_ROAD_NETWORK).")
+    return network
+
+
+@router.get("", response_model=RoadNetworkInfo)
+def road_network_info():
+    meta = _network().meta
+    return RoadNetworkInfo(nodes=meta["nodes"], edges=meta["edges"], bins=meta["bins"],
+                           fingerprint=meta["fingerprint"])
+
+
+@router.post("/optimize-route", response_model=RouteOptimizationResponse)
+async def optimize_road_route(request: RoadRouteRequest, http_request: Request, db: Session = Depends(get_db)):
+    """
+    Routes the network's bins on the road network. Road routes are not saved,
+    as the routes table stores the synthetic networks they were planned on.
+    Node indices (see encoding) are rows of the nodes CSV the network came from.
+    """
+    network = _network()
+    if request.fill_levels is None:
+        bin_levels = await run_in_threadpool(live_fill_levels, db, network.bin_ids)
+    else:
+        unknown = sorted(set(request.fill_levels) - set(network.bin_ids))
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown bins: {', '.join(unknown[:10])}")
+        bin_levels = np.array([request.fill_levels.get(b, 0.0) for b in network.bin_ids])
+
+    # Workers map the same files, so only the directory and fill levels are shipped
+    result = await asyncio.wrap_future(
+        jobs.run(solve_road_route, network.directory, bin_levels, request.threshold, request.algorithm)
+    )
+    encoded = route_response(http_request, network.graph.index, result, request.threshold)
+    if encoded is not None:
+        return encoded
+    return RouteOptimizationResponse(
+        optimized_route=result["optimized_route"],
+        total_distance=round(result["total_distance"], 2),
+        bins_covered=result["bins_covered"],
+        threshold=request.threshold
+    )
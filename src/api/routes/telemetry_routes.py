@@ -0,0 +1,65 @@
+import math
+import time
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+
+from src import metrics
+from src.api.telemetry import CSV_TYPES, JSON_LINES_TYPES, MAX_REPORTED_ERRORS, BufferFull, history, \
+    parse_readings, telemetry
+from src.models.response_models import FillForecastResponse, TelemetryFlushResponse, TelemetryIngestResponse
+
+router = APIRouter(prefix="/telemetry")
+
+
+@router.post("/readings", response_model=TelemetryIngestResponse, status_code=202)
+async def ingest_readings(request: Request):
+    content_type = request.headers.get("content-type", "application/x-ndjson")
+    if content_type.split(";")[0].strip().lower() not in JSON_LINES_TYPES + CSV_TYPES:
+        raise HTTPException(status_code=415, detail="Send readings as JSON lines or CSV.")
+
+    body = await request.body()
+    try:
+        readings, errors = await run_in_threadpool(parse_readings, body, content_type)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    try:
+        buffered = telemetry.offer(readings)
+    except BufferFull as exc:
+        # Backpressure: the client should retry once the next flush has made room
+        raise HTTPException(status_code=503, detail=f"Telemetry buffer is full: {exc}.",
+                            headers={"Retry-After": str(math.ceil(telemetry.flush_interval))})
+    late = await run_in_threadpool(history.record, readings.bin_ids, readings.fill_levels, readings.timestamps)
+    metrics.increment("fill_history_late_readings_total", late)
+
+    return TelemetryIngestResponse(
+        accepted=len(readings),
+        rejected=len(errors),
+        errors=errors[:MAX_REPORTED_ERRORS],
+        buffered=buffered
+    )
+
+
+@router.post("/flush", response_model=TelemetryFlushResponse)
+async def flush_readings():
+    return TelemetryFlushResponse(written=await run_in_threadpool(telemetry.flush))
+
+
+def _filling_up(threshold, horizon_s, limit):
+    seconds = history.seconds_until(threshold, time.time())
+    soon = np.flatnonzero(seconds <= horizon_s)
+    soon = soon[np.argsort(seconds[soon], kind="stable")][:limit]
+    return [
+        {"bin_id": history.bin_ids[i], "minutes_until_full": round(float(seconds[i]) / 60, 1)}
+        for i in soon.tolist()
+    ]
+
+
+@router.get("/forecast", response_model=FillForecastResponse)
+async def forecast_full_bins(threshold: float = Query(0.7, ge=0, le=1), horizon_min: float = Query(60, ge=0),
+                             limit: int = Query(100, ge=1)):
+    """Bins forecast to reach `threshold` within `horizon_min` minutes, soonest first."""
+    bins = await run_in_threadpool(_filling_up, threshold, horizon_min * 60, limit)
+    return FillForecastResponse(threshold=threshold, horizon_min=horizon_min, bins=bins)
@@ -0,0 +1,304 @@
+"""
+Fill-level readings from bin sensors.
+
+Readings arrive in large batches, as JSON lines or CSV:
+
+    {"bin_id": "bin_3", "fill_level": 0.82, "timestamp": 1760659200.0}
+
+    bin_id,fill_level,timestamp
+    bin_3,0.82,1760659200.0
+
+The timestamp (Unix seconds) is optional and defaults to the time of arrival.
+Batches are validated as a whole, then held in a buffer that keeps the latest
+reading of each bin and is written to the bin_readings table with bulk upserts,
+either once it holds FLUSH_ROWS bins or every FLUSH_INTERVAL_S seconds. When the
+buffer is full, new batches are refused until a flush makes room. Readings are
+kept apart from the bins of planned batches, whose fill levels may be synthetic.
+
+Every accepted reading is also added to the fill history, which forecasts when
+bins will be full.
+"""
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from src import metrics
+from src.algorithm.fill_history import FillHistory
+from src.database.connection import SessionLocal
+from src.database.persistence import load_fill_levels, save_readings
+
+# Bins with readings waiting to be written before new batches are refused
+BUFFER_ROWS = int(os.environ.get("ROUTING_TELEMETRY_BUFFER_ROWS", 200_000))
+# Bins with readings that trigger a flush without waiting for the interval
+FLUSH_ROWS = int(os.environ.get("ROUTING_TELEMETRY_FLUSH_ROWS", 20_000))
+FLUSH_INTERVAL_S = float(os.environ.get("ROUTING_TELEMETRY_FLUSH_INTERVAL_S", 2.0))
+MAX_BIN_ID_LENGTH = 64
+# Validation errors listed in a response; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+# Where the fill history is kept across restarts; unset, it only lives in memory
+HISTORY_PATH = os.environ.get("ROUTING_FILL_HISTORY_PATH")
+
+JSON_LINES_TYPES = ("application/x-ndjson", "application/jsonl", "application/json")
+CSV_TYPES = ("text/csv",)
+
+
+class BufferFull(Exception):
+    pass
+
+
+class Readings:
+    """A validated batch of readings, as columns."""
+
+    def __init__(self, bin_ids, fill_levels, timestamps):
+        self.bin_ids = bin_ids
+        self.fill_levels = fill_levels
+        self.timestamps = timestamps
+
+    def __len__(self):
+        return len(self.bin_ids)
+
+
+def _floats(values):
+    """Converts a list of values to float64, with NaN for anything that is not a number."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                out[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+def _json_line_columns(text):
+    bin_ids, fills, stamps, errors = [], [], [], []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            reading = json.loads(line)
+            bin_ids.append(reading.get("bin_id"))
+            fills.append(reading.get("fill_level"))
+            stamps.append(reading.get("timestamp"))
+        except (ValueError, AttributeError):
+            errors.append(f"line {number}: not a JSON object")
+            bin_ids.append(None)
+            fills.append(None)
+            stamps.append(None)
+    return bin_ids, fills, stamps, errors
+
+
+def _csv_columns(text):
+    rows = csv.reader(io.StringIO(text))
+    header = [column.strip() for column in next(rows, [])]
+    if "bin_id" not in header or "fill_level" not in header:
+        raise ValueError("CSV body needs a header with bin_id and fill_level columns")
+
+    id_col, fill_col = header.index("bin_id"), header.index("fill_level")
+    stamp_col = header.index("timestamp") if "timestamp" in header else None
+    bin_ids, fills, stamps = [], [], []
+    for row in rows:
+        if not row:
+            continue
+        bin_ids.append(row[id_col].strip() if len(row) > id_col else None)
+        fills.append(row[fill_col] if len(row) > fill_col else None)
+        stamp = row[stamp_col] if stamp_col is not None and len(row) > stamp_col else ""
+        stamps.append(stamp if stamp.strip() else None)
+    return bin_ids, fills, stamps, []
+
+
+def parse_readings(body: bytes, content_type="application/x-ndjson", now=None):
+    """
+    Parses and validates a batch of readings. Returns the valid ones as Readings
+    and a list of error messages for the rest, numbered by line (CSV rows count
+    from the line after the header).
+    """
+    content_type = content_type.split(";")[0].strip().lower()
+    text = body.decode("utf-8")
+    if content_type in CSV_TYPES:
+        bin_ids, fills, stamps, errors = _csv_columns(text)
+        line_offset = 2
+    elif content_type in JSON_LINES_TYPES:
+        bin_ids, fills, stamps, errors = _json_line_columns(text)
+        line_offset = 1
+    else:
+        raise ValueError(f"Unsupported content type '{content_type}'; send JSON lines or CSV")
+
+    now = time.time() if now is None else now
+    fill_levels = _floats(fills)
+    timestamps = _floats([now if s is None else s for s in stamps])
+
+    valid_ids = np.array([isinstance(b, str) and 0 < len(b) <= MAX_BIN_ID_LENGTH for b in bin_ids], dtype=bool)
+    valid_fills = np.isfinite(fill_levels) & (fill_levels >= 0) & (fill_levels <= 1)
+    valid_stamps = np.isfinite(timestamps)
+    valid = valid_ids & valid_fills & valid_stamps
+
+    reported = {message.split(":")[0] for message in errors}
+    for i in np.flatnonzero(~valid).tolist():
+        where = f"line {i + line_offset}"
+        if where in reported:
+            continue
+        if not valid_ids[i]:
+            errors.append(f"{where}: bin_id must be a string of 1 to {MAX_BIN_ID_LENGTH} characters")
+        elif not valid_fills[i]:
+            errors.append(f"{where}: fill_level must be a number between 0 and 1")
+        else:
+            errors.append(f"{where}: timestamp must be a number of seconds")
+
+    keep = np.flatnonzero(valid)
+    readings = Readings([bin_ids[i] for i in keep.tolist()], fill_levels[keep], timestamps[keep])
+    return readings, errors
+
+
+class TelemetryBuffer:
+    """
+    Latest reading per bin, waiting to be written. `offer` adds a batch or raises
+    BufferFull; a background thread writes the buffer out with bulk upserts.
+    """
+
+    def __init__(self, capacity=BUFFER_ROWS, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL_S,
+                 session_factory=SessionLocal):
+        self.capacity = capacity
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory
+        # bin id -> (fill level, timestamp)
+        self._pending = {}
+        # Readings taken by a flush that is still writing them; they count towards capacity
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def offer(self, readings: Readings):
+        """Buffers a batch whole, or raises BufferFull without buffering any of it."""
+        with self._lock:
+            new = len(set(readings.bin_ids).difference(self._pending))
+            waiting = len(self._pending) + len(self._in_flight)
+            if waiting + new > self.capacity:
+                metrics.increment("telemetry_batches_total", result="refused")
+                raise BufferFull(f"{waiting} readings are waiting to be written")
+
+            pending = self._pending
+            for bin_id, level, stamp in zip(readings.bin_ids, readings.fill_levels.tolist(),
+                                            readings.timestamps.tolist()):
+                current = pending.get(bin_id)
+                if current is None or stamp >= current[1]:
+                    pending[bin_id] = (level, stamp)
+            size = len(pending)
+
+        metrics.increment("telemetry_batches_total", result="accepted")
+        metrics.increment("telemetry_readings_total", len(readings))
+        self._ensure_started()
+        if size >= self.flush_rows:
+            self._wake.set()
+        return size
+
+    def pending(self):
+        """{bin id: fill level} of the readings not written yet."""
+        with self._lock:
+            waiting = {**self._in_flight, **self._pending}
+        return {bin_id: level for bin_id, (level, _) in waiting.items()}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Writes everything buffered in one transaction. Returns the number of bins written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._in_flight = batch
+            if not batch:
+                return 0
+
+            db = self.session_factory()
+            try:
+                with metrics.span("telemetry.flush"):
+                    save_readings(db, batch)
+                    db.commit()
+            except Exception:
+                db.rollback()
+                # Put the readings back, unless newer ones arrived meanwhile
+                with self._lock:
+                    for bin_id, reading in batch.items():
+                        current = self._pending.get(bin_id)
+                        if current is None or reading[1] > current[1]:
+                            self._pending[bin_id] = reading
+                metrics.increment("telemetry_flushes_total", result="failed")
+                raise
+            finally:
+                db.close()
+                with self._lock:
+                    self._in_flight = {}
+
+            metrics.increment("telemetry_flushes_total", result="done")
+            metrics.increment("telemetry_rows_written_total", len(batch))
+            return len(batch)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(target=self._run, name="telemetry-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Counted in flush(); the readings stay buffered for the next attempt
+                pass
+
+    def shutdown(self):
+        """Stops the background thread and writes what is left."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+telemetry = TelemetryBuffer()
+
+
+def live_fill_levels(db, bin_ids):
+    """
+    Latest known fill level of every bin in `bin_ids`, as an array in that order:
+    buffered readings first, then the bin_readings table, and 0 for bins never reported.
+    """
+    levels = load_fill_levels(db, bin_ids)
+    pending = telemetry.pending()
+    levels.update((bin_id, pending[bin_id]) for bin_id in bin_ids if bin_id in pending)
+    return np.array([levels.get(bin_id, 0.0) for bin_id in bin_ids], dtype=np.float64)
+
+
+def _load_history():
+    if HISTORY_PATH and os.path.exists(HISTORY_PATH):
+        return FillHistory.load(HISTORY_PATH)
+    return FillHistory()
+
+
+history = _load_history()
+
+
+def save_history():
+    if HISTORY_PATH:
+        history.save(HISTORY_PATH)
+
+
+def forecast_levels(bin_ids, horizon_s, now=None):
+    """Forecast fill levels of `bin_ids` `horizon_s` seconds from now, NaN for bins never reported."""
+    now = time.time() if now is None else now
+    return history.predict(bin_ids, now + horizon_s)
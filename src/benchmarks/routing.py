@@ -0,0 +1,240 @@
+"""
+Benchmarks for the routing pipeline on seeded synthetic instances.
+
+    python -m src.benchmarks.routing --sizes 20 200 2000 --output results.json
+    python -m src.benchmarks.routing --sizes 20 200 2000 --baseline
+    python -m src.benchmarks.routing --sizes 20 200 2000 --update-baseline
+
+Every instance times the stages of a /optimize-route request (network generation,
+distance matrix, each routing algorithm, persistence, rendering) and records the
+route quality of every algorithm (the exact one only on instances small enough
+for it). Results are written as JSON; with --baseline (by default the committed
+src/benchmarks/baseline.json) they are compared against an earlier run and
+regressions make the exit status 1. A missing baseline, or one without an entry
+for every benchmarked instance, is an error (exit status 2) rather than a silent
+pass; benchmarking a new size means recording it with --update-baseline first.
+
+Timings only compare on the same kind of machine: after moving the benchmark to
+new hardware, regenerate the baseline there with --update-baseline and commit it.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.algorithm.routing import full_bins_for
+from src.algorithm.exact import TooManyStops
+from src.algorithm.solver import COMPARISON_LABELS, run_algorithm
+from src.algorithm.topology_cache import Topology
+from src.api.render import render_route
+from src.database.models import Base
+from src.database.persistence import save_optimization
+
+# The sizes the committed baseline records; a full matrix at 20000 bins takes too
+# long to run on every change
+SIZES = (20, 200, 2000)
+THRESHOLDS = (0.5, 0.7, 0.9)
+SEED = 7
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# A timing is a regression when it is this much slower than the baseline...
+TIME_TOLERANCE = 0.25
+# ...and slower by more than this, so sub-millisecond jitter is not flagged
+TIME_NOISE_MS = 5.0
+# Route distances may not grow by more than this fraction
+DISTANCE_TOLERANCE = 0.01
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round((time.perf_counter() - start) * 1000, 2)
+
+
+def _peak_memory_mb(fn, *args, **kwargs):
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+    finally:
+        tracemalloc.stop()
+
+
+def run_instance(num_bins, thresholds=THRESHOLDS, seed=SEED, render=True, measure_memory=True):
+    """Benchmarks one network size at every threshold. Returns one record per threshold."""
+    topology, build_ms = _timed(Topology, num_bins)
+    graph = topology.sample(np.random.default_rng(seed))
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    records = []
+    for threshold in thresholds:
+        stages = {"network": build_ms}
+        memory = {}
+        sources = full_bins_for(graph, threshold)
+
+        # A fresh row cache per threshold, so every matrix is built from scratch
+        topology.rows.clear()
+        matrix, stages["distance_matrix"] = _timed(topology.distance_matrix, sources)
+        if measure_memory:
+            topology.rows.clear()
+            memory["distance_matrix"] = _peak_memory_mb(topology.distance_matrix, sources, processes=1)
+
+        algorithms = {}
+        for name, label in COMPARISON_LABELS.items():
+            try:
+                report = run_algorithm(name, graph, matrix, threshold, measure_memory)
+            except TooManyStops:
+                continue  # too many full bins for the exact solver
+            report.pop("route")
+            algorithms[label] = report
+        best = min((a["distance"] for a in algorithms.values() if a["distance"] > 0), default=0)
+        for report in algorithms.values():
+            report["gap_to_best"] = round(report["distance"] / best - 1, 4) if best else 0.0
+
+        route = run_algorithm("main", graph, matrix, threshold, measure_memory=False)["route"]
+        with Session() as db:
+            _, stages["persist"] = _timed(save_optimization, db, graph, route, 0.0, len(route))
+        if render:
+            _, stages["render"] = _timed(render_route, graph, route, threshold)
+
+        records.append({
+            "bins": num_bins,
+            "threshold": threshold,
+            "full_bins": len(sources),
+            "edges": graph.num_edges,
+            "stages_ms": stages,
+            "stages_peak_memory_mb": memory,
+            "algorithms": algorithms,
+        })
+
+    engine.dispose()
+    return records
+
+
+def run_suite(sizes=SIZES, thresholds=THRESHOLDS, seed=SEED, render=True, measure_memory=True, log=None):
+    results = []
+    for num_bins in sizes:
+        for record in run_instance(num_bins, thresholds, seed, render, measure_memory):
+            results.append(record)
+            if log:
+                log(f"{num_bins:>6} bins  threshold {record['threshold']:.2f}  "
+                    f"matrix {record['stages_ms']['distance_matrix']:>10.1f} ms  "
+                    f"main {record['algorithms']['Main']['wall_time_ms']:>8.1f} ms  "
+                    f"distance {record['algorithms']['Main']['distance']:.1f}")
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def _timings(record):
+    """Flat {metric: milliseconds} view of one result record."""
+    timings = {f"stage.{name}": ms for name, ms in record["stages_ms"].items()}
+    timings.update({f"{label}.wall_time": a["wall_time_ms"] for label, a in record["algorithms"].items()})
+    return timings
+
+
+def _missing_instances(current, baseline):
+    """(bins, threshold) instances of `current` that `baseline` has no result for."""
+    return sorted({(r["bins"], r["threshold"]) for r in current["results"]}
+                  - {(r["bins"], r["threshold"]) for r in baseline["results"]})
+
+
+def compare_to_baseline(current, baseline, time_tolerance=TIME_TOLERANCE, noise_ms=TIME_NOISE_MS,
+                        distance_tolerance=DISTANCE_TOLERANCE):
+    """
+    Regressions of `current` against `baseline` (both run_suite outputs) for the
+    instances present in both, as human-readable strings.
+    """
+    previous = {(r["bins"], r["threshold"]): r for r in baseline["results"]}
+    regressions = []
+
+    for record in current["results"]:
+        old = previous.get((record["bins"], record["threshold"]))
+        if old is None:
+            continue
+        where = f"{record['bins']} bins @ {record['threshold']}"
+
+        old_timings = _timings(old)
+        for metric, ms in _timings(record).items():
+            before = old_timings.get(metric)
+            if before is not None and ms > before * (1 + time_tolerance) and ms - before > noise_ms:
+                regressions.append(f"{where}: {metric} {before:.1f} ms -> {ms:.1f} ms")
+
+        for label, report in record["algorithms"].items():
+            before = old["algorithms"].get(label, {}).get("distance")
+            if before and report["distance"] > before * (1 + distance_tolerance):
+                regressions.append(f"{where}: {label} distance {before:.1f} -> {report['distance']:.1f}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--thresholds", type=float, nargs="+", default=list(THRESHOLDS))
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE,
+                        help=f"compare against this earlier results file (default {DEFAULT_BASELINE})")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help=f"also write the results to the baseline file (default {DEFAULT_BASELINE})")
+    parser.add_argument("--no-render", action="store_true", help="skip the render stage")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced memory runs")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.thresholds, args.seed, not args.no_render, not args.no_memory,
+                        log=lambda line: print(line, file=sys.stderr))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.update_baseline:
+        with open(args.baseline or DEFAULT_BASELINE, "w") as f:
+            json.dump(results, f, indent=2)
+        return 0
+
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"ERROR no baseline at {args.baseline}; create it with --update-baseline and commit it",
+                  file=sys.stderr)
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        missing = _missing_instances(results, baseline)
+        if missing:
+            where = ", ".join(f"{bins} bins @ {threshold}" for bins, threshold in missing)
+            print(f"ERROR {args.baseline} has no result for {where}; record it with --update-baseline",
+                  file=sys.stderr)
+            return 2
+        regressions = compare_to_baseline(results, baseline)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
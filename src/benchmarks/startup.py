@@ -0,0 +1,66 @@
+"""
+Import-time report for the API's cold start.
+
+    python -m src.benchmarks.startup
+    python -m src.benchmarks.startup --module src.api.main --top 30
+
+Imports the module in a fresh interpreter under `python -X importtime` and lists
+the slowest imports. Plotting and graph libraries are only imported when a route
+is drawn or a networkx graph is built, so they must not show up here.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULE = "src.api.main"
+# Seconds `import src.api.main` may take in a fresh interpreter
+STARTUP_BUDGET_S = float(os.environ.get("ROUTING_STARTUP_BUDGET_S", 2.0))
+# Modules that are loaded on demand and must not be pulled in at startup
+LAZY_MODULES = ("matplotlib", "networkx")
+
+
+def measure_imports(module=DEFAULT_MODULE):
+    """
+    Imports `module` in a fresh interpreter. Returns its total import time in
+    seconds, every imported module as (name, self seconds, cumulative seconds),
+    and which of LAZY_MODULES ended up loaded.
+    """
+    check = f"import sys, json, {module}; print(json.dumps([m for m in {list(LAZY_MODULES)!r} if m in sys.modules]))"
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        capture_output=True, text=True, cwd=root, check=True,
+    )
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+
+    total = next((cumulative for name, _, cumulative in modules if name == module), 0.0)
+    return {"module": module, "total_s": total, "modules": modules, "lazy_loaded": json.loads(proc.stdout)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--top", type=int, default=20, help="how many of the slowest imports to list")
+    args = parser.parse_args(argv)
+
+    report = measure_imports(args.module)
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for name, self_s, cumulative_s in sorted(report["modules"], key=lambda m: -m[2])[:args.top]:
+        print(f"{cumulative_s * 1000:>10.1f}ms {self_s * 1000:>8.1f}ms  {name}")
+
+    print(f"\nimport {report['module']}: {report['total_s']:.3f} s (budget {STARTUP_BUDGET_S:.1f} s)")
+    if report["lazy_loaded"]:
+        print(f"loaded at startup but should be lazy: {', '.join(report['lazy_loaded'])}")
+    return 0 if report["total_s"] <= STARTUP_BUDGET_S and not report["lazy_loaded"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
-from sqlalchemy import Column, Integer, Float, String, JSON
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Integer, Float, String, JSON, LargeBinary, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -11,6 +14,14 @@ class Bin(Base):
     fill_level = Column(Float)
     batch_id = Column(String, index=True)
 
+class BinReading(Base):
+    """The latest fill level a bin's sensor reported; only telemetry writes these."""
+    __tablename__ = "bin_readings"
+
+    bin_id = Column(String, primary_key=True)
+    fill_level = Column(Float, nullable=False)
+    read_at = Column(DateTime(timezone=True), nullable=False)
+
 class Route(Base):
     __tablename__ = "routes"
 
@@ -19,4 +30,28 @@ class Route(Base):
     total_distance = Column(Float)
     bins_covered = Column(Integer)
     batch_id = Column(String, index=True)
-    edges = Column(JSON)
\ No newline at end of file
+    network_id = Column(Integer, ForeignKey("networks.id"), index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    network = relationship("Network")
+
+    # Route history lists newest first, keyset-paginated on (created_at, id)
+    __table_args__ = (
+        Index("ix_routes_created_at_id", "created_at", "id"),
+        Index("ix_routes_network_id_created_at_id", "network_id", "created_at", "id"),
+    )
+
+class Network(Base):
+    """
+    A road network stored once and shared by every route planned on it.
+    Edges are packed little-endian arrays: int32 endpoints (u < v) and float64 weights.
+    """
+    __tablename__ = "networks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    fingerprint = Column(String, unique=True, index=True)
+    node_names = Column(JSON)
+    num_edges = Column(Integer)
+    edge_sources = Column(LargeBinary)
+    edge_targets = Column(LargeBinary)
+    edge_weights = Column(LargeBinary)
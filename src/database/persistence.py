@@ -0,0 +1,199 @@
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from src import metrics
+from src.algorithm.compact_graph import CompactGraph
+from src.algorithm.lru import LRUCache
+from src.database.models import Bin, BinReading, Network, Route
+
+# Rows per INSERT statement; keeps bound parameters under the SQLite (32766)
+# and PostgreSQL (65535) limits for the four bins columns
+BULK_CHUNK_ROWS = 5000
+
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# Decoded networks by fingerprint, so reads don't rebuild the CSR arrays each time
+_network_graphs = LRUCache(maxsize=8, name="network_graphs")
+
+
+def encode_network(graph: CompactGraph):
+    """Column values of a Network row for the topology of `graph`."""
+    u, v, w = graph.edge_arrays()
+    return {
+        "fingerprint": graph.fingerprint,
+        "node_names": graph.names,
+        "num_edges": len(u),
+        "edge_sources": u.astype("<i4").tobytes(),
+        "edge_targets": v.astype("<i4").tobytes(),
+        "edge_weights": w.astype("<f8").tobytes(),
+    }
+
+
+def get_or_create_network(db: Session, graph: CompactGraph) -> Network:
+    """The stored network with the same topology as `graph`, added if missing. Does not commit."""
+    return _get_or_add_network(db, encode_network(graph))
+
+
+def _get_or_add_network(db: Session, values):
+    network = db.query(Network).filter(Network.fingerprint == values["fingerprint"]).first()
+    if network is None:
+        network = Network(**values)
+        db.add(network)
+        db.flush()
+    return network
+
+
+def network_graph(network: Network, positions=None, fill_levels=None) -> CompactGraph:
+    """
+    Rebuilds a stored network as a CompactGraph.
+    `positions` and `fill_levels` are optional dicts keyed by bin id.
+    """
+    graph = _network_graphs.get(network.fingerprint)
+    if graph is None:
+        graph = CompactGraph.from_arrays(
+            network.node_names,
+            np.frombuffer(network.edge_sources, dtype="<i4"),
+            np.frombuffer(network.edge_targets, dtype="<i4"),
+            np.frombuffer(network.edge_weights, dtype="<f8"),
+        )
+        graph._fingerprint = network.fingerprint
+        _network_graphs.put(network.fingerprint, graph)
+
+    names = graph.names
+    graph = graph.with_fill_levels([fill_levels.get(n, 0.0) for n in names] if fill_levels else None)
+    if positions and all(n in positions for n in names):
+        graph.positions = np.asarray([positions[n] for n in names], dtype=np.float64)
+    return graph
+
+
+def bin_rows(graph, batch_id):
+    """Rows for the bins table from a CompactGraph with positions and fill levels."""
+    return [
+        {"id": bin_id, "position": pos, "fill_level": fill_level, "batch_id": batch_id}
+        for bin_id, pos, fill_level in zip(graph.names, graph.positions.tolist(), graph.fill_levels.tolist())
+    ]
+
+
+def network_edge_records(network: Network):
+    """Edges of a stored network as [{"from": ..., "to": ..., "weight": ...}, ...]."""
+    names = network.node_names
+    u, v, w = network_graph(network).edge_arrays()
+    return [{"from": names[a], "to": names[b], "weight": c} for a, b, c in zip(u.tolist(), v.tolist(), w.tolist())]
+
+
+def _upsert(db: Session, model, rows, update, chunk_size=BULK_CHUNK_ROWS, where=None):
+    """
+    Inserts rows of `model` or overwrites the `update` columns of the existing
+    rows with the same primary key (only where `where`, given the excluded row,
+    holds), with one executemany INSERT ... ON CONFLICT DO UPDATE per chunk.
+    """
+    insert = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        # No native upsert: fall back to the ORM, one row at a time
+        for row in rows:
+            db.merge(model(**row))
+        return
+
+    table = model.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key],
+        set_={column: stmt.excluded[column] for column in update},
+        where=None if where is None else where(stmt.excluded)
+    )
+    # Core statements on the session's connection skip per-row ORM bookkeeping
+    connection = db.connection()
+    for start in range(0, len(rows), chunk_size):
+        connection.execute(stmt, rows[start:start + chunk_size])
+
+
+def upsert_bins(db: Session, rows, chunk_size=BULK_CHUNK_ROWS, update=("position", "fill_level", "batch_id")):
+    """
+    Inserts bins or overwrites the `update` columns of the existing rows with the
+    same id, with one executemany INSERT ... ON CONFLICT DO UPDATE per chunk (sent
+    as multi-row VALUES batches on PostgreSQL). Does not commit.
+    """
+    _upsert(db, Bin, rows, update, chunk_size)
+
+
+def save_readings(db: Session, readings, chunk_size=BULK_CHUNK_ROWS):
+    """
+    Records sensor readings from a {bin id: (fill level, unix timestamp)} dict,
+    keeping a bin's stored reading where it is newer. Readings live apart from
+    the bins of planned batches, so synthetic fill levels never pass for them.
+    Does not commit.
+    """
+    rows = [
+        {"bin_id": bin_id, "fill_level": level, "read_at": datetime.fromtimestamp(stamp, timezone.utc)}
+        for bin_id, (level, stamp) in readings.items()
+    ]
+    _upsert(db, BinReading, rows, ("fill_level", "read_at"), chunk_size,
+            where=lambda excluded: BinReading.__table__.c.read_at <= excluded.read_at)
+
+
+def load_fill_levels(db: Session, bin_ids):
+    """Latest sensor readings of `bin_ids`, as a dict; bins never reported are left out."""
+    levels = {}
+    bin_ids = list(bin_ids)
+    for start in range(0, len(bin_ids), BULK_CHUNK_ROWS):
+        chunk = bin_ids[start:start + BULK_CHUNK_ROWS]
+        levels.update(db.query(BinReading.bin_id, BinReading.fill_level).filter(BinReading.bin_id.in_(chunk)))
+    return levels
+
+
+def save_optimization(db: Session, graph, route, total_distance, bins_covered):
+    """
+    Stores the bins of `graph` (a CompactGraph with fill levels) and the optimized
+    route under a new batch id in one transaction, and returns that batch id.
+    The route references the network, which is only written the first time it is seen.
+    """
+    return save_optimizations(db, [(graph, route, total_distance, bins_covered)])[0]
+
+
+def save_optimizations(db: Session, results):
+    """
+    Stores several (graph, route, total_distance, bins_covered) results in one
+    transaction, each under its own batch id, and returns the batch ids in order.
+
+    Bins are keyed by id alone, so where results share bins the last one's rows
+    are kept; each network is looked up once however many results use it.
+    """
+    batch_ids = [str(uuid.uuid4()) for _ in results]
+
+    try:
+        networks, network_ids = {}, []
+        with metrics.span("persist.network"):
+            for graph, *_ in results:
+                values = encode_network(graph)
+                if values["fingerprint"] not in networks:
+                    networks[values["fingerprint"]] = _get_or_add_network(db, values)
+                network_ids.append(networks[values["fingerprint"]].id)
+
+        with metrics.span("persist.bins"):
+            # One row per bin id: PostgreSQL rejects a statement that upserts a row twice
+            rows = {}
+            for (graph, *_), batch_id in zip(results, batch_ids):
+                rows.update((row["id"], row) for row in bin_rows(graph, batch_id))
+            upsert_bins(db, list(rows.values()))
+
+        db.add_all([
+            Route(
+                optimized_route=route,
+                total_distance=total_distance,
+                bins_covered=bins_covered,
+                batch_id=batch_id,
+                network_id=network_id
+            )
+            for (_, route, total_distance, bins_covered), batch_id, network_id in zip(results, batch_ids, network_ids)
+        ])
+        with metrics.span("persist.commit"):
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return batch_ids
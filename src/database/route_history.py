@@ -0,0 +1,90 @@
+"""
+Reading back saved routes, newest first.
+
+Listings select summary columns only, never the optimized_route JSON, and are
+paginated by keyset on (created_at, id): a page's cursor encodes its last row,
+and the next page is the rows strictly older than it. Each page is one index
+range scan however deep into the history it is, and rows saved meanwhile do not
+shift later pages.
+"""
+import base64
+from datetime import datetime, timezone
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from src.database.models import Route
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+SUMMARY_COLUMNS = (
+    Route.id, Route.batch_id, Route.created_at, Route.total_distance, Route.bins_covered, Route.network_id
+)
+
+
+def _utc(moment):
+    """`moment` as an aware UTC datetime; naive ones (SQLite drops the zone) are taken as UTC."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def encode_cursor(created_at, route_id):
+    return base64.urlsafe_b64encode(f"{_utc(created_at).isoformat()}|{route_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, route id) from a cursor; ValueError if it is not one."""
+    try:
+        created_at, route_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return _utc(datetime.fromisoformat(created_at)), int(route_id)
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError(f"Invalid cursor '{cursor}'") from exc
+
+
+def summary(row):
+    return {
+        "id": row.id,
+        "batch_id": row.batch_id,
+        "created_at": _utc(row.created_at),
+        "total_distance": row.total_distance,
+        "bins_covered": row.bins_covered,
+        "network_id": row.network_id,
+    }
+
+
+def list_routes(db: Session, limit=DEFAULT_PAGE_SIZE, cursor=None, since=None, until=None, network_id=None,
+                batch_id=None):
+    """
+    One page of route summaries, newest first, optionally only those saved in
+    [since, until), on one network or of one batch. Returns (summaries, cursor of
+    the next page), the cursor being None on the last page.
+    """
+    query = db.query(*SUMMARY_COLUMNS)
+    if network_id is not None:
+        query = query.filter(Route.network_id == network_id)
+    if batch_id is not None:
+        query = query.filter(Route.batch_id == batch_id)
+    if since is not None:
+        query = query.filter(Route.created_at >= _utc(since))
+    if until is not None:
+        query = query.filter(Route.created_at < _utc(until))
+    if cursor is not None:
+        query = query.filter(tuple_(Route.created_at, Route.id) < decode_cursor(cursor))
+
+    # One row past the page tells whether there is another
+    rows = query.order_by(Route.created_at.desc(), Route.id.desc()).limit(limit + 1).all()
+    page = [summary(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["id"]) if len(rows) > limit else None
+    return page, next_cursor
+
+
+def latest_route(db: Session):
+    """The most recently saved Route, or None."""
+    return db.query(Route).order_by(Route.created_at.desc(), Route.id.desc()).first()
+
+
+def route_by_batch(db: Session, batch_id):
+    """The Route saved under `batch_id`, or None."""
+    return db.query(Route).filter(Route.batch_id == batch_id).first()
@@ -0,0 +1,177 @@
+"""
+In-process metrics: counters and timing histograms, rendered in the Prometheus
+text format by the API's /metrics endpoint.
+
+    with metrics.span("distance_matrix"):
+        ...
+
+    @metrics.span("find_best_route")
+    def find_best_route(...): ...
+
+    metrics.increment("shortest_path_queries_total", kind="dijkstra")
+
+Job pool workers record into their own registry; the job manager drains it after
+each task and merges the result into the API process (see src/api/jobs.py).
+"""
+import functools
+import threading
+import time
+from collections import defaultdict, deque
+
+# Observations kept per histogram series for the quantiles; older ones only count towards sum/count
+WINDOW_SIZE = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+SPAN_METRIC = "span_duration_seconds"
+REQUEST_METRIC = "http_request_duration_seconds"
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class _Series:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.window = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.window.append(value)
+
+    def quantile(self, q):
+        ordered = sorted(self.window)
+        if not ordered:
+            return float("nan")
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Registry:
+    def __init__(self):
+        self._counters = defaultdict(float)
+        self._histograms = defaultdict(_Series)
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            self._histograms[_key(name, labels)].observe(value)
+
+    def total(self, name):
+        """Sum of a counter over all its label values."""
+        with self._lock:
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def histogram(self, name, **labels):
+        """(count, sum, {quantile: value}) of one histogram series, or None."""
+        with self._lock:
+            series = self._histograms.get(_key(name, labels))
+            if series is None:
+                return None
+            return series.count, series.sum, {q: series.quantile(q) for q in QUANTILES}
+
+    def drain(self):
+        """Everything recorded since the last drain, as plain data, and resets the registry."""
+        with self._lock:
+            counters = dict(self._counters)
+            observations = {key: (s.count, s.sum, list(s.window)) for key, s in self._histograms.items()}
+            self._counters.clear()
+            self._histograms.clear()
+        return {"counters": counters, "observations": observations}
+
+    def merge(self, drained):
+        """Adds the output of another registry's drain() to this one."""
+        with self._lock:
+            for key, value in drained["counters"].items():
+                self._counters[key] += value
+            for key, (count, total, window) in drained["observations"].items():
+                series = self._histograms[key]
+                series.count += count
+                series.sum += total
+                series.window.extend(window)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+            typed = set()
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+            for (name, labels), series in histograms:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} summary")
+                    typed.add(name)
+                for q in QUANTILES:
+                    lines.append(f"{name}{_format_labels(labels + (('quantile', str(q)),))} "
+                                 f"{_format_value(series.quantile(q))}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(series.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {series.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    return "NaN" if value != value else repr(float(value))
+
+
+registry = Registry()
+
+
+def call_and_drain(fn, *args):
+    """Runs fn in a pool worker and returns its result with the metrics recorded meanwhile."""
+    return fn(*args), registry.drain()
+
+
+def increment(name, value=1, **labels):
+    registry.increment(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+class span:
+    """Times a block (or, as a decorator, each call) into the span_duration_seconds histogram."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.observe(SPAN_METRIC, time.perf_counter() - self._start, span=self.name)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(self.name):
+                return fn(*args, **kwargs)
+        return wrapper
+
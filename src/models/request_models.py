@@ -0,0 +1,61 @@
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+from src.algorithm.data_generator import TOPOLOGY_SEED
+from src.algorithm.routing import ALGORITHMS
+
+# Scenarios accepted by one /optimize-route/batch request
+MAX_BATCH_SCENARIOS = 200
+
+
+def _known_algorithm(value):
+    if value not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm '{value}'; expected one of {sorted(ALGORITHMS)}")
+    return value
+
+
+class OptimizeRouteRequest(BaseModel):
+    bins: int = Field(20, ge=1)
+    threshold: float = Field(0.7, ge=0, le=1)
+    algorithm: str = "main"
+    # Stops improving the route after this long; only the "main" algorithm has a budget
+    time_budget_ms: Optional[int] = Field(None, ge=0)
+    # "live" routes on the latest sensor readings (see /telemetry/readings)
+    fill_source: Literal["synthetic", "live"] = "synthetic"
+    # With live readings, also collect bins forecast to be full this many minutes from now
+    forecast_horizon_min: Optional[float] = Field(None, ge=0)
+
+    @field_validator("algorithm")
+    @classmethod
+    def known_algorithm(cls, value):
+        return _known_algorithm(value)
+
+
+class CompareAlgorithmsRequest(BaseModel):
+    threshold: float = Field(0.7, ge=0, le=1)
+    measure_memory: bool = True
+
+
+class ScenarioRequest(OptimizeRouteRequest):
+    # Seeds the fill levels; left out, every run draws new ones
+    seed: Optional[int] = None
+    # Seeds the bin positions; scenarios with the same bins and network_seed share a network
+    network_seed: int = TOPOLOGY_SEED
+
+
+class BatchOptimizeRequest(BaseModel):
+    scenarios: List[ScenarioRequest] = Field(min_length=1, max_length=MAX_BATCH_SCENARIOS)
+
+
+class RoadRouteRequest(BaseModel):
+    threshold: float = Field(0.7, ge=0, le=1)
+    # Full-network distance matrices do not scale to road networks, so clusters by default
+    algorithm: str = "cluster"
+    # Fill level per bin id; left out, the latest sensor readings are used
+    fill_levels: Optional[Dict[str, float]] = None
+
+    @field_validator("algorithm")
+    @classmethod
+    def known_algorithm(cls, value):
+        return _known_algorithm(value)
@@ -1,8 +1,66 @@
+from datetime import datetime
 from pydantic import BaseModel
-from typing import List
+from typing import Any, List, Optional
 
 class RouteOptimizationResponse(BaseModel):
     optimized_route: List[str]
     total_distance: float
     bins_covered: int
     threshold: float
+    # Reused from an earlier request for the same full bins
+    cached: bool = False
+
+class JobSubmittedResponse(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    submitted_at: float
+    finished_at: Optional[float] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+class TelemetryIngestResponse(BaseModel):
+    accepted: int
+    rejected: int
+    # The first few validation errors, by line
+    errors: List[str]
+    # Bins with readings waiting to be written
+    buffered: int
+
+class TelemetryFlushResponse(BaseModel):
+    written: int
+
+class BinForecast(BaseModel):
+    bin_id: str
+    minutes_until_full: float
+
+class FillForecastResponse(BaseModel):
+    threshold: float
+    horizon_min: float
+    bins: List[BinForecast]
+
+class RouteSummary(BaseModel):
+    id: int
+    batch_id: str
+    created_at: datetime
+    total_distance: float
+    bins_covered: int
+    network_id: Optional[int] = None
+
+class RouteDetail(RouteSummary):
+    optimized_route: List[str]
+
+class RouteHistoryPage(BaseModel):
+    routes: List[RouteSummary]
+    # Pass back as `cursor` for the next page; None on the last one
+    next_cursor: Optional[str] = None
+
+class RoadNetworkInfo(BaseModel):
+    nodes: int
+    edges: int
+    bins: int
+    fingerprint: str
@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Job pool workers are separate processes, so they take their index directory
+# from the environment rather than from the fixture below
+os.environ.setdefault("ROUTING_INDEX_DIR", tempfile.mkdtemp(prefix="landmark_indexes_"))
+
+from src.algorithm import landmarks  # noqa: E402
+from src.database.models import Base  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path_factory, monkeypatch):
+    """A fresh landmark index directory per test, so no test finds another's indexes."""
+    directory = tmp_path_factory.mktemp("landmark_indexes")
+    monkeypatch.setattr(landmarks, "INDEX_DIR", str(directory))
+    return directory
+
+
+@pytest.fixture
+def Session():
+    """A session factory on a fresh in-memory database with every table."""
+    # One shared connection, or every session would see its own empty database
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(Session):
+    session = Session()
+    yield session
+    session.close()
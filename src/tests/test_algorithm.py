@@ -0,0 +1,244 @@
+import itertools
+import time
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from src.algorithm.compact_graph import CompactGraph
+from src.algorithm.data_generator import generate_synthetic_data, generate_positions, connection_radius, \
+    generate_edges, iter_edge_chunks
+from src.algorithm.distance_matrix import build_distance_matrix
+from src.algorithm.exact import TooManyStops, held_karp, max_stops, table_bytes
+from src.algorithm.local_search import improve_tour, tour_length
+from src.algorithm.solver import COMPARISON_LABELS, prepare_comparison, run_algorithm
+from src.algorithm.topology_cache import MAX_TOPOLOGIES, clear_topologies, get_topology
+from src.algorithm.routing import find_best_route, find_best_route_using_djikstra, find_best_route_using_astar, \
+    find_clustered_route, find_exact_route, find_naive_route, full_bins_for
+
+
+@pytest.fixture
+def graph():
+    return generate_synthetic_data(num_bins=40)
+
+
+def test_spatial_edges_match_brute_force():
+    positions = generate_positions(500)
+    radius = connection_radius(500)
+
+    chunks = list(iter_edge_chunks(positions, radius, chunk_size=64))
+    found = {(u, v) for cu, cv, _ in chunks for u, v in zip(cu.tolist(), cv.tolist())}
+
+    dist = np.linalg.norm(positions[:, None] - positions[None], axis=-1)
+    i, j = np.triu_indices(500, 1)
+    close = dist[i, j] <= radius
+    assert set(zip(i[close].tolist(), j[close].tolist())) <= found
+    assert all(u < v for u, v in found)
+
+
+def test_components_of_equal_size_are_bridged():
+    # Two pairs of bins, each pair far from the other, and two isolated bins
+    for positions in ([(0, 0), (0.01, 0), (0.9, 0.9), (0.91, 0.9)], [(0, 0), (1, 1)]):
+        u, v, _ = generate_edges(np.array(positions, dtype=np.float64), radius=0.05)
+        connected = nx.Graph()
+        connected.add_nodes_from(range(len(positions)))
+        connected.add_edges_from(zip(u.tolist(), v.tolist()))
+        assert nx.is_connected(connected)
+    # Seeds whose default networks split into components of equal size
+    for num_bins, seed in ((4, 28), (2, 275)):
+        u, v, _ = generate_edges(generate_positions(num_bins, seed))
+        assert len(u) >= num_bins - 1
+
+
+@pytest.mark.parametrize("num_bins", [5, 20, 45, 300, 3000])
+def test_synthetic_network_is_connected_and_seeded(num_bins):
+    first = generate_synthetic_data(num_bins)
+    second = generate_synthetic_data(num_bins)
+
+    assert nx.is_connected(first)
+    assert set(first.edges()) == set(second.edges())
+
+
+def test_compact_graph_round_trips_route_edges(graph):
+    edges = [{"from": u, "to": v, "weight": w} for u, v, w in graph.edges(data="weight")]
+    positions = dict(graph.nodes(data="pos"))
+
+    compact = CompactGraph.from_edges(edges, positions=positions, fill_levels=dict(graph.nodes(data="fill_level")))
+
+    assert compact.num_nodes == graph.number_of_nodes()
+    assert compact.num_edges == graph.number_of_edges()
+    for name in list(graph.nodes())[:10]:
+        targets, weights = compact.neighbors(compact.index_of(name))
+        expected = {v: graph[name][v]["weight"] for v in graph[name]}
+        assert {compact.name_of(t): w for t, w in zip(targets, weights)} == expected
+
+
+def test_astar_matches_networkx(graph):
+    compact = CompactGraph.from_networkx(graph)
+    names = list(graph.nodes())
+
+    for source, target in zip(names[:10], names[10:20]):
+        length, path = compact.astar(compact.index_of(source), compact.index_of(target))
+        assert length == pytest.approx(nx.dijkstra_path_length(graph, source, target, weight="weight"))
+        assert compact.name_of(path[0]) == source and compact.name_of(path[-1]) == target
+
+
+def test_distance_matrix_matches_networkx(graph):
+    full_bins = full_bins_for(graph, 0.5)
+    matrix = build_distance_matrix(CompactGraph.from_networkx(graph), full_bins)
+
+    for source in full_bins[:5]:
+        for target in full_bins:
+            expected = nx.dijkstra_path_length(graph, source, target, weight="weight")
+            assert matrix.distance(source, target) == pytest.approx(expected)
+            path = matrix.path(source, target)
+            assert path[0] == source and path[-1] == target
+            assert nx.path_weight(graph, path, weight="weight") == pytest.approx(expected)
+
+
+def test_parallel_matrix_matches_serial(graph):
+    compact = CompactGraph.from_networkx(graph)
+    full_bins = full_bins_for(compact, 0.3)
+    serial = build_distance_matrix(compact, full_bins, processes=1)
+    parallel = build_distance_matrix(compact, full_bins, processes=2)
+
+    assert (serial.dist == parallel.dist).all()
+    assert (serial.pred == parallel.pred).all()
+
+
+@pytest.mark.parametrize("solver", [
+    find_best_route, find_best_route_using_djikstra, find_best_route_using_astar, find_naive_route,
+    find_clustered_route
+])
+def test_routes_cover_all_full_bins(graph, solver):
+    compact = CompactGraph.from_networkx(graph)
+    full_bins = full_bins_for(compact, 0.7)
+    matrix = build_distance_matrix(compact, full_bins)
+
+    route, total_dist, _ = solver(compact, 0.7, matrix=matrix)
+
+    assert set(full_bins) <= set(route)
+    assert total_dist > 0
+
+
+def test_astar_walk_matches_the_matrix_walk(graph):
+    compact = CompactGraph.from_networkx(graph)
+    matrix = build_distance_matrix(compact, full_bins_for(compact, 0.5))
+
+    _, astar_dist, _ = find_best_route_using_astar(compact, 0.5)
+    _, dijkstra_dist, _ = find_best_route_using_djikstra(compact, 0.5, matrix=matrix)
+    assert astar_dist == pytest.approx(dijkstra_dist)
+    assert isinstance(dijkstra_dist, float)
+
+
+def _random_distances(n, seed):
+    points = np.random.default_rng(seed).uniform(0, 100, (n, 2))
+    return np.linalg.norm(points[:, None] - points[None], axis=-1)
+
+
+def test_comparison_shares_preprocessing(graph):
+    compact = CompactGraph.from_networkx(graph)
+    matrix, report = prepare_comparison(compact, 0.5)
+    assert report["shortest_path_queries"] == len(full_bins_for(compact, 0.5))
+
+    for name in COMPARISON_LABELS:
+        if name == "exact" and len(matrix) > max_stops():
+            continue
+        result = run_algorithm(name, compact, matrix, 0.5)
+        # A* searches point to point rather than reading the matrix
+        assert (result["shortest_path_queries"] > 0) == (name == "astar")
+        assert result["wall_time_ms"] >= 0 and result["peak_memory_mb"] > 0
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_improve_tour_finds_optimum_on_small_instances(seed):
+    dist = _random_distances(8, seed)
+    optimum = min(tour_length([0, *p], dist) for p in itertools.permutations(range(1, 8)))
+
+    tour, length = improve_tour(list(range(8)), dist)
+
+    assert tour[0] == 0 and sorted(tour) == list(range(8))
+    assert length == pytest.approx(tour_length(tour, dist))
+    assert length <= optimum * 1.05
+
+
+def test_improve_tour_keeps_a_permutation():
+    dist = _random_distances(300, 0)
+    start = np.concatenate(([0], np.random.default_rng(1).permutation(np.arange(1, 300))))
+
+    tour, length = improve_tour(start, dist)
+
+    assert tour[0] == 0 and sorted(tour) == list(range(300))
+    assert length < tour_length(start, dist) / 4
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_held_karp_matches_brute_force(seed):
+    dist = _random_distances(8, seed)
+    tour, length = held_karp(dist)
+
+    best = min(tour_length((0,) + rest, dist) for rest in itertools.permutations(range(1, 8)))
+    assert length == pytest.approx(best)
+    assert tour[0] == 0 and sorted(tour.tolist()) == list(range(8))
+    assert tour_length(tour, dist) == pytest.approx(length)
+
+    with pytest.raises(TooManyStops):
+        held_karp(dist, max_bytes=table_bytes(8) - 1)
+
+
+def test_small_instances_are_solved_exactly(graph):
+    compact = CompactGraph.from_networkx(graph)
+    matrix = build_distance_matrix(compact, full_bins_for(compact, 0.7))
+    heuristic = find_best_route(compact, 0.7, matrix=matrix, exact_max_bins=0)[1]
+    exact = find_exact_route(compact, 0.7, matrix=matrix)[1]
+
+    assert exact <= heuristic + 1e-9
+    assert find_best_route(compact, 0.7, matrix=matrix, exact_max_bins=len(matrix))[1] == pytest.approx(exact)
+
+
+def test_anytime_search_only_improves_within_its_budget():
+    dist = _random_distances(300, 0)
+    start = np.arange(300)
+    plain, plain_length = improve_tour(start, dist)
+
+    reports = []
+    began = time.perf_counter()
+    tour, length = improve_tour(start, dist, deadline=began + 0.3,
+                                on_improvement=lambda t, l, i: reports.append((l, i)))
+
+    assert time.perf_counter() - began < 0.6
+    assert tour[0] == 0 and sorted(tour) == list(range(300))
+    assert length <= plain_length
+    assert [l for l, _ in reports] == sorted((l for l, _ in reports), reverse=True)
+    assert reports[-1][0] == pytest.approx(length)
+
+    # A spent budget still returns a complete tour
+    tour, _ = improve_tour(start, dist, deadline=began)
+    assert sorted(tour) == list(range(300))
+
+
+def test_topology_cache_reuses_network_and_rows():
+    clear_topologies()
+    topology = get_topology(60)
+    assert get_topology(60) is topology
+
+    first = topology.sample()
+    second = topology.sample()
+    assert first.targets is second.targets
+    assert not np.array_equal(first.fill_levels, second.fill_levels)
+
+    sources = full_bins_for(first, 0.5)
+    topology.distance_matrix(sources)
+    hits = topology.rows.hits
+    matrix = topology.distance_matrix(sources)
+    assert topology.rows.hits == hits + len(sources)
+    assert matrix.distance(sources[0], sources[0]) == 0
+
+
+def test_topology_cache_evicts_least_recently_used():
+    clear_topologies()
+    first = get_topology(10)
+    for num_bins in range(11, 11 + MAX_TOPOLOGIES):
+        get_topology(num_bins)
+
+    assert get_topology(10) is not first
@@ -0,0 +1,307 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+from src.api.telemetry import history
+from src.database.connection import configure_database
+
+
+@pytest.fixture(scope="module")
+def client():
+    configure_database("sqlite://")
+    return TestClient(app)
+
+
+def wait_for(client, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_optimize_route_is_saved_and_rendered(client):
+    response = client.get("/optimize-route", params={"bins": 30, "threshold": 0.6})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["threshold"] == 0.6
+    assert len(body["optimized_route"]) == body["bins_covered"]
+
+    page = client.get("/view-last-route")
+    assert "/image.png?threshold=0.7" in page.text
+    src = page.text.split('src="')[1].split('"')[0]
+
+    image = client.get(src)
+    assert image.status_code == 200
+    assert image.headers["content-type"] == "image/png"
+    assert image.content.startswith(b"\x89PNG")
+
+    cached = client.get(src, headers={"If-None-Match": image.headers["etag"]})
+    assert cached.status_code == 304
+
+
+
+def test_image_of_a_route_whose_bins_were_taken_over_is_not_found(client):
+    client.get("/optimize-route", params={"bins": 40})
+    src = client.get("/view-last-route").text.split('src="')[1].split('"')[0]
+    # The next batch overwrites bin_0..bin_19 of the first one
+    client.get("/optimize-route", params={"bins": 20})
+
+    response = client.get(src)
+    assert response.status_code == 404
+    assert "later batch" in response.json()["detail"]
+
+def test_optimization_job_can_be_polled(client):
+    response = client.post("/jobs/optimize-route", json={"bins": 25, "algorithm": "dijkstra"})
+    assert response.status_code == 202
+
+    job = wait_for(client, response.json()["job_id"])
+    assert job["status"] == "done"
+    assert job["result"]["batch_id"]
+
+    assert client.post("/jobs/optimize-route", json={"algorithm": "nope"}).status_code == 422
+    assert client.get("/jobs/unknown").status_code == 404
+
+
+def test_compare_algorithms_and_metrics(client):
+    client.get("/optimize-route", params={"bins": 30})
+    results = client.get("/compare-algorithms", params={"measure_memory": False}).json()
+    assert {"dijkstra", "astar", "naive", "Main", "preprocessing"} <= set(results)
+    assert results["Main"]["distance"] <= results["naive"]["distance"]
+    assert results["exact"]["distance"] <= results["Main"]["distance"]
+    assert not results["cached"]
+    again = client.get("/compare-algorithms", params={"measure_memory": False}).json()
+    assert again["cached"] and again["Main"] == results["Main"]
+
+    text = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",path="/optimize-route",status="200"}' in text
+    assert 'span_duration_seconds_count{span="find_best_route"}' in text
+
+
+def test_batch_scenarios_are_streamed_and_saved_together(client):
+    scenarios = [
+        {"bins": 30, "threshold": 0.5, "seed": 1},
+        {"bins": 30, "threshold": 0.8, "seed": 1, "algorithm": "naive"},
+        {"bins": 40, "seed": 2},
+    ]
+    with client.stream("POST", "/optimize-route/batch", json={"scenarios": scenarios}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+
+    results, summary = lines[:-1], lines[-1]
+    assert sorted(line["index"] for line in results) == [0, 1, 2]
+    assert all("result" in line for line in results)
+    assert summary["type"] == "summary" and summary["solved"] == 3
+    assert len(set(summary["batch_ids"])) == 3
+
+    # Same seed and network: same fill levels, so the lower threshold covers more bins
+    by_index = {line["index"]: line["result"] for line in results}
+    assert by_index[0]["bins_covered"] >= by_index[1]["bins_covered"]
+
+    assert client.post("/optimize-route/batch", json={"scenarios": []}).status_code == 422
+
+
+def test_optimize_route_streams_improvements(client):
+    params = {"bins": 200, "threshold": 0.3, "time_budget_ms": 500}
+    with client.stream("GET", "/optimize-route/stream", params=params) as response:
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+
+    progress, result = lines[:-1], lines[-1]
+    assert progress and all(line["type"] == "progress" for line in progress)
+    assert progress[0]["iteration"] == 0
+    distances = [line["total_distance"] for line in progress]
+    assert distances == sorted(distances, reverse=True)
+    assert result["type"] == "result" and result["batch_id"]
+    assert result["total_distance"] == pytest.approx(distances[-1])
+
+    response = client.get("/optimize-route/stream", params={"bins": 30, "time_budget_ms": 0},
+                          headers={"Accept": "text/event-stream"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("event: progress\ndata: {")
+    assert "event: result\n" in response.text
+
+
+def test_routing_on_ingested_readings(client):
+    full = {"bin_3", "bin_11", "bin_17"}
+    lines = [json.dumps({"bin_id": f"bin_{i}", "fill_level": 0.9 if f"bin_{i}" in full else 0.1})
+             for i in range(30)]
+    response = client.post("/telemetry/readings", content="\n".join(lines + ["{}"]),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 202
+    assert response.json()["accepted"] == 30 and response.json()["rejected"] == 1
+
+    # Buffered readings are used before they are written...
+    route = client.get("/optimize-route", params={"bins": 30, "fill_source": "live"}).json()
+    assert full <= set(route["optimized_route"])
+
+    # ...and after, when the same full bins give back the route already solved
+    assert client.post("/telemetry/flush").json()["written"] == 30
+    again = client.get("/optimize-route", params={"bins": 30, "fill_source": "live"}).json()
+    assert again["cached"] and not route["cached"]
+    assert again["optimized_route"] == route["optimized_route"]
+    assert 'cache_requests_total{cache="route_results",result="hit"}' in client.get("/metrics").text
+
+    assert client.post("/telemetry/readings", content="x", headers={"Content-Type": "text/plain"}).status_code == 415
+
+
+def test_forecast_from_ingested_history(client):
+    history.clear()
+    now = time.time()
+    rows = ["bin_id,fill_level,timestamp"]
+    for k in range(4):
+        rows += [f"bin_{i},{0.1 + 0.05 * k * (i % 3)},{now - 1800 + 600 * k}" for i in range(30)]
+    response = client.post("/telemetry/readings", content="\n".join(rows), headers={"Content-Type": "text/csv"})
+    assert response.status_code == 202
+
+    # Bins with i % 3 == 2 gain 0.1 every 10 minutes and sit at 0.4: full (0.7) in 30 minutes
+    forecast = client.get("/telemetry/forecast", params={"threshold": 0.7, "horizon_min": 45}).json()
+    soon = {b["bin_id"] for b in forecast["bins"]}
+    assert soon == {f"bin_{i}" for i in range(30) if i % 3 == 2}
+    assert all(25 <= b["minutes_until_full"] <= 35 for b in forecast["bins"])
+
+    params = {"bins": 30, "threshold": 0.7, "fill_source": "live"}
+    assert client.get("/optimize-route", params=params).json()["optimized_route"] == []
+    route = client.get("/optimize-route", params={**params, "forecast_horizon_min": 45}).json()
+    assert soon <= set(route["optimized_route"])
+
+
+def test_route_history(client):
+    client.get("/optimize-route", params={"bins": 20})
+    page = client.get("/routes", params={"limit": 1}).json()
+    assert len(page["routes"]) == 1 and page["next_cursor"]
+    newest = page["routes"][0]
+    assert "optimized_route" not in newest
+
+    older = client.get("/routes", params={"limit": 1, "cursor": page["next_cursor"]}).json()
+    assert older["routes"][0]["id"] < newest["id"]
+    by_batch = client.get("/routes", params={"batch_id": newest["batch_id"]}).json()
+    assert [r["id"] for r in by_batch["routes"]] == [newest["id"]]
+
+    detail = client.get(f"/routes/{newest['id']}").json()
+    assert len(detail["optimized_route"]) == detail["bins_covered"]
+    assert client.get("/routes", params={"cursor": "bogus"}).status_code == 400
+    assert client.get("/routes/999999").status_code == 404
+
+
+def test_clustered_algorithm_solves_in_the_pool(client):
+    response = client.get("/optimize-route", params={"bins": 300, "algorithm": "cluster"})
+    assert response.status_code == 200
+    assert response.json()["bins_covered"] > 0
+    assert client.get("/optimize-route", params={"algorithm": "nope"}).status_code == 422
+    assert client.get("/optimize-route", params={"bins": -3}).status_code == 422
+    too_many = client.get("/optimize-route", params={"bins": 30, "threshold": 0.1, "algorithm": "exact"})
+    assert too_many.status_code == 422 and "exact" in too_many.json()["detail"]
+    assert client.get("/optimize-route", params={"threshold": 1.5}).status_code == 422
+
+
+def test_routing_on_an_imported_road_network(client, tmp_path, monkeypatch):
+    from src.algorithm import road_network
+
+    assert client.get("/road-network").status_code == 404
+
+    # A 4 x 4 grid of streets, with a bin at every corner
+    (tmp_path / "nodes.csv").write_text("node_id,x,y\n" + "".join(
+        f"n{x}{y},{x},{y}\n" for x in range(4) for y in range(4)))
+    (tmp_path / "edges.csv").write_text("source,target\n" + "".join(
+        f"n{x}{y},n{x + dx}{y + dy}\n" for x in range(4) for y in range(4) for dx, dy in ((1, 0), (0, 1))
+        if x + dx < 4 and y + dy < 4))
+    (tmp_path / "bins.csv").write_text("bin_id,x,y\nsw,0,0\nse,3.1,0\nnw,0,2.9\nne,3,3\n")
+    directory = str(tmp_path / "network")
+    road_network.main([str(tmp_path / "edges.csv"), str(tmp_path / "nodes.csv"), directory,
+                       "--bins", str(tmp_path / "bins.csv")])
+    monkeypatch.setattr(road_network, "ROAD_NETWORK_DIR", directory)
+
+    info = client.get("/road-network").json()
+    assert (info["nodes"], info["edges"], info["bins"]) == (16, 24, 4)
+
+    response = client.post("/road-network/optimize-route", json={"fill_levels": {"sw": 0.9, "ne": 0.8}})
+    assert response.status_code == 200
+    route = response.json()["optimized_route"]
+    assert {route[0], route[-1]} == {"n00", "n33"}
+    assert response.json()["total_distance"] == 6
+    assert client.post("/road-network/optimize-route", json={"fill_levels": {"zz": 1}}).status_code == 422
+
+
+def test_compact_and_compressed_encodings(client):
+    params = {"bins": 400, "threshold": 0.3}
+    response = client.get("/optimize-route", params=params, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    route = response.json()
+
+    compact = client.get("/optimize-route", params=params,
+                         headers={"Accept": "application/vnd.routing.compact+json"})
+    assert compact.headers["content-type"] == "application/vnd.routing.compact+json"
+    indices = compact.json()["optimized_route"]
+    assert all(isinstance(i, int) for i in indices)
+    assert compact.json()["bins_covered"] == len(indices)
+
+    binary = client.get("/optimize-route", params=params, headers={"Accept": "application/octet-stream"})
+    assert binary.headers["x-route-bins-covered"] == str(len(binary.content) // 4)
+    assert binary.headers["x-route-threshold"] == "0.3"
+
+    # Fill levels are drawn anew each time, so only the format of the route can be compared
+    assert len(route["optimized_route"][0]) > len(str(indices[0]))
+
+    report = client.get("/compare-algorithms", params={"measure_memory": False},
+                        headers={"Accept": "application/vnd.routing.compact+json"}).json()
+    assert [report["nodes"][i] for i in report["Main"]["route"]][0].startswith("bin_")
+
+
+def test_streams_are_not_compressed(client):
+    for accept in ("application/x-ndjson", "text/event-stream"):
+        response = client.get("/optimize-route/stream", params={"bins": 30, "time_budget_ms": 0},
+                              headers={"Accept": accept, "Accept-Encoding": "gzip, br"})
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+
+
+def test_brotli_is_preferred_and_gzip_serves_without_it(client, monkeypatch):
+    # The test client needs brotli to decode the response
+    import brotli  # noqa: F401
+
+    from src.api import compression
+
+    params = {"bins": 400, "threshold": 0.3}
+    response = client.get("/optimize-route", params=params, headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert "optimized_route" in response.json()
+
+    monkeypatch.setattr(compression, "brotli", None)
+    response = client.get("/optimize-route", params=params, headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "optimized_route" in response.json()
+
+
+def test_default_json_falls_back_to_the_standard_encoder(monkeypatch):
+    import numpy as np
+
+    from src.api import encoding
+
+    content = {"optimized_route": ["bin_1", "bin_2"], "total_distance": 1.5}
+    fast = encoding.DefaultResponse({**content, "levels": np.array([0.5, 1.0])}).body
+    assert json.loads(fast) == {**content, "levels": [0.5, 1.0]}
+
+    monkeypatch.setattr(encoding, "orjson", None)
+    assert json.loads(encoding.DefaultResponse(content).body) == content
+
+
+def test_comparison_on_a_disconnected_network_reports_exact_as_unavailable(client):
+    import numpy as np
+
+    from src.algorithm.compact_graph import CompactGraph
+    from src.api.jobs import compare_algorithms
+
+    # Two separate streets with full bins on both
+    graph = CompactGraph.from_arrays([f"bin_{i}" for i in range(6)], [0, 1, 3, 4], [1, 2, 4, 5], [1, 1, 1, 1],
+                                     np.array([[0, 0], [1, 0], [2, 0], [10, 0], [11, 0], [12, 0]], dtype=float),
+                                     [0.9, 0.1, 0.9, 0.9, 0.1, 0.9])
+    results = compare_algorithms(graph, 0.7, measure_memory=False)
+    assert "error" in results["exact"]
+    assert results["Main"]["bins"] > 0
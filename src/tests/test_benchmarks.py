@@ -0,0 +1,43 @@
+import copy
+import json
+
+from src.benchmarks.routing import DEFAULT_BASELINE, SIZES, THRESHOLDS, compare_to_baseline, main, run_suite
+from src.benchmarks.startup import STARTUP_BUDGET_S, measure_imports
+
+
+def test_benchmark_suite_flags_regressions():
+    baseline = run_suite(sizes=[20], thresholds=[0.5], render=False, measure_memory=False)
+    record = baseline["results"][0]
+    assert set(record["algorithms"]) == {"dijkstra", "astar", "naive", "Main", "exact"}
+    assert {"network", "distance_matrix", "persist"} <= set(record["stages_ms"])
+    assert compare_to_baseline(baseline, baseline) == []
+
+    slower = copy.deepcopy(baseline)
+    slower["results"][0]["stages_ms"]["distance_matrix"] += 100
+    slower["results"][0]["algorithms"]["Main"]["distance"] *= 1.5
+    regressions = compare_to_baseline(slower, baseline)
+    assert len(regressions) == 2
+    assert any("stage.distance_matrix" in line for line in regressions)
+
+
+def test_a_missing_baseline_fails_loudly(tmp_path):
+    args = ["--sizes", "20", "--thresholds", "0.5", "--no-render", "--no-memory",
+            "--output", str(tmp_path / "results.json")]
+    assert main(args + ["--baseline", str(tmp_path / "missing.json")]) == 2
+
+    # So is a baseline without every benchmarked instance
+    baseline = run_suite(sizes=[20], thresholds=[0.5], render=False, measure_memory=False)
+    with open(tmp_path / "partial.json", "w") as f:
+        json.dump(baseline, f)
+    assert main(args[:1] + ["20", "200"] + args[2:] + ["--baseline", str(tmp_path / "partial.json")]) == 2
+
+    with open(DEFAULT_BASELINE) as f:
+        committed = json.load(f)
+    assert {(r["bins"], r["threshold"]) for r in committed["results"]} == {
+        (bins, threshold) for bins in SIZES for threshold in THRESHOLDS}
+
+
+def test_api_imports_within_startup_budget():
+    report = measure_imports("src.api.main")
+    assert report["lazy_loaded"] == []
+    assert 0 < report["total_s"] < STARTUP_BUDGET_S
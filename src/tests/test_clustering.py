@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from src.algorithm import clustering
+from src.algorithm.routing import find_best_route, find_clustered_route, full_bins_for
+from src.algorithm.topology_cache import get_topology
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return get_topology(600).sample(np.random.default_rng(3))
+
+
+@pytest.mark.parametrize("method", clustering.PARTITION_METHODS)
+def test_partition_covers_every_point_once(method):
+    points = np.random.default_rng(0).uniform(0, 100, (1000, 2))
+    clusters = clustering.partition(points, cluster_size=100, method=method)
+
+    assert sorted(np.concatenate(clusters).tolist()) == list(range(1000))
+    assert 5 <= len(clusters) <= 12
+    assert max(len(c) for c in clusters) < 300
+
+
+def test_bounded_search_matches_dijkstra(graph):
+    targets = [5, 17, 300, 599]
+    dist, _ = graph.dijkstra(0)
+    assert np.allclose(graph.distances_to(0, targets), dist[targets])
+
+
+@pytest.mark.parametrize("method", clustering.PARTITION_METHODS)
+def test_clustered_route_covers_every_full_bin(graph, method):
+    route, total, covered = find_clustered_route(graph, 0.7, method=method, cluster_size=40)
+
+    assert set(full_bins_for(graph, 0.7)) <= set(route)
+    assert covered == len(route) == len(set(route))
+    # Cutting the instance into clusters costs some distance, but not much
+    assert total < 1.25 * find_best_route(graph, 0.7)[1]
+
+
+def test_junction_keeps_its_ends_in_place(graph):
+    tour = graph.full_bins(0.7)[:20].copy()
+    before = tour.copy()
+    clustering._improve_junction(graph, tour, 4, 14)
+
+    assert tour[4] == before[4] and tour[14] == before[14]
+    assert sorted(tour.tolist()) == sorted(before.tolist())
+    assert (tour[:4] == before[:4]).all() and (tour[15:] == before[15:]).all()
@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+import pytest
+
+from src.algorithm.fill_history import FillHistory
+from src.algorithm.routing import find_best_route
+from src.algorithm.topology_cache import get_topology
+
+T0 = 1_760_000_000.0
+
+
+def test_fill_rates_follow_each_bin_since_it_was_emptied():
+    history = FillHistory(depth=6, capacity=2)
+    for k in range(10):
+        # a fills at 0.01/min, b at 0.02/min but is emptied after the 5th reading, c is flat
+        b = 0.5 + 0.02 * k if k < 5 else 0.02 * (k - 5)
+        history.record(["a", "b", "c"], [0.1 + 0.01 * k, b, 0.3], [T0 + 60 * k] * 3)
+
+    latest_time, latest_level, rate = history.fill_rates()
+    assert latest_time.tolist() == [T0 + 540] * 3
+    assert latest_level == pytest.approx([0.19, 0.08, 0.3], abs=1e-6)
+    assert rate * 60 == pytest.approx([0.01, 0.02, 0.0], abs=1e-6)
+
+    seconds = history.seconds_until(0.25, now=T0 + 540)
+    assert seconds[0] == pytest.approx(360, abs=1)
+    assert seconds[1] == pytest.approx(510, abs=1)
+    assert seconds[2] == 0.0
+    assert np.isinf(history.seconds_until(0.5, now=T0 + 540)[2])
+
+    predicted = history.predict(["b", "unknown", "a"], at=T0 + 540 + 600)
+    assert predicted[0] == pytest.approx(0.28, abs=1e-5)
+    assert np.isnan(predicted[1])
+    assert predicted[2] == pytest.approx(0.29, abs=1e-5)
+
+
+def test_readings_of_one_bin_in_a_batch_are_kept_in_time_order(tmp_path):
+    history = FillHistory(depth=4)
+    history.record(["a", "a", "a", "b"], [0.3, 0.1, 0.2, 0.5], [T0 + 120, T0, T0 + 60, T0])
+    latest_time, latest_level, rate = history.fill_rates()
+    assert latest_level == pytest.approx([0.3, 0.5])
+    assert rate[0] * 60 == pytest.approx(0.1, abs=1e-6)
+
+    history.save(tmp_path / "history.npz")
+    loaded = FillHistory.load(tmp_path / "history.npz")
+    assert loaded.bin_ids == ["a", "b"]
+    assert np.allclose(loaded.fill_rates()[2], rate)
+    loaded.record(["c"], [0.4], [T0])
+    assert len(loaded) == 3
+
+    # Late readings would put the ring buffer out of order
+    assert loaded.record(["a", "c"], [0.9, 0.5], [T0 + 60, T0 + 60]) == 1
+    assert loaded.fill_rates()[1].tolist() == pytest.approx([0.3, 0.5, 0.5])
+
+
+def test_forecast_is_vectorized_over_many_bins():
+    n = 200_000
+    rate = np.random.default_rng(0).uniform(0, 1e-4, n)
+    history = FillHistory(capacity=n)
+    ids = [f"bin_{i}" for i in range(n)]
+    for k in range(4):
+        history.record(ids, rate * 600 * k, np.full(n, T0 + 600 * k))
+
+    start = time.perf_counter()
+    seconds = history.seconds_until(0.7, now=T0 + 1800)
+    assert time.perf_counter() - start < 1.0
+    assert seconds == pytest.approx(np.maximum((0.7 - rate * 1800) / rate, 0), rel=1e-3)
+
+
+def test_find_best_route_collects_bins_forecast_to_be_full():
+    topology = get_topology(40)
+    fills = np.full(40, 0.1)
+    fills[[2, 9, 31]] = 0.9
+    forecast = np.full(40, np.nan)
+    forecast[[5, 17]] = 0.8
+
+    route, _, _ = find_best_route(topology.with_fill_levels(fills), 0.7)
+    assert {"bin_5", "bin_17"} - set(route)
+
+    route, _, _ = find_best_route(topology.with_fill_levels(fills, forecast), 0.7)
+    assert {"bin_2", "bin_9", "bin_31", "bin_5", "bin_17"} <= set(route)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from src.algorithm import landmarks
+from src.algorithm.compact_graph import CompactGraph
+from src.algorithm.topology_cache import get_topology
+
+
+@pytest.fixture
+def graph():
+    topology = get_topology(400)
+    # Same topology without positions, so A* can only use the landmarks
+    g = topology.graph
+    yield CompactGraph(g.names, g.offsets, g.targets, g.weights)
+    landmarks.clear()
+
+
+def test_bounds_never_exceed_the_distance(graph):
+    index = landmarks.LandmarkIndex.build(graph, count=8)
+    dist, _ = graph.dijkstra(7)
+    bounds = index.lower_bounds(np.arange(graph.num_nodes), 7)
+
+    assert (bounds <= dist + 1e-9).all()
+    assert bounds[7] == 0
+    assert bounds.mean() > 0.5 * dist.mean()
+
+
+def test_astar_on_landmarks_alone_finds_shortest_paths(graph, monkeypatch):
+    with pytest.raises(ValueError):
+        graph.astar(0, 1)
+
+    monkeypatch.setattr(landmarks, "MIN_INDEX_NODES", 0)
+    landmarks.index_for(graph)
+    graph._landmarks = None
+    for source, target in [(0, 399), (12, 250), (300, 301)]:
+        length, path = graph.astar(source, target)
+        dist, _ = graph.dijkstra(source)
+        assert length == pytest.approx(dist[target])
+        assert path[0] == source and path[-1] == target
+
+
+def test_index_is_saved_and_loaded_by_topology(graph, tmp_path, monkeypatch):
+    monkeypatch.setattr(landmarks, "MIN_INDEX_NODES", 0)
+    built = landmarks.index_for(graph, directory=str(tmp_path))
+    assert (tmp_path / (graph.fingerprint + landmarks.INDEX_SUFFIX)).exists()
+
+    landmarks.clear()
+    assert landmarks.index_for(graph, build=False) is None
+    assert landmarks.preload(str(tmp_path)) == 1
+    loaded = landmarks.index_for(graph, build=False)
+    assert loaded is not built
+    assert (loaded.distances == built.distances).all()
+
+
+def test_index_is_built_by_the_first_astar_query(graph, monkeypatch, index_dir):
+    monkeypatch.setattr(landmarks, "MIN_INDEX_NODES", 0)
+    assert landmarks.index_for(graph, build=False) is None
+
+    monkeypatch.setattr(landmarks, "_builds_enabled", False)
+    with pytest.raises(ValueError):
+        graph.astar(0, 1)
+
+    monkeypatch.setattr(landmarks, "_builds_enabled", True)
+    copy = graph.with_fill_levels(None)
+    copy._landmarks = None
+    copy.astar(0, 1)
+    assert landmarks.index_for(graph, build=False) is not None
+
+    # Saved by default, so other processes load it instead of building their own
+    assert (index_dir / (graph.fingerprint + landmarks.INDEX_SUFFIX)).exists()
+    landmarks.clear()
+    monkeypatch.setattr(landmarks, "_builds_enabled", False)
+    assert landmarks.index_for(graph) is not None
@@ -0,0 +1,37 @@
+import pytest
+
+from src.metrics import Registry
+
+
+def test_histogram_quantiles_and_prometheus_text():
+    registry = Registry()
+    for ms in range(1, 101):
+        registry.observe("span_duration_seconds", ms / 1000, span="distance_matrix")
+    registry.increment("cache_requests_total", cache="topologies", result="hit")
+    registry.increment("cache_requests_total", 2, cache="topologies", result="miss")
+
+    count, total, quantiles = registry.histogram("span_duration_seconds", span="distance_matrix")
+    assert count == 100
+    assert total == pytest.approx(5.05)
+    assert quantiles[0.5] == pytest.approx(0.051)
+    assert quantiles[0.99] == pytest.approx(0.1)
+    assert registry.total("cache_requests_total") == 3
+
+    text = registry.render()
+    assert "# TYPE span_duration_seconds summary" in text
+    assert 'span_duration_seconds{span="distance_matrix",quantile="0.95"} 0.096' in text
+    assert 'span_duration_seconds_count{span="distance_matrix"} 100' in text
+    assert 'cache_requests_total{cache="topologies",result="miss"} 2.0' in text
+
+
+def test_drained_worker_metrics_merge_into_parent():
+    worker, parent = Registry(), Registry()
+    worker.increment("shortest_path_queries_total", 5, kind="dijkstra")
+    worker.observe("span_duration_seconds", 0.5, span="find_best_route")
+
+    parent.increment("shortest_path_queries_total", 1, kind="dijkstra")
+    parent.merge(worker.drain())
+
+    assert parent.total("shortest_path_queries_total") == 6
+    assert parent.histogram("span_duration_seconds", span="find_best_route")[0] == 1
+    assert worker.total("shortest_path_queries_total") == 0
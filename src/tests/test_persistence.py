@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from sqlalchemy import inspect
+
+from src.algorithm.compact_graph import CompactGraph
+from src.algorithm.topology_cache import get_topology
+from src.database.connection import configure_database
+from src.database.models import Bin, Network, Route
+from src.database.persistence import bin_rows, network_graph, save_optimization, upsert_bins
+
+
+def test_upsert_bins_overwrites_existing_rows(db):
+    topology = get_topology(30)
+    upsert_bins(db, bin_rows(topology.sample(), "first"), chunk_size=7)
+    db.commit()
+
+    graph = topology.sample()
+    upsert_bins(db, bin_rows(graph, "second"), chunk_size=7)
+    db.commit()
+
+    saved = {b.id: b for b in db.query(Bin).all()}
+    assert len(saved) == 30
+    assert {b.batch_id for b in saved.values()} == {"second"}
+    for name, fill in zip(graph.names, graph.fill_levels.tolist()):
+        assert saved[name].fill_level == pytest.approx(fill)
+    assert saved[graph.names[3]].position == pytest.approx(graph.positions[3].tolist())
+
+
+def test_save_optimization_writes_one_batch(db):
+    topology = get_topology(30)
+    graph = topology.sample()
+    batch_id = save_optimization(db, graph, ["bin_0", "bin_1"], 12.5, 2)
+
+    route = db.query(Route).one()
+    assert route.batch_id == batch_id
+    assert route.optimized_route == ["bin_0", "bin_1"]
+    assert db.query(Bin).filter(Bin.batch_id == batch_id).count() == 30
+
+
+def test_routes_share_one_stored_network(db):
+    topology = get_topology(30)
+    for _ in range(3):
+        save_optimization(db, topology.sample(), ["bin_0"], 1.0, 1)
+    save_optimization(db, get_topology(31).sample(), ["bin_0"], 1.0, 1)
+
+    assert db.query(Network).count() == 2
+    assert len({r.network_id for r in db.query(Route).all()}) == 2
+
+    route = db.query(Route).first()
+    fills = {b.id: b.fill_level for b in db.query(Bin).all()}
+    graph = network_graph(route.network, fill_levels=fills)
+    assert graph.names == topology.graph.names
+    assert np.array_equal(graph.offsets, topology.graph.offsets)
+    assert np.allclose(graph.dijkstra(0)[0], topology.graph.dijkstra(0)[0])
+    # One fingerprint: the rebuilt graph hashes to the key it was stored under
+    rebuilt = CompactGraph(graph.names, graph.offsets, graph.targets, graph.weights)
+    assert rebuilt.fingerprint == route.network.fingerprint == topology.graph.fingerprint
+
+
+def test_only_in_memory_databases_get_tables_outside_alembic(tmp_path):
+    try:
+        assert inspect(configure_database(f"sqlite:///{tmp_path}/routing.db")).get_table_names() == []
+        assert "bins" in inspect(configure_database("sqlite://")).get_table_names()
+    finally:
+        configure_database("sqlite://")
@@ -0,0 +1,26 @@
+from src.algorithm.lru import LRUCache
+from src.algorithm.topology_cache import get_topology
+from src.api.render import render_route
+
+
+def test_render_route_formats():
+    graph = get_topology(30).sample()
+    route = graph.names[:5]
+
+    assert render_route(graph, route, fmt="png").startswith(b"\x89PNG")
+    assert b"<svg" in render_route(graph, route, fmt="svg")
+
+
+def test_lru_cache_evicts_by_size():
+    cache = LRUCache(maxsize=10, sizeof=len)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get("a")
+    cache.put("c", b"1234")
+
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.size == 8
+
+    cache.put("d", b"12345678901")
+    assert len(cache) == 0 and cache.size == 0
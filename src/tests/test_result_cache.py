@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+
+from src.algorithm.lru import LRUCache
+from src.algorithm.topology_cache import get_topology
+from src.api.result_cache import ResultCache, result_key
+
+
+def test_lru_cache_entries_expire():
+    cache = LRUCache(maxsize=10, ttl=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_key_depends_on_the_full_bins_only():
+    topology = get_topology(50)
+    levels = np.full(50, 0.2)
+    levels[[3, 7]] = 0.9
+    key = result_key("optimize-route", topology.with_fill_levels(levels), 0.7, algorithm="main")
+
+    other = levels.copy()
+    other[[3, 10]] = [0.75, 0.5]
+    assert result_key("optimize-route", topology.with_fill_levels(other), 0.7, algorithm="main") == key
+    assert result_key("optimize-route", topology.with_fill_levels(other), 0.5, algorithm="main") != key
+    assert result_key("optimize-route", topology.with_fill_levels(levels), 0.7, algorithm="naive") != key
+    assert result_key("optimize-route", get_topology(51).with_fill_levels(np.append(levels, 0)), 0.7,
+                      algorithm="main") != key
+
+
+def test_results_are_shared_through_the_directory(tmp_path):
+    first = ResultCache(directory=str(tmp_path))
+    first.put("k", {"optimized_route": ["bin_1", "bin_2"], "total_distance": 1.5})
+
+    second = ResultCache(directory=str(tmp_path))
+    assert second.get("k") == {"optimized_route": ["bin_1", "bin_2"], "total_distance": 1.5}
+    assert ResultCache(directory=str(tmp_path), ttl=0).get("k") is None
+    assert ResultCache(directory=str(tmp_path)).get("missing") is None
+
+
+def test_directory_is_pruned(tmp_path):
+    cache = ResultCache(directory=str(tmp_path), max_files=3)
+    for i in range(5):
+        cache.put(f"k{i}", {"total_distance": i})
+        time.sleep(0.01)
+    # The newest files are kept
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["k2.json", "k3.json", "k4.json"]
+
+    # Expired files are deleted when read
+    expired = ResultCache(directory=str(tmp_path), ttl=0.05)
+    time.sleep(0.06)
+    assert expired.get("k4") is None
+    assert not (tmp_path / "k4.json").exists()
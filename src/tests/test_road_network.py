@@ -0,0 +1,103 @@
+import csv
+
+import numpy as np
+import pytest
+
+from src.algorithm import landmarks, road_network
+from src.algorithm.solver import solve_road_route
+from src.algorithm.topology_cache import get_topology
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture
+def imported(tmp_path):
+    """A synthetic topology exported to CSV, with a bin next to every fifth node, and imported."""
+    topology = get_topology(200)
+    graph = topology.graph
+    u, v, w = topology.edges
+    nodes = write_csv(tmp_path / "nodes.csv", ["node_id", "x", "y"],
+                      [(name, x, y) for name, (x, y) in zip(graph.names, graph.positions.tolist())])
+    # Every edge twice, once with a longer weight that the import should drop
+    edges = write_csv(tmp_path / "edges.csv", ["source", "target", "weight"],
+                      [(graph.names[a], graph.names[b], d) for a, b, d in zip(u.tolist(), v.tolist(), w.tolist())]
+                      + [(graph.names[b], graph.names[a], d + 1) for a, b, d in zip(u.tolist(), v.tolist(), w.tolist())])
+    bins = write_csv(tmp_path / "bins.csv", ["bin_id", "x", "y"],
+                     [(f"B{i}", x + 0.01, y) for i, (x, y) in enumerate(graph.positions[::5].tolist())])
+    directory = str(tmp_path / "network")
+    meta = road_network.import_road_network(edges, nodes, directory, bins)
+    yield graph, directory, meta
+    landmarks.clear()
+    road_network._networks.clear()
+
+
+def test_import_round_trips_through_mapped_arrays(imported):
+    graph, directory, meta = imported
+    assert meta == {"nodes": 200, "edges": graph.num_edges, "fingerprint": graph.fingerprint,
+                    "straight_line_admissible": True, "bins": 40}
+
+    network = road_network.load_road_network(directory)
+    assert road_network.load_road_network(directory) is network
+    assert isinstance(np.load(f"{directory}/targets.npy", mmap_mode="r"), np.memmap)
+    assert network.graph.names == graph.names
+    for name in ("offsets", "targets", "weights", "positions"):
+        assert (getattr(network.graph, name) == getattr(graph, name)).all()
+    assert network.graph.fingerprint == graph.fingerprint
+
+    # Searches read the mapped arrays in place rather than copies of them
+    network.graph.dijkstra(0)
+    for view, array in zip(network.graph._views(), (network.graph.offsets, network.graph.targets,
+                                                     network.graph.weights)):
+        assert np.shares_memory(np.asarray(view), array)
+    assert network.bin_nodes.tolist() == list(range(0, 200, 5))
+
+
+def test_nearest_nodes_matches_brute_force():
+    rng = np.random.default_rng(3)
+    positions = rng.uniform(0, 10, size=(500, 2))
+    points = rng.uniform(-1, 11, size=(100, 2))
+    brute = np.argmin(np.linalg.norm(points[:, None] - positions[None], axis=2), axis=1)
+    assert (road_network.nearest_nodes(positions, points) == brute).all()
+
+
+def test_route_covers_the_nodes_of_full_bins(imported):
+    graph, directory, _ = imported
+    levels = np.zeros(40)
+    levels[[1, 4, 9, 20, 33]] = 0.9
+    result = solve_road_route(directory, levels, threshold=0.7)
+    assert {graph.names[i * 5] for i in (1, 4, 9, 20, 33)} <= set(result["optimized_route"])
+    assert result["total_distance"] > 0
+
+
+def test_weights_shorter_than_the_straight_line_still_give_shortest_paths(tmp_path):
+    # a-c-d is far longer on the map than a-b-d, but much shorter by weight
+    nodes = write_csv(tmp_path / "nodes.csv", ["node_id", "x", "y"],
+                      [("a", 0, 0), ("b", 100, 0), ("c", 50, 100), ("d", 200, 0)])
+    edges = write_csv(tmp_path / "edges.csv", ["source", "target", "weight"],
+                      [("a", "b", 10), ("b", "d", 10), ("a", "c", 1), ("c", "d", 1)])
+    bins = write_csv(tmp_path / "bins.csv", ["bin_id", "x", "y"], [("A", 0, 0), ("D", 200, 0)])
+    directory = str(tmp_path / "network")
+    meta = road_network.import_road_network(edges, nodes, directory, bins)
+    assert meta["straight_line_admissible"] is False
+
+    try:
+        network = road_network.load_road_network(directory)
+        assert not network.graph.straight_line_admissible
+        assert network.graph.astar(0, 3) == (2.0, [0, 2, 3])
+        result = solve_road_route(directory, [0.9, 0.9], threshold=0.7, algorithm="cluster")
+        assert result["total_distance"] == 2.0
+    finally:
+        road_network._networks.clear()
+
+
+def test_bad_csv_is_reported(tmp_path):
+    nodes = write_csv(tmp_path / "nodes.csv", ["node_id", "x", "y"], [("a", 0, 0), ("b", 1, 0)])
+    edges = write_csv(tmp_path / "edges.csv", ["source", "target"], [("a", "c")])
+    with pytest.raises(ValueError, match="line 2: unknown node"):
+        road_network.import_road_network(edges, nodes, str(tmp_path / "network"))
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.database.models import Route
+from src.database.route_history import decode_cursor, latest_route, list_routes
+
+START = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db(db):
+    # Routes 1-3 share a timestamp, so pages have to break ties on id
+    created = [START] * 3 + [START + timedelta(minutes=i) for i in range(1, 8)]
+    db.add_all([
+        Route(optimized_route=["bin_0"], total_distance=float(i), bins_covered=1, batch_id=f"batch_{i}",
+              network_id=1 + i % 2, created_at=when)
+        for i, when in enumerate(created, 1)
+    ])
+    db.commit()
+    return db
+
+
+def test_pages_cover_every_route_once_newest_first(db):
+    seen, cursor = [], None
+    while True:
+        page, cursor = list_routes(db, limit=3, cursor=cursor)
+        seen += [route["id"] for route in page]
+        if cursor is None:
+            break
+    assert seen == list(range(10, 0, -1))
+    assert "optimized_route" not in page[0]
+    assert page[0]["created_at"] == START
+
+    # Routes saved after a cursor was handed out do not shift the pages that follow it
+    first, cursor = list_routes(db, limit=4)
+    db.add(Route(optimized_route=[], total_distance=0.0, bins_covered=0, batch_id="late",
+                 created_at=START + timedelta(hours=1)))
+    db.commit()
+    assert [r["id"] for r in list_routes(db, limit=4, cursor=cursor)[0]] == [6, 5, 4, 3]
+    assert latest_route(db).batch_id == "late"
+
+
+def test_filters(db):
+    page, _ = list_routes(db, since=START + timedelta(minutes=2), until=START + timedelta(minutes=5))
+    assert [r["id"] for r in page] == [7, 6, 5]
+    page, _ = list_routes(db, network_id=1)
+    assert [r["id"] for r in page] == [10, 8, 6, 4, 2]
+    page, _ = list_routes(db, batch_id="batch_3")
+    assert [r["id"] for r in page] == [3]
+
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
@@ -0,0 +1,76 @@
+import pytest
+
+from src.algorithm.topology_cache import get_topology
+from src.api.telemetry import BufferFull, TelemetryBuffer, live_fill_levels, parse_readings
+from src.database.models import Bin, BinReading
+from src.database.persistence import save_optimization
+
+
+def test_parse_readings_validates_whole_batches():
+    body = b"\n".join([
+        b'{"bin_id": "bin_0", "fill_level": 0.5, "timestamp": 10}',
+        b'{"bin_id": "bin_1", "fill_level": 1.5}',
+        b'not json',
+        b'{"bin_id": "", "fill_level": 0.1}',
+        b'{"bin_id": "bin_2", "fill_level": "0.25"}',
+    ])
+    readings, errors = parse_readings(body, "application/x-ndjson", now=99.0)
+
+    assert readings.bin_ids == ["bin_0", "bin_2"]
+    assert readings.fill_levels.tolist() == [0.5, 0.25]
+    assert readings.timestamps.tolist() == [10.0, 99.0]
+    assert [e.split(":")[0] for e in errors] == ["line 3", "line 2", "line 4"]
+
+    readings, errors = parse_readings(b"fill_level,bin_id\n0.9,bin_7\nfull,bin_8\n", "text/csv; charset=utf-8")
+    assert readings.bin_ids == ["bin_7"]
+    assert errors == ["line 3: fill_level must be a number between 0 and 1"]
+
+    with pytest.raises(ValueError):
+        parse_readings(b"id,level\n", "text/csv")
+
+
+def test_buffer_keeps_latest_reading_and_pushes_back_when_full(Session):
+    buffer = TelemetryBuffer(capacity=3, flush_rows=100, flush_interval=60, session_factory=Session)
+    buffer.offer(parse_readings(b"bin_id,fill_level,timestamp\na,0.2,2\nb,0.3,1\na,0.9,1\n", "text/csv")[0])
+    assert buffer.pending() == {"a": 0.2, "b": 0.3}
+
+    with pytest.raises(BufferFull):
+        buffer.offer(parse_readings(b"bin_id,fill_level\nc,0.1\nd,0.1\n", "text/csv")[0])
+    assert len(buffer) == 2
+
+    with Session() as db:
+        db.add(Bin(id="a", position=[1.0, 2.0], fill_level=0.0, batch_id="old"))
+        db.commit()
+
+    assert buffer.flush() == 2
+    assert buffer.pending() == {}
+    with Session() as db:
+        bins = {b.id: b for b in db.query(Bin).all()}
+        readings = {r.bin_id: r.fill_level for r in db.query(BinReading).all()}
+    assert bins["a"].fill_level == 0.0 and bins["a"].batch_id == "old" and "b" not in bins
+    assert readings == {"a": 0.2, "b": 0.3}
+
+    # Room again once flushed
+    buffer.offer(parse_readings(b"bin_id,fill_level\nc,0.1\nd,0.1\n", "text/csv")[0])
+    buffer.shutdown()
+    assert buffer.pending() == {}
+
+
+def test_synthetic_batches_do_not_overwrite_readings(Session, monkeypatch):
+    buffer = TelemetryBuffer(flush_rows=100, flush_interval=60, session_factory=Session)
+    monkeypatch.setattr("src.api.telemetry.telemetry", buffer)
+    topology = get_topology(30)
+    names = topology.graph.names
+    buffer.offer(parse_readings("\n".join(["bin_id,fill_level"] + [f"{name},0.05" for name in names]).encode(),
+                                "text/csv")[0])
+    buffer.flush()
+
+    with Session() as db:
+        graph = topology.sample()
+        save_optimization(db, graph, names[:2], 1.0, 2)
+        assert live_fill_levels(db, names).tolist() == [0.05] * 30
+
+        # An older reading arriving late does not replace a newer one
+        buffer.offer(parse_readings(f"bin_id,fill_level,timestamp\n{names[0]},0.9,1\n".encode(), "text/csv")[0])
+        buffer.flush()
+        assert live_fill_levels(db, names[:1]).tolist() == [0.05]